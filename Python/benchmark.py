@@ -0,0 +1,349 @@
+"""
+Rampage conversion benchmark
+============================
+
+Times every conversion stage on synthetic ROM images, so speed can be
+measured and compared without shipping the real ROMs. The fixtures are
+built from a seed and are the same on every machine:
+
+    cpu.bin      $E000 program image: level table ($8DAE, 132 levels) with
+                 building lists, terrain / silhouette tables ($8928 / $8934)
+                 and their RLE blocks, the $7613 sky strip, foliage ($95AA)
+                 and building ($95B6) tables, the $290D sprite table
+    bg0.bin      background bitplane ROMs, 32K each
+    bg1.bin
+    BG-REV.bin   4bpp characters (2048 tiles)
+    sprites.bin  4bpp 32x32 sprites, 512 bytes each
+    palette.pal  4 x 16 RGB colours
+    pairs.txt    sprite pairs for compose_rampage_overlay_pairs_space
+
+Each stage runs through the same job code as pipeline.py, with a fresh
+workspace every time so input decoding is part of the timing, and the best
+of --repeat runs is kept. Results (seconds, bytes/s and items/s per stage)
+are written to JSON; --compare prints the change against an earlier run.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --only decomp level_generator_final --repeat 5 --compare bench.json
+    python benchmark.py --fixtures fx/        # also keep the fixture files
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import shutil
+import struct
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import PIL
+
+import decomp
+import image_writer
+import instrument
+import pipeline
+from level_generator_final import (BUILDING_TABLE, FOLIAGE_TABLE, LEVEL_ENTRY_SIZE, LEVEL_TABLE_OFFSET, MAX_LEVELS,
+                                   SILHOUETTE_TABLE, TERRAIN_TABLE, TOP_STRIP_OFFSET)
+from rom_image import PROGRAM_SIZE, SPRITE_ENTRY_SIZE, SPRITE_TABLE
+
+BENCHMARK_VERSION = 2
+DEFAULT_SEED = 1986
+
+BUILDING_COUNT = 45
+SPRITE_COLUMNS = 68
+SPRITE_COUNT = 640  # table ids go up to $FF + $180
+CHARACTER_COUNT = 2048
+BITPLANE_SIZE = 0x8000
+RLE_AREA = (0x3000, 0x7600)  # RLE blocks, the sky strip goes at $7613
+HEAP_START = 0x9700  # foliage, buildings and building lists
+BLOCK_ROWS = {"terrain": 2, "silhouette": 29, "sky": 2, "map": 30}
+
+
+def _tile_words(rnd, count):
+    """Map words in runs of repeated tiles, like the game's strips; hi byte fits the $3F mask."""
+    words = []
+    while len(words) < count:
+        word = rnd.randrange(0x4000)
+        words += [word] * (rnd.choice((1, 1, 1, 2, 4, 8, 16)))
+    return words[:count]
+
+
+def _rle_block(rnd, rows):
+    """An RLE block of `rows` x 32 tile words, packed like an edited map would be."""
+    words = _tile_words(rnd, rows * 32)
+    return decomp.encode_character_data(struct.pack(f"<{len(words)}H", *words))
+
+
+class _Rom:
+    """Bump allocator over a cpu.bin image."""
+
+    def __init__(self):
+        self.data = bytearray(PROGRAM_SIZE)
+
+    def put(self, address, data):
+        if address + len(data) > len(self.data):
+            raise ValueError(f"Synthetic ROM overflows at ${address:04X}+{len(data)}")
+        self.data[address:address + len(data)] = data
+        return address + len(data)
+
+    def word(self, address, value):
+        struct.pack_into("<H", self.data, address, value)
+
+
+def synthetic_cpu(seed=DEFAULT_SEED):
+    """A $E000 cpu.bin with every table the conversion scripts read. Returns (data, RLE block addresses)."""
+    rnd = random.Random(seed)
+    rom = _Rom()
+
+    # RLE blocks: 6 terrain strips, 6 silhouettes, the sky strip and a few full screens
+    blocks = []
+    ptr = RLE_AREA[0]
+    for kind, count in (("terrain", 6), ("silhouette", 6), ("map", 4)):
+        for i in range(count):
+            encoded = _rle_block(rnd, BLOCK_ROWS[kind])
+            if ptr + len(encoded) > RLE_AREA[1]:
+                raise ValueError("Synthetic RLE blocks do not fit")
+            if kind == "terrain":
+                rom.word(TERRAIN_TABLE + i * 2, ptr)
+            elif kind == "silhouette":
+                rom.word(SILHOUETTE_TABLE + i * 2, ptr)
+            blocks.append(ptr)
+            ptr = rom.put(ptr, encoded)
+    rom.put(TOP_STRIP_OFFSET, _rle_block(rnd, BLOCK_ROWS["sky"]))
+    blocks.append(TOP_STRIP_OFFSET)
+
+    # Uncompressed foliage strips, 3 rows for indexes 0-4, 2 rows for 6 and 8
+    ptr = HEAP_START
+    for index in range(0, 10, 2):
+        rows = 3 if index <= 4 else 2
+        rom.word(FOLIAGE_TABLE + index, ptr)
+        ptr = rom.put(ptr, struct.pack(f"<{rows * 32}H", *_tile_words(rnd, rows * 32)))
+
+    # Buildings: width, height, colour byte (or $FF and full words), bottom row first
+    buildings = []
+    for building in range(BUILDING_COUNT):
+        width, height = rnd.randint(4, 8), rnd.randint(6, 16)
+        rom.word(BUILDING_TABLE + building * 2, ptr)
+        if building % 4 == 3:
+            body = struct.pack(f"<{width * height}H", *_tile_words(rnd, width * height))
+            ptr = rom.put(ptr, bytes((width, height, 0xFF)) + body)
+        else:
+            body = bytes(rnd.randrange(256) for _ in range(width * height))
+            ptr = rom.put(ptr, bytes((width, height, rnd.randrange(4))) + body)
+        buildings.append(width)
+
+    # Level table: building list pointer, silhouette << 4, terrain, foliage
+    for level in range(MAX_LEVELS):
+        entry = LEVEL_TABLE_OFFSET + level * LEVEL_ENTRY_SIZE
+        rom.word(entry, ptr)
+        rom.put(entry + 2, bytes((rnd.randrange(0, 12, 2) << 4, rnd.randrange(0, 12, 2), rnd.randrange(0, 10, 2))))
+        placements = bytearray()
+        if level % 16 == 5:
+            placements += bytes((0xFA, rnd.randrange(256)))  # skipped 2-byte marker
+        for _ in range(rnd.randint(3, 6)):
+            building = rnd.randrange(BUILDING_COUNT)
+            x_char = rnd.randrange(0, 64 - buildings[building] * 2)
+            placements += bytes((building + 1, x_char, rnd.randrange(4) << 4))
+        ptr = rom.put(ptr, placements + b"\xFF")
+
+    # Sprite table: signed dx, dy and four sprite codes per column
+    for column in range(SPRITE_COLUMNS):
+        dx, dy = rnd.randint(-16, 16), rnd.randint(-8, 24)
+        ids = [rnd.randrange(256) for _ in range(4)]
+        rom.put(SPRITE_TABLE + column * SPRITE_ENTRY_SIZE, struct.pack("<bb4B", dx, dy, *ids))
+
+    return bytes(rom.data), blocks
+
+
+def synthetic_fixtures(seed=DEFAULT_SEED):
+    """{file name: bytes} of every synthetic input, plus the RLE block addresses in cpu.bin."""
+    rnd = random.Random(seed + 1)
+    cpu, blocks = synthetic_cpu(seed)
+    palette = bytes(rnd.randrange(256) for _ in range(4 * 16 * 3))
+    pairs = "".join(f"{rnd.randrange(SPRITE_COLUMNS)} {rnd.randrange(SPRITE_COLUMNS)}\n" for _ in range(24))
+    files = {
+        "cpu.bin": cpu,
+        "bg0.bin": rnd.randbytes(BITPLANE_SIZE),
+        "bg1.bin": rnd.randbytes(BITPLANE_SIZE),
+        "BG-REV.bin": rnd.randbytes(CHARACTER_COUNT * 32),
+        "sprites.bin": rnd.randbytes(SPRITE_COUNT * 512),
+        "palette.pal": palette,
+        "pairs.txt": pairs.encode(),
+    }
+    return files, blocks
+
+
+def stages(files, blocks):
+    """
+    (name, jobs, bytes, items, unit) for every benchmarked stage. Jobs are
+    pipeline.py manifest entries run in order; bytes and items are the work
+    one run does, for the throughput figures.
+    """
+    maps = [f"MAPS/{address:04X}.bin" for address in blocks]
+    decodes = [{"job": "decomp", "input": "cpu.bin", "output": name, "offset": f"{address:04X}"}
+              for name, address in zip(maps, blocks)]
+    rle_bytes = sum(len(decomp.decode_character_data(memoryview(files["cpu.bin"])[a:], a)[0]) for a in blocks)
+    plots = [{"job": "tile_plot", "characters": "BG-REV.bin", "palette": "palette.pal", "map": name,
+              "output": f"PNG/{Path(name).stem}.png"} for name in maps]
+    levels = {"job": "levels", "cpu": "cpu.bin", "characters": "BG-REV.bin", "palette": "palette.pal",
+              "output": "LEVELS_PNG/Game_level"}
+    bitplanes = len(files["bg0.bin"]) + len(files["bg1.bin"])
+    return [
+        ("merge_bg_4bp", [{"job": "merge_bg_4bp", "inputs": ["bg0.bin", "bg1.bin"], "output": "GFX2.BIN", "xor": "FF"}],
+         bitplanes, bitplanes // 16, "tiles"),
+        ("merge2bits", [{"job": "merge2bits", "inputs": ["bg0.bin", "bg1.bin"], "output": "background4bits.bin"}],
+         bitplanes, bitplanes // 16, "tiles"),
+        ("swap_nybble", [{"job": "swap_nybble", "input": "BG-REV.bin", "output": "background.bin", "xor": "FF"}],
+         len(files["BG-REV.bin"]), len(files["BG-REV.bin"]) // 32, "tiles"),
+        ("characters_grid", [{"job": "characters_grid", "characters": "BG-REV.bin", "palette": "palette.pal",
+                              "output": "characters.png"}],
+         len(files["BG-REV.bin"]), len(files["BG-REV.bin"]) // 32, "tiles"),
+        ("decomp", decodes, rle_bytes, len(blocks), "blocks"),
+        ("tile_plot", decodes + plots, rle_bytes, len(blocks), "maps"),
+        ("building_plot_multi", [{"job": "buildings", "characters": "BG-REV.bin", "palette": "palette.pal",
+                                  "map": "cpu.bin", "offset": f"{BUILDING_TABLE:04X}", "output": "PNG/Buildings"}],
+         None, BUILDING_COUNT, "buildings"),
+        ("sprite_grid_plot", [{"job": "sprite_grid", "sprites": "sprites.bin", "palette": "palette.pal",
+                               "output": "sprites_grid.png", "width": 16, "number": True}],
+         len(files["sprites.bin"]), SPRITE_COUNT, "sprites"),
+        ("level_generator_final", [levels], None, MAX_LEVELS, "levels"),
+        ("grid_pngs", [levels, {"job": "grid_pngs", "folder": "LEVELS_PNG", "output": "All_Levels.png",
+                                "number": True, "grid": True}], None, MAX_LEVELS, "levels"),
+        ("compose_sprite_reverse", [{"job": "compose_sprite_reverse", "cpu": "cpu.bin", "sprites": "sprites.bin",
+                                     "palette": "palette.pal", "output": "Players_sprites.png"}],
+         None, SPRITE_COLUMNS * 3, "blocks"),
+        ("compose_overlay_pairs", [{"job": "compose_overlay_pairs", "cpu": "cpu.bin", "sprites": "sprites.bin",
+                                    "palette": "palette.pal", "pairs": "pairs.txt", "output": "Players_pairs.png",
+                                    "gapy": 32}],
+         None, files["pairs.txt"].count(b"\n") * 3, "pairs"),
+    ]
+
+
+STAGE_NAMES = ("merge_bg_4bp", "merge2bits", "swap_nybble", "characters_grid", "decomp", "tile_plot",
+               "building_plot_multi", "sprite_grid_plot", "level_generator_final", "grid_pngs",
+               "compose_sprite_reverse", "compose_overlay_pairs")
+
+# Stages that need another stage's output first; that part is not timed
+SETUP_JOBS = {"tile_plot": "decomp", "grid_pngs": "level_generator_final"}
+
+
+def run_jobs(root, jobs):
+    ws = pipeline.Workspace(root)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for job in jobs:
+            pipeline.JOBS[job["job"]](ws, job)
+            image_writer.flush()
+
+
+def time_stage(root, jobs, setup, repeat):
+    times = []
+    for _ in range(repeat):
+        if setup:
+            run_jobs(root, setup)
+        start = time.perf_counter()
+        run_jobs(root, jobs)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+    }
+
+
+def benchmark(root, seed=DEFAULT_SEED, repeat=3, only=None):
+    """Write the fixtures for seed to root and time each stage there; returns the JSON report."""
+    files, blocks = synthetic_fixtures(seed)
+    root = Path(root)
+    for name, data in files.items():
+        (root / name).write_bytes(data)
+    for folder in ("MAPS", "PNG", "LEVELS_PNG"):
+        (root / folder).mkdir(exist_ok=True)
+
+    all_stages = stages(files, blocks)
+    results = {}
+    for name, jobs, size, items, unit in all_stages:
+        if only and name not in only:
+            continue
+        setup = []
+        if name in SETUP_JOBS:
+            setup = next(s[1] for s in all_stages if s[0] == SETUP_JOBS[name])
+            jobs = jobs[len(setup):]
+        times = time_stage(root, jobs, setup, repeat)
+        best = min(times)
+        result = {"seconds": best, "runs": times, "items": items, "unit": unit,
+                  "items_per_sec": items / best if best else None}
+        if size is not None:
+            result.update(bytes=size, bytes_per_sec=size / best if best else None)
+        results[name] = result
+        rate = f"{items / best:,.0f} {unit}/s" if best else "-"
+        print(f"⏱️ {name:<24} {best * 1000:9.1f} ms  {rate}")
+
+    return {
+        "version": BENCHMARK_VERSION,
+        "seed": seed,
+        "repeat": repeat,
+        "environment": environment(),
+        "stages": results,
+        "total_seconds": sum(r["seconds"] for r in results.values()),
+    }
+
+
+def compare(report, baseline):
+    """Print each stage's time against a previous report."""
+    print(f"\n📊 Compared with seed {baseline.get('seed')} on {baseline.get('environment', {}).get('platform', '?')}")
+    for name, result in report["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if old is None:
+            print(f"  {name:<24} new")
+            continue
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        mark = "🐢" if ratio > 1.1 else "🚀" if ratio < 0.9 else "  "
+        print(f"  {mark} {name:<22} {old['seconds'] * 1000:9.1f} ms → {result['seconds'] * 1000:9.1f} ms  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Rampage conversion stages on synthetic ROMs.")
+    parser.add_argument("--output", default="benchmark.json", help="JSON results file (default benchmark.json)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the best is kept (default 3)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"fixture seed (default {DEFAULT_SEED})")
+    parser.add_argument("--only", nargs="+", default=None, help="only run these stages")
+    parser.add_argument("--fixtures", default=None, help="build and keep the fixtures and outputs in this folder")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.only or []) - set(STAGE_NAMES))
+    if unknown:
+        parser.error(f"unknown stages {', '.join(unknown)} (choose from {', '.join(STAGE_NAMES)})")
+
+    if args.fixtures is not None:
+        Path(args.fixtures).mkdir(parents=True, exist_ok=True)
+        report = benchmark(args.fixtures, args.seed, args.repeat, args.only)
+    else:
+        root = tempfile.mkdtemp(prefix="rampage_bench_")
+        try:
+            report = benchmark(root, args.seed, args.repeat, args.only)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"💾 {len(report['stages'])} stages, {report['total_seconds']:.2f}s total, saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    instrument.start()
+    main()
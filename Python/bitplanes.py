@@ -0,0 +1,112 @@
+"""
+Table-driven MCR-3 background bitplane merge
+============================================
+
+The two background ROMs (bg-0 / bg-1) hold 2 bitplanes each: every byte
+carries 4 pixels as bit pairs, left pixel in bits 7-6. Merging a byte from
+each ROM gives 4 pixels of 4 bits, i.e. 2 bytes of linear 4bpp output, so
+the whole conversion is one lookup per byte pair:
+
+    out[2*i : 2*i + 2] = table[rom0[i], rom1[i]]
+
+For each pixel the 4 plane bits are
+
+    p0 = rom0 high bit, p1 = rom0 low bit, p2 = rom1 high bit, p3 = rom1 low bit
+
+and a plane order (perm) picks which of them lands in colour bits 0-3:
+
+    colour = p[perm[0]] | p[perm[1]] << 1 | p[perm[2]] << 2 | p[perm[3]] << 3
+
+merge2bits.py is the order (1, 0, 3, 2); merge_mcr3_bg_4bp.py can detect
+the order from the first 16 characters, which are solid colours 0-15.
+"""
+
+from itertools import permutations
+
+import numpy as np
+
+MERGE2BITS_ORDER = (1, 0, 3, 2)
+CHUNK_SIZE = 1 << 20  # input bytes per ROM per streamed chunk
+TILE_PLANE_BYTES = 16  # bytes per 8x8 character in each plane ROM
+
+
+def _pair_planes():
+    """(4, 256, 256, 4) plane bits for every byte pair and each of its 4 pixels."""
+    bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1)
+    hi, lo = bits[:, 0::2], bits[:, 1::2]
+    return np.stack([
+        np.broadcast_to(hi[:, None, :], (256, 256, 4)),
+        np.broadcast_to(lo[:, None, :], (256, 256, 4)),
+        np.broadcast_to(hi[None, :, :], (256, 256, 4)),
+        np.broadcast_to(lo[None, :, :], (256, 256, 4)),
+    ])
+
+
+def pair_table(perm=MERGE2BITS_ORDER):
+    """256x256 lookup table from (rom0 byte, rom1 byte) to 2 bytes of linear 4bpp."""
+    planes = _pair_planes()
+    colours = sum(planes[p].astype(np.uint8) << bit for bit, p in enumerate(perm))
+    table = np.empty((256, 256, 2), dtype=np.uint8)
+    table[..., 0] = (colours[..., 0] << 4) | colours[..., 1]
+    table[..., 1] = (colours[..., 2] << 4) | colours[..., 3]
+    return table
+
+
+def merge_pairs(data0, data1, table, xor_val=0):
+    """Merge two equal-length plane buffers through a pair table, returning bytes."""
+    a = np.frombuffer(data0, dtype=np.uint8)
+    b = np.frombuffer(data1, dtype=np.uint8)
+    if xor_val:
+        a = a ^ np.uint8(xor_val)
+        b = b ^ np.uint8(xor_val)
+    return table[a, b].tobytes()
+
+
+def merge_stream(file0, file1, outfile, table, xor_val=0, length=None, chunk_size=CHUNK_SIZE):
+    """
+    Merge two plane files chunk by chunk, so memory stays at chunk_size per
+    ROM however large the set. length caps the number of input bytes used.
+    Returns the number of input bytes merged from each file.
+    """
+    done = 0
+    while length is None or done < length:
+        size = chunk_size if length is None else min(chunk_size, length - done)
+        chunk0 = file0.read(size)
+        chunk1 = file1.read(size)
+        if len(chunk0) != len(chunk1):
+            raise ValueError("Input files must have the same length.")
+        if not chunk0:
+            break
+        outfile.write(merge_pairs(chunk0, chunk1, table, xor_val))
+        done += len(chunk0)
+    return done
+
+
+def tile_colours(data0, data1, perm, count, xor_val=0):
+    """(count, 64) colour indices for the first count characters with a plane order."""
+    size = count * TILE_PLANE_BYTES
+    pairs = np.frombuffer(merge_pairs(data0[:size], data1[:size], pair_table(perm), xor_val), dtype=np.uint8)
+    pixels = np.empty((pairs.size, 2), dtype=np.uint8)
+    pixels[:, 0] = pairs >> 4
+    pixels[:, 1] = pairs & 0x0F
+    return pixels.reshape(count, 64)
+
+
+def best_plane_permutation(data0, data1, num_chars, xor_val=0):
+    """
+    Pick the plane order under which the first 16 characters come out as the
+    solid colours 0-15. Ties go to the first order tried, as before.
+    """
+    count = min(16, num_chars)
+    expected = np.arange(count, dtype=np.uint8)[:, None]
+    best_score = -1
+    best_perm = None
+    for perm in permutations([0, 1, 2, 3]):
+        colours = tile_colours(data0, data1, perm, count, xor_val)
+        score = int((colours == expected).all(axis=1).sum())
+        if score > best_score:
+            best_score = score
+            best_perm = perm
+        if score == 16:
+            break
+    return best_perm
@@ -0,0 +1,126 @@
+"""
+Incremental rebuild state for the conversion pipeline
+=====================================================
+
+Every output the pipeline writes is recorded in a JSON state file together
+with a fingerprint of what it was built from: the hashes of its input files
+(or just the ROM bytes it actually read), the job settings and the source of
+the code that made it. On the next run an output is skipped when its
+fingerprint is unchanged and the files it produced are still on disk exactly
+as they were left (same size and modification time).
+
+    state = BuildState("convert_data.state.json")
+    fp = digest(job_settings, rom_bytes, source_digest("decomp"))
+    if not state.fresh("MAPS/title_screen_81c6.bin", fp, root):
+        ...build it...
+        state.record("MAPS/title_screen_81c6.bin", fp, root, [output_path])
+    state.save()
+"""
+
+import hashlib
+import json
+import os
+import sys
+import types
+from pathlib import Path
+
+STATE_VERSION = 1
+
+
+def digest(*parts):
+    """Hex SHA-1 over a sequence of bytes-like objects and strings (other values use repr())."""
+    h = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        elif not isinstance(part, (bytes, bytearray, memoryview)):
+            part = repr(part).encode("utf-8")
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def local_modules(*module_names):
+    """
+    The named (already imported) modules plus every module from the same
+    folder they use, directly or through another local module.
+    """
+    found = {}
+    stack = [sys.modules[name] for name in module_names]
+    while stack:
+        module = stack.pop()
+        if module.__name__ in found:
+            continue
+        found[module.__name__] = module
+        folder = Path(module.__file__).parent
+        for value in vars(module).values():
+            dep = value if isinstance(value, types.ModuleType) else sys.modules.get(getattr(value, "__module__", None) or "")
+            if dep is not None and getattr(dep, "__file__", None) and Path(dep.__file__).parent == folder:
+                stack.append(dep)
+    return [found[name] for name in sorted(found)]
+
+
+_source_digests = {}
+
+def source_digest(*module_names):
+    """Hash of the source of the named modules and the local modules they use, the "script version"."""
+    key = tuple(module_names)
+    if key not in _source_digests:
+        modules = local_modules(*module_names)
+        _source_digests[key] = digest(*(part for m in modules for part in (m.__name__, Path(m.__file__).read_bytes())))
+    return _source_digests[key]
+
+
+def _stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BuildState:
+    """Fingerprints and output stats of everything built so far, keyed by output name."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if state.get("version") == STATE_VERSION:
+                    self.entries = state["outputs"]
+            except (OSError, ValueError, KeyError):
+                print(f"⚠️ Ignoring unreadable build state {self.path}")
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def fresh(self, key, fingerprint, root):
+        """True if key was built from this fingerprint and its files are untouched since."""
+        entry = self.entries.get(key)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return False
+        for name, stat in entry["files"].items():
+            try:
+                if _stat(Path(root) / name) != stat:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def record(self, key, fingerprint, root, paths, **extra):
+        """Remember that key was built from fingerprint, producing the files at paths."""
+        root = Path(root)
+        files = {}
+        for path in paths:
+            path = Path(path)
+            files[os.path.relpath(path, root).replace(os.sep, "/")] = _stat(path)
+        self.entries[key] = dict(extra, fingerprint=fingerprint, files=files)
+
+    def forget(self, key):
+        self.entries.pop(key, None)
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": STATE_VERSION, "outputs": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -0,0 +1,138 @@
+"""
+Whole-buffer byte transforms for the Rampage ROM conversions
+============================================================
+
+Every per-byte rewrite the conversion does is a fixed 256-entry mapping, so
+it is done with bytes.translate() on the whole buffer instead of a Python
+loop:
+
+    REVERSE_NIBBLES  bit order reversed inside each nybble (0b1010 -> 0b0101)
+    SWAP_NIBBLES     high and low nybble exchanged (0x12 -> 0x21)
+    xor_table(v)     every byte XORed with v
+
+Tables chain with compose(), e.g. compose(REVERSE_NIBBLES, xor_table(0xFF))
+is swap_nybble.py with an FF argument.
+
+interleave() merges several ROMs byte by byte (a0 b0 c0 d0 a1 b1 ...) with
+one strided memoryview assignment per ROM, as merge-binary.py does for the
+four sprite ROMs.
+
+Usage:
+    python byte_transform.py reverse input.bin output.bin [--xor FF]
+    python byte_transform.py swap input.bin output.bin [--xor FF]
+    python byte_transform.py xor input.bin output.bin FF
+    python byte_transform.py interleave output.bin rom0.bin rom1.bin [...]
+"""
+
+import argparse
+import sys
+
+import instrument
+
+
+def _reverse_nibble(n):
+    return ((n & 1) << 3) | ((n & 2) << 1) | ((n & 4) >> 1) | ((n & 8) >> 3)
+
+
+IDENTITY = bytes(range(256))
+REVERSE_NIBBLES = bytes((_reverse_nibble(b >> 4) << 4) | _reverse_nibble(b & 0x0F) for b in range(256))
+SWAP_NIBBLES = bytes(((b & 0x0F) << 4) | (b >> 4) for b in range(256))
+
+
+def xor_table(xor_val):
+    """Translate table XORing every byte with xor_val (0-255)."""
+    if not 0 <= xor_val <= 0xFF:
+        raise ValueError(f"XOR value must be a byte, got {xor_val:#x}")
+    return bytes(b ^ xor_val for b in range(256))
+
+
+def compose(*tables):
+    """One table applying each of tables in turn."""
+    result = IDENTITY
+    for table in tables:
+        result = result.translate(table)
+    return result
+
+
+def transform(data, *tables):
+    """Run data through the given translate tables, returning bytes."""
+    return bytes(data).translate(compose(*tables))
+
+
+def reverse_nibbles(data, xor_val=0):
+    """Reverse the bit order of each nybble, then XOR with xor_val."""
+    return transform(data, REVERSE_NIBBLES, xor_table(xor_val))
+
+
+def swap_nibbles(data, xor_val=0):
+    """Swap the high and low nybble of every byte, then XOR with xor_val."""
+    return transform(data, SWAP_NIBBLES, xor_table(xor_val))
+
+
+def interleave(*datas):
+    """
+    Interleave buffers byte by byte. Stops at the end of the shortest one,
+    like reading a byte from each file until any of them runs out.
+    """
+    count = len(datas)
+    length = min(len(data) for data in datas) if datas else 0
+    output = bytearray(length * count)
+    view = memoryview(output)
+    for i, data in enumerate(datas):
+        view[i::count] = memoryview(data)[:length]
+    return bytes(output)
+
+
+def _hex_byte(text):
+    return int(text, 16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nybble, XOR and interleave transforms on ROM files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("reverse", "Reverse the bit order inside each nybble"),
+                            ("swap", "Swap the high and low nybble of each byte")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("input")
+        p.add_argument("output")
+        p.add_argument("--xor", type=_hex_byte, default=0, help="XOR the result with this hex byte")
+
+    p = sub.add_parser("xor", help="XOR every byte with a hex value")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("value", type=_hex_byte)
+
+    p = sub.add_parser("interleave", help="Interleave ROMs byte by byte")
+    p.add_argument("output")
+    p.add_argument("inputs", nargs="+")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "interleave":
+            datas = []
+            for name in args.inputs:
+                with open(name, "rb") as f:
+                    datas.append(f.read())
+            result = interleave(*datas)
+        else:
+            with open(args.input, "rb") as f:
+                data = f.read()
+            if args.command == "reverse":
+                result = reverse_nibbles(data, args.xor)
+            elif args.command == "swap":
+                result = swap_nibbles(data, args.xor)
+            else:
+                result = transform(data, xor_table(args.value))
+    except (OSError, ValueError) as e:
+        sys.exit(f"Error: {e}")
+
+    with open(args.output, "wb") as f:
+        f.write(result)
+    print(f"Wrote {len(result)} bytes to {args.output}")
+
+
+if __name__ == "__main__":
+    instrument.start()
+    main()
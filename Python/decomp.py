@@ -1,68 +1,129 @@
-import sys
-
-def decode_character_data(data, base_offset):
-    """
-    Decode compressed character data and return (output_bytes, end_offset).
-    """
-    i = 0
-    out = []
-
-    while i < len(data):
-        control = data[i]
-        i += 1
-
-        if control == 0x00:
-            break  # End of data
-
-        if control & 0x80:
-            count = control & 0x7F
-            for _ in range(count):
-                if i + 1 >= len(data):
-                    break
-                lo = data[i]
-                hi = data[i + 1] & 0x3F
-                out.append(lo)
-                out.append(hi)
-                i += 2
-        else:
-            count = control
-            if i + 1 >= len(data):
-                break
-            lo = data[i]
-            hi = data[i + 1] & 0x3F
-            i += 2
-            out.extend([lo, hi] * count)
-
-    end_offset = base_offset + i
-    return bytes(out), end_offset
-
-
-def main():
-    if len(sys.argv) != 4:
-        print("Usage: python decomp.py input.bin output.bin offset")
-        return
-
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
-    offset_str = sys.argv[3]
-
-    try:
-        offset = int(offset_str, 16)
-    except ValueError:
-        print("Invalid hex offset:", offset_str)
-        return
-
-    with open(input_file, "rb") as f:
-        f.seek(offset)
-        raw = f.read()
-
-    decoded, end_offset = decode_character_data(raw, offset)
-
-    with open(output_file, "wb") as f:
-        f.write(decoded)
-
-    print(f"✅ Decoded {len(decoded)} bytes to {output_file}")
-    print(f"🧭 Compressed data ended at offset: ${end_offset:04X}")
-
-if __name__ == "__main__":
-    main()
+import sys
+
+import instrument
+from instrument import span, tally
+from rom_image import RomImage
+from symbols import resolve_address
+
+def decode_character_data(data, base_offset):
+    """
+    Decode compressed character data and return (output_bytes, end_offset).
+    """
+    i = 0
+    out = []
+
+    while i < len(data):
+        control = data[i]
+        i += 1
+
+        if control == 0x00:
+            break  # End of data
+
+        if control & 0x80:
+            count = control & 0x7F
+            for _ in range(count):
+                if i + 1 >= len(data):
+                    break
+                lo = data[i]
+                hi = data[i + 1] & 0x3F
+                out.append(lo)
+                out.append(hi)
+                i += 2
+        else:
+            count = control
+            if i + 1 >= len(data):
+                break
+            lo = data[i]
+            hi = data[i + 1] & 0x3F
+            i += 2
+            out.extend([lo, hi] * count)
+
+    end_offset = base_offset + i
+    tally("rle_blocks")
+    tally("rle_bytes_read", i)
+    tally("rle_bytes_decoded", len(out))
+    return bytes(out), end_offset
+
+
+def encode_character_data(data):
+    """
+    Encode character data into the smallest stream decode_character_data() turns back into it.
+
+    n, lo, hi repeats a word n times (3 bytes) and $80 | n is followed by n
+    literal words (1 + 2n bytes), n being 1-127; $00 ends the stream. cost[i]
+    is the size of the best encoding of words i..end, worked out from the end:
+    a repeat always takes the longest run it can (cost never grows as i does),
+    so each word only weighs one repeat against at most 127 literal lengths.
+    """
+    if len(data) % 2:
+        raise ValueError(f"Character data is {len(data)} bytes, not a whole number of words")
+    words = [(data[i], data[i + 1]) for i in range(0, len(data), 2)]
+    for i, (_, hi) in enumerate(words):
+        if hi > 0x3F:
+            raise ValueError(f"Word {i} has hi byte ${hi:02X}, the RLE format only keeps $3F")
+
+    n = len(words)
+    run = [1] * n
+    for i in range(n - 2, -1, -1):
+        if words[i] == words[i + 1]:
+            run[i] = run[i + 1] + 1
+
+    cost = [0] * (n + 1)
+    step = [None] * n  # (is_literal, count)
+    for i in range(n - 1, -1, -1):
+        count = min(run[i], 0x7F)
+        best, best_step = 3 + cost[i + count], (False, count)
+        for count in range(1, min(n - i, 0x7F) + 1):
+            literal = 1 + 2 * count + cost[i + count]
+            if literal < best:
+                best, best_step = literal, (True, count)
+        cost[i], step[i] = best, best_step
+
+    out = bytearray()
+    i = 0
+    while i < n:
+        literal, count = step[i]
+        if literal:
+            out.append(0x80 | count)
+            for lo, hi in words[i:i + count]:
+                out += bytes((lo, hi))
+        else:
+            out += bytes((count,) + words[i])
+        i += count
+    out.append(0x00)
+    return bytes(out)
+
+
+def main():
+    if len(sys.argv) != 4:
+        print("Usage: python decomp.py input.bin output.bin offset")
+        print("  offset is hex (81C6) or a game.bin.lst label (score_status_lines, base_table+4)")
+        return
+
+    input_file = sys.argv[1]
+    output_file = sys.argv[2]
+    offset_str = sys.argv[3]
+
+    try:
+        offset = resolve_address(offset_str)
+    except (KeyError, FileNotFoundError) as e:
+        print("Invalid offset:", e.args[0] if isinstance(e, KeyError) else e)
+        return
+
+    # The RLE walker reads straight out of the mapped ROM, nothing is copied
+    with RomImage.open(input_file) as rom:
+        if not rom.contains(offset, 0):
+            print(f"Offset ${offset:04X} is past the end of {input_file}")
+            return
+        with span("rle_decode", offset=f"{offset:04X}"):
+            decoded, end_offset = decode_character_data(rom.view(offset), offset)
+
+    with open(output_file, "wb") as f:
+        f.write(decoded)
+
+    print(f"✅ Decoded {len(decoded)} bytes to {output_file}")
+    print(f"🧭 Compressed data ended at offset: ${end_offset:04X}")
+
+if __name__ == "__main__":
+    instrument.start()
+    main()
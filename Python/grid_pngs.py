@@ -1,92 +1,254 @@
-import os
-import math
-import sys
-import re
-from PIL import Image, ImageDraw, ImageFont
-
-def extract_level_number(filename):
-    m = re.search(r'(\d+)', filename)
-    if m:
-        return m.group(1)
-    return ""
-
-def draw_level_number(img, number):
-    draw = ImageDraw.Draw(img)
-    w, _ = img.size
-    try:
-        font = ImageFont.truetype("arial.ttf", 28)
-    except IOError:
-        font = ImageFont.load_default()
-    # Convert to int to remove leading zeros if number is numeric
-    text = str(int(number)) if number.isdigit() else str(number)
-
-    # Robust text sizing: try textbbox (Pillow >=8.0.0), else font.getsize
-    try:
-        bbox = draw.textbbox((0, 0), text, font=font)
-        tw = bbox[2] - bbox[0]
-        th = bbox[3] - bbox[1]
-    except AttributeError:
-        tw, th = font.getsize(text)
-
-    tx = (w - tw) // 2
-    ty = 8
-    # Draw black outline (corners)
-    for dx in (-1, 1):
-        for dy in (-1, 1):
-            draw.text((tx+dx, ty+dy), text, font=font, fill='black')
-    # Draw white text
-    draw.text((tx, ty), text, font=font, fill='white')
-
-def draw_grid_lines(img, across, rows, img_w, img_h):
-    draw = ImageDraw.Draw(img)
-    # Draw vertical lines
-    for i in range(1, across):
-        x = i * img_w
-        draw.line([(x, 0), (x, img.size[1]-1)], fill="white", width=1)
-    # Draw horizontal lines
-    for i in range(1, rows):
-        y = i * img_h
-        draw.line([(0, y), (img.size[0]-1, y)], fill="white", width=1)
-
-def main(folder, output, across=15, show_number=False, show_grid=False):
-    files = sorted([f for f in os.listdir(folder) if f.lower().endswith('.png')])
-    if not files:
-        print("No PNG files found in", folder)
-        return
-
-    img_w, img_h = 250, 240
-    total = len(files)
-    rows = math.ceil(total / across)
-    grid_w = across * img_w
-    grid_h = rows * img_h
-
-    print(f"Combining {total} images ({across} across, {rows} down) into {grid_w}x{grid_h} PNG.")
-
-    grid_img = Image.new('RGBA', (grid_w, grid_h), (0, 0, 0, 255))
-
-    for idx, fname in enumerate(files):
-        x = (idx % across) * img_w
-        y = (idx // across) * img_h
-        im = Image.open(os.path.join(folder, fname)).convert('RGBA')
-        if show_number:
-            level_number = extract_level_number(fname)
-            draw_level_number(im, level_number)
-        grid_img.paste(im, (x, y))
-        im.close()
-
-    if show_grid:
-        draw_grid_lines(grid_img, across, rows, img_w, img_h)
-
-    grid_img.save(output)
-    print("Saved:", output)
-
-if __name__ == "__main__":
-    import argparse
-    parser = argparse.ArgumentParser(description="Arrange PNGs in a grid, with options for level numbers and a grid overlay.")
-    parser.add_argument('folder', help='Folder with PNG files')
-    parser.add_argument('output', help='Output PNG filename')
-    parser.add_argument('--across', type=int, default=15, help='How many images across per row (default 15)')
-    parser.add_argument('--number', action='store_true', help='Overlay level numbers extracted from filenames')
-    parser.add_argument('--grid', action='store_true', help='Draw a white grid between images')
-    args = parser.parse_args()
-    main(args.folder, args.output, args.across, args.number, args.grid)
+import os
+import math
+import struct
+import sys
+import re
+import zlib
+from PIL import Image, ImageDraw, ImageFont
+
+import numpy as np
+
+import instrument
+from image_formats import IMAGE_EXTENSIONS, load_image
+from image_writer import flush, save_image, writer
+from instrument import span, tally
+
+def extract_level_number(filename):
+    m = re.search(r'(\d+)', filename)
+    if m:
+        return m.group(1)
+    return ""
+
+def draw_level_number(img, number):
+    draw = ImageDraw.Draw(img)
+    w, _ = img.size
+    try:
+        font = ImageFont.truetype("arial.ttf", 28)
+    except IOError:
+        font = ImageFont.load_default()
+    # Convert to int to remove leading zeros if number is numeric
+    text = str(int(number)) if number.isdigit() else str(number)
+
+    # Robust text sizing: try textbbox (Pillow >=8.0.0), else font.getsize
+    try:
+        bbox = draw.textbbox((0, 0), text, font=font)
+        tw = bbox[2] - bbox[0]
+        th = bbox[3] - bbox[1]
+    except AttributeError:
+        tw, th = font.getsize(text)
+
+    tx = (w - tw) // 2
+    ty = 8
+    # Draw black outline (corners)
+    for dx in (-1, 1):
+        for dy in (-1, 1):
+            draw.text((tx+dx, ty+dy), text, font=font, fill='black')
+    # Draw white text
+    draw.text((tx, ty), text, font=font, fill='white')
+
+def draw_grid_lines(img, across, rows, img_w, img_h, first_row=1):
+    draw = ImageDraw.Draw(img)
+    # Draw vertical lines
+    for i in range(1, across):
+        x = i * img_w
+        draw.line([(x, 0), (x, img.size[1]-1)], fill="white", width=1)
+    # Draw horizontal lines
+    for i in range(first_row, rows):
+        y = i * img_h
+        draw.line([(0, y), (img.size[0]-1, y)], fill="white", width=1)
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def signed_size(rows):
+    """Sum of |byte| per row, reading the bytes as signed (-128 counts as 128)."""
+    return np.abs(rows.view(np.int8)).view(np.uint8).sum(axis=1, dtype=np.int64)
+
+def filter_rows(rows, prior, bpp=4):
+    """
+    PNG-filter a band of scanlines (h, width * bpp) with None, Sub or Up, picking
+    per row the one with the smallest sum of absolute signed bytes. prior is the
+    last row of the band above (zeros for the first band). Average and Paeth
+    cost more time than they save on flat tile art, so they are not tried.
+    """
+    above = np.vstack([prior[None, :], rows[:-1]])
+    left = np.zeros_like(rows)
+    left[:, bpp:] = rows[:, :-bpp]
+
+    out = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+    out[:, 0] = 0
+    out[:, 1:] = rows
+    best = signed_size(rows)
+    for kind, filtered in ((1, rows - left), (2, rows - above)):  # bytes wrap mod 256, as PNG filters do
+        cost = signed_size(filtered)
+        better = cost < best
+        best[better] = cost[better]
+        out[better, 0] = kind
+        out[better, 1:] = filtered[better]
+    return out
+
+FILTER_ROWS = 16  # scanlines filtered at a time, keeps the temporaries small
+DEFAULT_COMPRESS_LEVEL = 6  # Pillow's own default, used when --compress-level is not given
+
+class PNGStream:
+    """
+    RGBA PNG written a band of rows at a time; only the band being encoded is
+    held in memory. It is encoded here rather than by Pillow, so --optimize
+    does not apply; compress_level is the zlib level.
+    """
+
+    def __init__(self, f, width, height, compress_level=DEFAULT_COMPRESS_LEVEL):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.prior = np.zeros(width * 4, dtype=np.uint8)
+        self.compressor = zlib.compressobj(compress_level)
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)))
+
+    def write_rows(self, pixels):
+        """Append an (h, width, 4) uint8 band of rows."""
+        rows = np.ascontiguousarray(pixels, dtype=np.uint8).reshape(len(pixels), self.width * 4)
+        if self.rows + len(rows) > self.height:
+            raise ValueError(f"PNG is {self.height} rows high, got row {self.rows + len(rows)}")
+        with span("png_encode"):
+            for start in range(0, len(rows), FILTER_ROWS):
+                chunk = rows[start:start + FILTER_ROWS]
+                data = self.compressor.compress(filter_rows(chunk, self.prior).tobytes())
+                if data:
+                    self.f.write(png_chunk(b"IDAT", data))
+                self.prior = chunk[-1].copy()
+        self.rows += len(rows)
+
+    def close(self):
+        if self.rows != self.height:
+            raise ValueError(f"PNG is {self.height} rows high, only {self.rows} were written")
+        self.f.write(png_chunk(b"IDAT", self.compressor.flush()))
+        self.f.write(png_chunk(b"IEND", b""))
+
+class ContactSheet:
+    """
+    A grid of images written one band (row of images) at a time, so memory
+    stays at one band however many images there are. Images are added in
+    grid order with add(), straight from a renderer or from disk. The sheet
+    is compressed at --compress-level; --optimize is not used for it.
+    """
+
+    def __init__(self, output, total, across=15, show_number=False, show_grid=False, cell=(250, 240)):
+        self.img_w, self.img_h = cell
+        self.across = across
+        self.rows = math.ceil(total / across)
+        self.show_number = show_number
+        self.show_grid = show_grid
+        self.output = output
+        self.f = open(output, "wb")
+        level = writer().compress_level
+        self.png = PNGStream(self.f, across * self.img_w, self.rows * self.img_h,
+                             DEFAULT_COMPRESS_LEVEL if level is None else level)
+        self.band = None
+        self.band_row = 0
+        self.count = 0
+
+    def add(self, label, im):
+        """Paste the next image; label is the level number drawn on it with show_number."""
+        if self.band is None:
+            self.band = Image.new('RGBA', (self.across * self.img_w, self.img_h), (0, 0, 0, 255))
+        im = im.convert('RGBA')
+        if self.show_number:
+            draw_level_number(im, label)
+        self.band.paste(im, ((self.count % self.across) * self.img_w, 0))
+        tally("images_pasted")
+        self.count += 1
+        if self.count % self.across == 0:
+            self._flush()
+
+    def _flush(self):
+        if self.show_grid:
+            # Horizontal line along the top of every band but the first
+            draw_grid_lines(self.band, self.across, 1, self.img_w, self.img_h, first_row=0 if self.band_row else 1)
+        self.png.write_rows(np.asarray(self.band))
+        self.band = None
+        self.band_row += 1
+
+    def close(self):
+        while self.band_row < self.rows:
+            if self.band is None:
+                self.band = Image.new('RGBA', (self.across * self.img_w, self.img_h), (0, 0, 0, 255))
+            self._flush()
+        self.png.close()
+        self.f.close()
+        tally("images_saved")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self.f.close()
+
+def folder_images(folder, files):
+    """(level number, image) for each file, opened one at a time."""
+    for fname in files:
+        with span("png_decode"):
+            im = load_image(os.path.join(folder, fname)).convert('RGBA')
+        yield extract_level_number(fname), im
+        im.close()
+
+def main(folder, output, across=15, show_number=False, show_grid=False, stream=False):
+    files = sorted([f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS)])
+    if not files:
+        print("No PNG, QOI or .npy files found in", folder)
+        return
+
+    img_w, img_h = 250, 240
+    total = len(files)
+    if stream:
+        rows = math.ceil(total / across)
+        print(f"Streaming {total} images ({across} across, {rows} down) into {across * img_w}x{rows * img_h} PNG.")
+        with ContactSheet(output, total, across, show_number, show_grid, (img_w, img_h)) as sheet:
+            for label, im in folder_images(folder, files):
+                sheet.add(label, im)
+        print("Saved:", output)
+        return
+    rows = math.ceil(total / across)
+    grid_w = across * img_w
+    grid_h = rows * img_h
+
+    print(f"Combining {total} images ({across} across, {rows} down) into {grid_w}x{grid_h} PNG.")
+
+    grid_img = Image.new('RGBA', (grid_w, grid_h), (0, 0, 0, 255))
+
+    for idx, fname in enumerate(files):
+        x = (idx % across) * img_w
+        y = (idx // across) * img_h
+        with span("png_decode"):
+            im = load_image(os.path.join(folder, fname)).convert('RGBA')
+        if show_number:
+            level_number = extract_level_number(fname)
+            draw_level_number(im, level_number)
+        grid_img.paste(im, (x, y))
+        im.close()
+        tally("images_pasted")
+
+    if show_grid:
+        draw_grid_lines(grid_img, across, rows, img_w, img_h)
+
+    save_image(grid_img, output)
+    flush()
+    print("Saved:", output)
+
+if __name__ == "__main__":
+    instrument.start()
+    import argparse
+    parser = argparse.ArgumentParser(description="Arrange PNGs in a grid, with options for level numbers and a grid overlay.")
+    parser.add_argument('folder', help='Folder with PNG files (QOI and .npy arrays are read too)')
+    parser.add_argument('output', help='Output PNG filename')
+    parser.add_argument('--across', type=int, default=15, help='How many images across per row (default 15)')
+    parser.add_argument('--number', action='store_true', help='Overlay level numbers extracted from filenames')
+    parser.add_argument('--grid', action='store_true', help='Draw a white grid between images')
+    parser.add_argument('--stream', action='store_true', help='Build and encode the sheet one row of images at a time (constant memory)')
+    args = parser.parse_args()
+    main(args.folder, args.output, args.across, args.number, args.grid, args.stream)
@@ -0,0 +1,192 @@
+"""
+Image file formats
+==================
+
+The renderers save through image_writer.save_image(), and the file's
+extension picks the format:
+
+    .png    Pillow PNG, deflate-compressed (the final export)
+    .qoi    QOI, lossless; several times faster to write than PNG for big sheets
+    .npy    the raw pixel array, uncompressed (a hand-off to another script)
+
+A .npy holds the image exactly as its pixels sit in memory: (h, w, 3) for
+RGB, (h, w, 4) for RGBA and (h, w) for greyscale. Indexed ("P") images keep
+their (h, w) plane of palette indices, and the palette goes next to it as a
+.pal file of RGB triples in image order (not the reversed layout of the game
+palettes). load_image() memory-maps the array, so reading one back costs no
+decoding at all:
+
+    level_generator_final.py cpu.bin BG-REV.bin palettes_1.pal LEVELS/L --format npy
+    grid_pngs.py LEVELS All_Levels.png
+
+QOI files are encoded here with NumPy (Pillow's own QOI writer runs in
+Python a pixel at a time, which is slower than PNG) and read back by Pillow.
+Anything else goes straight to Pillow.
+"""
+
+import os
+import struct
+
+import numpy as np
+from PIL import Image
+
+FORMATS = {".png": "PNG", ".qoi": "QOI", ".npy": "NPY"}
+IMAGE_EXTENSIONS = tuple(FORMATS)
+PALETTE_SUFFIX = ".pal"
+
+QOI_HEADER = struct.Struct(">4sIIBB")
+QOI_END = bytes(7) + b"\x01"
+QOI_RUN_MAX = 62
+QOI_OP_INDEX, QOI_OP_DIFF, QOI_OP_LUMA, QOI_OP_RUN, QOI_OP_RGB, QOI_OP_RGBA = 0x00, 0x40, 0x80, 0xC0, 0xFE, 0xFF
+
+
+def format_for(path, default=None):
+    """Format name for a file name's extension ("PNG", "QOI", "NPY"), or default."""
+    return FORMATS.get(os.path.splitext(str(path))[1].lower(), default)
+
+
+def suffix_for(name):
+    """File extension for a format name given on the command line (png, qoi or npy)."""
+    for suffix, format in FORMATS.items():
+        if format == name.upper():
+            return suffix
+    raise ValueError(f"Unknown image format {name!r} (expected one of {', '.join(s[1:] for s in FORMATS)})")
+
+
+def palette_path(path):
+    return os.path.splitext(str(path))[0] + PALETTE_SUFFIX
+
+
+def encode_qoi(pixels):
+    """
+    QOI file bytes for an (h, w, 3) or (h, w, 4) uint8 array, identical to
+    what the reference encoder writes.
+
+    Every choice the encoder makes only depends on the pixel before and on
+    the hash table, and the table entry a pixel looks up always holds the
+    last earlier pixel (outside a run) with the same hash. So the runs are
+    found first, the op for every other pixel is worked out for the whole
+    image at once, and the ops are written at offsets from a running sum of
+    their sizes.
+    """
+    height, width, channels = pixels.shape
+    n = height * width
+    px = np.empty((n + 1, 4), dtype=np.uint8)  # row 0 is the (0, 0, 0, 255) the encoder starts from
+    px[0] = (0, 0, 0, 255)
+    px[1:, :channels] = pixels.reshape(n, channels)
+    if channels == 3:
+        px[1:, 3] = 255
+    packed = px.view(">u4")[:, 0]
+    run = packed[1:] == packed[:-1]
+
+    # Runs of the previous pixel, cut into ops of at most 62; each op sits on its last pixel
+    edges = np.diff(run.view(np.int8), prepend=np.int8(0), append=np.int8(0))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    chunks = (ends - starts + QOI_RUN_MAX - 1) // QOI_RUN_MAX
+    segment = np.repeat(np.arange(len(starts)), chunks)
+    done = (np.arange(len(segment)) - np.repeat(np.cumsum(chunks) - chunks, chunks)) * QOI_RUN_MAX
+    run_length = np.minimum(ends[segment] - starts[segment] - done, QOI_RUN_MAX)
+    run_at = starts[segment] + done + run_length - 1
+
+    # Everything else is worked out only for the pixels outside runs
+    at = np.flatnonzero(~run)
+    prev, px, packed = px[at], px[at + 1], packed[at + 1]
+
+    # Index hits: the last earlier pixel with the same hash (a stable sort by hash keeps them in order)
+    hashes = (px[:, 0] * 3 + px[:, 1] * 5 + px[:, 2] * 7 + px[:, 3] * 11) & 63  # uint8 wraps, & 63 survives it
+    order = np.argsort(hashes, kind="stable")  # a radix sort for uint8
+    sorted_hashes = hashes[order]
+    same = sorted_hashes[1:] == sorted_hashes[:-1]
+    table = np.zeros(len(at), dtype=packed.dtype)
+    table[order[1:][same]] = packed[order[:-1][same]]
+    index = table == packed
+
+    # Channel differences wrap like the reference encoder's signed chars
+    delta = (px - prev).view(np.int8)
+    small = (delta + 2).view(np.uint8)  # 0-3 when the difference is -2..1
+    vr, vg, vb = delta[:, 0], delta[:, 1], delta[:, 2]
+    vg_r = vr - vg
+    vg_b = vb - vg
+    vr, vg, vb, vg_r, vg_b = (v.astype(np.int16) for v in (vr, vg, vb, vg_r, vg_b))
+    colour = ~index
+    same_alpha = delta[:, 3] == 0
+    diff = colour & same_alpha & ((small[:, 0] | small[:, 1] | small[:, 2]) <= 3)
+    luma = colour & same_alpha & ~diff & (vg_r >= -8) & (vg_r <= 7) & (vg >= -32) & (vg <= 31) & (vg_b >= -8) & (vg_b <= 7)
+    rgb = colour & same_alpha & ~diff & ~luma
+    rgba = colour & ~same_alpha
+
+    sizes = np.zeros(n, dtype=np.int64)
+    sizes[run_at] = 1
+    op_sizes = np.ones(len(at), dtype=np.int64)
+    op_sizes[luma] = 2
+    op_sizes[rgb] = 4
+    op_sizes[rgba] = 5
+    sizes[at] = op_sizes
+    offsets = QOI_HEADER.size + np.cumsum(sizes) - sizes
+    out = np.zeros(QOI_HEADER.size + int(sizes.sum()) + len(QOI_END), dtype=np.uint8)
+    out[:QOI_HEADER.size] = np.frombuffer(QOI_HEADER.pack(b"qoif", width, height, channels, 0), dtype=np.uint8)
+    out[len(out) - len(QOI_END):] = np.frombuffer(QOI_END, dtype=np.uint8)
+
+    out[offsets[run_at]] = QOI_OP_RUN | (run_length - 1)
+    offsets = offsets[at]
+    out[offsets[index]] = QOI_OP_INDEX | hashes[index]
+    out[offsets[diff]] = QOI_OP_DIFF | ((vr[diff] + 2) << 4) | ((vg[diff] + 2) << 2) | (vb[diff] + 2)
+    where = offsets[luma]
+    out[where] = QOI_OP_LUMA | (vg[luma] + 32)
+    out[where + 1] = ((vg_r[luma] + 8) << 4) | (vg_b[luma] + 8)
+    for mask, tag, count in ((rgb, QOI_OP_RGB, 3), (rgba, QOI_OP_RGBA, 4)):
+        where = offsets[mask]
+        out[where] = tag
+        for channel in range(count):
+            out[where + 1 + channel] = px[mask, channel]
+    return out.tobytes()
+
+
+def image_pixels(image):
+    """The image as a NumPy array (RGB, RGBA, greyscale or palette indices)."""
+    if image.mode not in ("RGB", "RGBA", "L", "P"):
+        image = image.convert("RGBA" if "A" in image.mode else "RGB")
+    return np.asarray(image)
+
+
+def save_npy(image, fp):
+    np.save(fp, image_pixels(image), allow_pickle=False)
+    if image.mode == "P" and isinstance(fp, (str, os.PathLike)):
+        with open(palette_path(fp), "wb") as f:
+            f.write(bytes(image.getpalette()))
+
+
+def save_qoi(image, fp):
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    data = encode_qoi(np.asarray(image))
+    if isinstance(fp, (str, os.PathLike)):
+        with open(fp, "wb") as f:
+            f.write(data)
+    else:
+        fp.write(data)
+
+
+def save(image, fp, format=None, **options):
+    """image.save(fp, format, **options), with .npy and QOI written here."""
+    format = (format or format_for(getattr(fp, "name", fp)) or "").upper()
+    if format == "NPY":
+        save_npy(image, fp)
+    elif format == "QOI":
+        save_qoi(image, fp)
+    else:
+        image.save(fp, format=format or None, **options)
+
+
+def load_image(path):
+    """Open an image file; .npy arrays are memory-mapped rather than read, with their .pal if there is one."""
+    if format_for(path) != "NPY":
+        return Image.open(path)
+    pixels = np.load(path, mmap_mode="r", allow_pickle=False)
+    palette = palette_path(path)
+    if pixels.ndim == 2 and os.path.exists(palette):
+        image = Image.fromarray(pixels)
+        with open(palette, "rb") as f:
+            image.putpalette(f.read())  # turns it into mode "P"
+        return image
+    return Image.fromarray(pixels)
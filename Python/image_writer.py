@@ -0,0 +1,154 @@
+"""
+Background image writer
+=======================
+
+Every script saves its images through save_image(), in the format the file
+name asks for (PNG, QOI or a raw .npy array, see image_formats.py). With
+writer threads the image is handed to a small thread pool that encodes and
+writes it while the caller goes on rendering the next level or building;
+zlib releases the GIL, so the two really overlap. These options are taken
+off the command line by instrument.start(), like --metrics:
+
+    --write-threads N     encode and write on N threads (default: one less
+                          than the CPU count, at most 4; 0 saves inline)
+    --compress-level N    zlib level for PNGs, 0-9 (default: Pillow's 6)
+    --optimize            let Pillow search for the smallest PNG (slow)
+
+At most QUEUE_PER_THREAD images per thread are waiting at any time;
+save_image() blocks until one is written when the queue is full, so a fast
+renderer cannot pile up images in memory. Images must not be changed after
+they are handed over.
+
+flush() waits for everything queued and re-raises the first error a
+write hit. Scripts call it before they report what they wrote, and the
+pipeline after every job so later jobs and the build state see finished
+files. It runs once more at exit, before the metrics are written; an error
+then is printed and the script exits with status 1.
+"""
+
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import image_formats
+import instrument
+from instrument import span, tally
+
+MAX_THREADS = 4
+QUEUE_PER_THREAD = 2
+
+
+def default_threads():
+    return max(0, min(MAX_THREADS, (os.cpu_count() or 1) - 1))
+
+
+class ImageWriter:
+    """Thread pool saving images in the background, with a bounded queue."""
+
+    def __init__(self, threads=None, compress_level=None, optimize=False, queue_size=None):
+        self.threads = default_threads() if threads is None else threads
+        self.compress_level = compress_level
+        self.optimize = optimize
+        self.pid = os.getpid()
+        self.pool = ThreadPoolExecutor(self.threads, thread_name_prefix="image_writer") if self.threads else None
+        self.slots = threading.BoundedSemaphore(queue_size or max(1, self.threads) * QUEUE_PER_THREAD)
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def save_options(self, fp, kwargs):
+        """kwargs plus the PNG settings, when the image is going to be a PNG."""
+        target = kwargs.get("format") or image_formats.format_for(getattr(fp, "name", fp))
+        if str(target).upper() != "PNG":
+            return kwargs
+        options = dict(kwargs)
+        if self.compress_level is not None:
+            options.setdefault("compress_level", self.compress_level)
+        if self.optimize:
+            options.setdefault("optimize", True)
+        return options
+
+    def _write(self, image, fp, options):
+        with span("png_encode"):
+            image_formats.save(image, fp, **options)
+        tally("images_saved")
+
+    def save(self, image, fp, **kwargs):
+        options = self.save_options(fp, kwargs)
+        if self.pool is None:
+            self._write(image, fp, options)
+            return
+
+        with span("write_queue_wait"):
+            self.slots.acquire()
+        try:
+            future = self.pool.submit(self._write, image, fp, options)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        with self.lock:
+            self.pending = [f for f in self.pending if not f.done() or f.exception() is not None]
+            self.pending.append(future)
+
+    def flush(self):
+        """Wait for every queued image; re-raise the first error."""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        error = None
+        for future in pending:
+            exc = future.exception()
+            if exc is not None and error is None:
+                error = exc
+        if error is not None:
+            raise error
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(wait=True)
+                self.pool = None
+
+
+_writer = None
+
+
+def writer():
+    """The process's writer, set up from the command-line options on first use (again after a fork)."""
+    global _writer
+    if _writer is None or _writer.pid != os.getpid():
+        options = instrument.options()
+        threads = options["write_threads"]
+        level = options["compress_level"]
+        _writer = ImageWriter(None if threads is None else int(threads), None if level is None else int(level),
+                              options["optimize"])
+        instrument.on_finish(_flush_at_exit)
+    return _writer
+
+
+def save_image(image, fp, **kwargs):
+    """image.save(fp, **kwargs), on a writer thread when there are any."""
+    writer().save(image, fp, **kwargs)
+
+
+def encode_image(image, format="PNG", **kwargs):
+    """The encoded file as bytes, right away and with the same PNG settings (for archives and sockets)."""
+    buffer = io.BytesIO()
+    output = writer()
+    output._write(image, buffer, output.save_options(buffer, dict(kwargs, format=format)))
+    return buffer.getvalue()
+
+
+def flush():
+    """Wait for every image saved so far to be written (nothing to do if none were)."""
+    if _writer is not None and _writer.pid == os.getpid():
+        _writer.flush()
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception as e:
+        raise RuntimeError(f"Could not write an image: {e}") from e
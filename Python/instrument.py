@@ -0,0 +1,205 @@
+"""
+Timing, counters and profiling for the conversion scripts
+=========================================================
+
+Every script calls instrument.start() first thing in its __main__ block.
+That takes these options off the command line before the script reads its
+own arguments, so they work the same for argparse and sys.argv scripts:
+
+    --quiet             drop the per-item lines (per building, per layer, ...)
+    --metrics FILE      write span timings and counters as JSON
+    --trace FILE        write a Chrome trace (chrome://tracing, Perfetto)
+    --profile[=FILE]    run under cProfile, save the stats (default <script>.prof)
+                        and print the top functions
+
+--write-threads N, --compress-level N and --optimize are taken off as well
+and used by image_writer.py, which saves every image.
+
+Code marks its stages with spans and counters, which cost next to nothing
+when no output is asked for:
+
+    with span("decode_characters"):
+        atlas = load_atlas(data)
+    tally("tiles_plotted", len(words))
+    detail(f"  ▶ Building ID {building_id:02d} ...")     # print unless --quiet
+
+The metrics JSON has the wall time, the CPU time spent before the script's
+main code ran (interpreter start-up and imports such as Pillow), per-span
+count / total / min / max seconds and the counters. Worker processes
+(level_generator_final.py --jobs) only report through their logs and the
+cache counters they hand back.
+"""
+
+import atexit
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+PROFILE_TOP = 15
+
+_options = {"quiet": False, "metrics": None, "trace": None, "profile": None,
+            "write_threads": None, "compress_level": None, "optimize": False}  # the last three are image_writer.py's
+_counters = Counter()
+_counters_lock = threading.Lock()
+_spans = []  # (name, start, duration, thread id, args)
+_finish_hooks = []
+_state = {"name": None, "start": None, "startup_cpu": None, "profiler": None, "finished": False}
+
+
+def _take_options(argv, script):
+    """Remove the instrumentation options from argv (in place) into _options."""
+    i = 1
+    while i < len(argv):
+        arg = argv[i]
+        name, eq, value = arg.partition("=")
+        if arg in ("--quiet", "--optimize"):
+            _options[arg[2:]] = True
+        elif name == "--profile":
+            _options["profile"] = value if eq else f"{script}.prof"
+        elif name in ("--metrics", "--trace", "--write-threads", "--compress-level"):
+            if not eq:
+                if i + 1 >= len(argv):
+                    sys.exit(f"{name} needs a value")
+                value = argv.pop(i + 1)
+            _options[name[2:].replace("-", "_")] = value
+        else:
+            i += 1
+            continue
+        argv.pop(i)
+
+
+def start(name=None, argv=None):
+    """Read the instrumentation options from argv (default sys.argv) and start timing the run."""
+    argv = sys.argv if argv is None else argv
+    name = name or Path(argv[0]).stem
+    _take_options(argv, name)
+    _state.update(name=name, start=time.perf_counter(), startup_cpu=time.process_time(), finished=False)
+    if _options["profile"]:
+        _state["profiler"] = cProfile.Profile()
+        _state["profiler"].enable()
+    atexit.register(finish)
+    return dict(_options)
+
+
+def options():
+    return dict(_options)
+
+
+def quiet():
+    return _options["quiet"]
+
+
+def set_quiet(value):
+    """Used by worker processes that do not inherit the parent's options."""
+    _options["quiet"] = bool(value)
+
+
+def detail(*args, **kwargs):
+    """print() for per-item lines, dropped with --quiet."""
+    if not _options["quiet"]:
+        print(*args, **kwargs)
+
+
+def tally(name, n=1):
+    """Add n to a counter (safe from any thread)."""
+    with _counters_lock:
+        _counters[name] += n
+
+
+@contextmanager
+def span(name, **args):
+    """Time a stage; nested spans show up nested in the trace."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        _spans.append((name, start_time, time.perf_counter() - start_time, threading.get_ident(), args))
+
+
+def on_finish(callback):
+    """
+    Run callback when the script ends, before the outputs are written (e.g. to
+    flush pending writes). If it raises, the error is printed and the script
+    exits with status 1.
+    """
+    if callback not in _finish_hooks:
+        _finish_hooks.append(callback)
+
+
+def metrics():
+    """The run so far as a JSON-ready dict."""
+    totals = {}
+    for name, _, duration, _, _ in _spans:
+        entry = totals.setdefault(name, {"count": 0, "seconds": 0.0, "min": duration, "max": duration})
+        entry["count"] += 1
+        entry["seconds"] += duration
+        entry["min"] = min(entry["min"], duration)
+        entry["max"] = max(entry["max"], duration)
+    start_time = _state["start"] if _state["start"] is not None else time.perf_counter()
+    return {
+        "script": _state["name"],
+        "argv": sys.argv[1:],
+        "wall_seconds": time.perf_counter() - start_time,
+        "startup_cpu_seconds": _state["startup_cpu"],
+        "spans": dict(sorted(totals.items(), key=lambda item: -item[1]["seconds"])),
+        "counters": dict(sorted(_counters.items())),
+    }
+
+
+def chrome_trace():
+    """Spans and final counters as Chrome trace events (times in microseconds)."""
+    origin = _state["start"] if _state["start"] is not None else min((s[1] for s in _spans), default=0.0)
+    pid = os.getpid()
+    threads = {}
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": _state["name"] or "python"}}]
+    for name, start_time, duration, thread, args in _spans:
+        tid = threads.setdefault(thread, len(threads) + 1)
+        events.append({"name": name, "ph": "X", "pid": pid, "tid": tid, "ts": (start_time - origin) * 1e6,
+                       "dur": duration * 1e6, "args": {k: str(v) for k, v in args.items()}})
+    end = (time.perf_counter() - origin) * 1e6
+    for name, value in sorted(_counters.items()):
+        events.append({"name": name, "ph": "C", "pid": pid, "ts": end, "args": {name: value}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+
+
+def finish():
+    """Stop profiling and write the requested outputs (once; also runs at exit)."""
+    if _state["finished"] or _state["start"] is None:
+        return
+    _state["finished"] = True
+    failed = False
+    for callback in _finish_hooks:
+        try:
+            callback()
+        except Exception as e:
+            print(f"❌ {e}")
+            failed = True
+    profiler = _state["profiler"]
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(_options["profile"])
+        print(f"🔬 cProfile stats saved to {_options['profile']} (python -m pstats {_options['profile']})")
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    if _options["metrics"]:
+        _write_json(_options["metrics"], metrics())
+        print(f"📈 Metrics saved to {_options['metrics']}")
+    if _options["trace"]:
+        _write_json(_options["trace"], chrome_trace())
+        print(f"📈 Chrome trace saved to {_options['trace']}")
+    if failed:
+        # An exit handler cannot change the exit status any other way
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(1)
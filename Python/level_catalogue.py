@@ -0,0 +1,230 @@
+"""
+Rampage level catalogue
+=======================
+
+Parses the whole $8DAE level table (10-byte entries) and every level's
+building list in one pass into columnar arrays:
+
+    levels:     level, silhouette, terrain, foliage, first, count
+    buildings:  level, building, x_char, palette_code, palette
+
+`first`/`count` give each level's rows in the building columns. `palette`
+is the tile palette a building is drawn with ((3 - (palette_code >> 4)) & 3,
+the "→ index" in the level generator log).
+
+Reverse indexes (building, silhouette, terrain, foliage → levels) are built
+from the columns and everything is saved to a small .npz cache next to the
+ROM, tagged with the ROM's hash, so later queries don't re-walk the table:
+
+    python level_catalogue.py cpu.bin --building 17 --palette 2
+    python level_catalogue.py cpu.bin --silhouette 3 --summary
+
+Level numbers are printed 1-based, as in the level PNG names; the Python
+API is 0-based like get_level_buildings().
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+import instrument
+from build_state import digest
+from level_generator_final import LEVEL_ENTRY_SIZE, LEVEL_TABLE_OFFSET, count_levels
+from rom_image import RomImage
+
+CATALOGUE_VERSION = 2  # 2: palette wraps round like the renderer's
+LEVEL_COLUMNS = ("level", "silhouette", "terrain", "foliage", "first", "count")
+BUILDING_COLUMNS = ("level", "building", "x_char", "palette_code", "palette")
+INDEXED_COLUMNS = {
+    "building": "buildings",
+    "silhouette": "levels",
+    "terrain": "levels",
+    "foliage": "levels",
+}
+
+
+def parse_levels(cpu_data, count=None):
+    """Walk the level table and building lists once; returns (level_columns, building_columns)."""
+    rom = RomImage.wrap(cpu_data)
+    if count is None:
+        count = count_levels(rom)
+    data = rom.data
+    levels = {name: [] for name in LEVEL_COLUMNS}
+    buildings = {name: [] for name in BUILDING_COLUMNS}
+
+    for level in range(count):
+        entry = rom.offset(LEVEL_TABLE_OFFSET + level * LEVEL_ENTRY_SIZE, LEVEL_ENTRY_SIZE)
+        levels["level"].append(level)
+        levels["silhouette"].append((data[entry + 2] & 0xF0) >> 4)
+        levels["terrain"].append(data[entry + 3])
+        levels["foliage"].append(data[entry + 4])
+        levels["first"].append(len(buildings["level"]))
+
+        ptr = rom.le16(LEVEL_TABLE_OFFSET + level * LEVEL_ENTRY_SIZE)
+        while rom.contains(ptr, 3):
+            offset = ptr - rom.base
+            b0 = data[offset]
+            if b0 == 0xFF:
+                break
+            elif b0 in (0xFA, 0xFB, 0xFC, 0xFD):
+                ptr += 2
+                continue
+            palette_code = data[offset + 2]
+            buildings["level"].append(level)
+            buildings["building"].append(b0)
+            buildings["x_char"].append(data[offset + 1])
+            buildings["palette_code"].append(palette_code)
+            buildings["palette"].append((3 - (palette_code >> 4)) & 3)
+            ptr += 3
+        levels["count"].append(len(buildings["level"]) - levels["first"][-1])
+
+    level_columns = {name: np.array(values, dtype=np.uint16 if name == "first" else np.uint8)
+                     for name, values in levels.items()}
+    building_columns = {name: np.array(values, dtype=np.uint8) for name, values in buildings.items()}
+    return level_columns, building_columns
+
+
+def reverse_index(keys, levels):
+    """CSR index key → sorted unique levels: (key values, offsets, levels)."""
+    pairs = np.unique(np.stack([keys.astype(np.int32), levels.astype(np.int32)], axis=1), axis=0)
+    values, starts = np.unique(pairs[:, 0], return_index=True)
+    offsets = np.append(starts, len(pairs)).astype(np.uint32)
+    return values.astype(np.int32), offsets, pairs[:, 1].astype(np.uint8)
+
+
+class LevelCatalogue:
+    """Columnar level table with building / silhouette / terrain / foliage → levels indexes."""
+
+    def __init__(self, levels, buildings, indexes=None, source=None):
+        self.levels = levels
+        self.buildings = buildings
+        self.source = source
+        if indexes is None:
+            indexes = {}
+            for column, table in INDEXED_COLUMNS.items():
+                columns = buildings if table == "buildings" else levels
+                indexes[column] = reverse_index(columns[column], columns["level"])
+        self.indexes = indexes
+
+    @classmethod
+    def from_rom(cls, cpu_data, count=None):
+        rom = RomImage.wrap(cpu_data)
+        levels, buildings = parse_levels(rom, count)
+        return cls(levels, buildings, source=digest(rom.data))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            if int(npz["version"]) != CATALOGUE_VERSION:
+                raise ValueError(f"{path}: catalogue version {int(npz['version'])}, expected {CATALOGUE_VERSION}")
+            levels = {name: npz[f"level_{name}"] for name in LEVEL_COLUMNS}
+            buildings = {name: npz[f"building_{name}"] for name in BUILDING_COLUMNS}
+            indexes = {name: tuple(npz[f"index_{name}_{part}"] for part in ("keys", "offsets", "levels"))
+                       for name in INDEXED_COLUMNS}
+            source = str(npz["source"])
+        return cls(levels, buildings, indexes, source)
+
+    def save(self, path):
+        arrays = {f"level_{name}": values for name, values in self.levels.items()}
+        arrays.update({f"building_{name}": values for name, values in self.buildings.items()})
+        for name, parts in self.indexes.items():
+            arrays.update({f"index_{name}_{part}": values for part, values in zip(("keys", "offsets", "levels"), parts)})
+        with open(path, "wb") as f:
+            np.savez_compressed(f, version=CATALOGUE_VERSION, source=self.source, **arrays)
+
+    @classmethod
+    def cached(cls, cpu_data, cache_path, count=None):
+        """Catalogue from cache_path if it was built from this ROM, else parse and save it."""
+        rom = RomImage.wrap(cpu_data)
+        source = digest(rom.data)
+        cache_path = Path(cache_path)
+        if cache_path.exists():
+            try:
+                catalogue = cls.load(cache_path)
+                if catalogue.source == source and (count is None or len(catalogue) == count):
+                    return catalogue
+            except (OSError, ValueError, KeyError):
+                pass
+        catalogue = cls.from_rom(rom, count)
+        catalogue.save(cache_path)
+        return catalogue
+
+    def __len__(self):
+        return len(self.levels["level"])
+
+    def level(self, level):
+        """Same (background_number, terrain_byte, foliage_index, buildings) as get_level_buildings()."""
+        first, count = int(self.levels["first"][level]), int(self.levels["count"][level])
+        rows = slice(first, first + count)
+        buildings = list(zip(self.buildings["building"][rows].tolist(), self.buildings["x_char"][rows].tolist(),
+                             self.buildings["palette_code"][rows].tolist()))
+        return (int(self.levels["silhouette"][level]), int(self.levels["terrain"][level]),
+                int(self.levels["foliage"][level]), buildings)
+
+    def levels_for(self, column, value):
+        """Levels whose `column` (building, silhouette, terrain or foliage) has value, from the index."""
+        keys, offsets, levels = self.indexes[column]
+        i = np.searchsorted(keys, value)
+        if i == len(keys) or keys[i] != value:
+            return []
+        return levels[offsets[i]:offsets[i + 1]].tolist()
+
+    def query(self, building=None, palette=None, x_char=None, silhouette=None, terrain=None, foliage=None):
+        """Sorted levels matching every given filter; building filters apply to the same building."""
+        match = np.ones(len(self), dtype=bool)
+        for column, value in (("silhouette", silhouette), ("terrain", terrain), ("foliage", foliage)):
+            if value is not None:
+                match &= self.levels[column] == value
+
+        if building is not None or palette is not None or x_char is not None:
+            rows = np.ones(len(self.buildings["level"]), dtype=bool)
+            for column, value in (("building", building), ("palette", palette), ("x_char", x_char)):
+                if value is not None:
+                    rows &= self.buildings[column] == value
+            has = np.zeros(len(self), dtype=bool)
+            has[self.buildings["level"][rows]] = True
+            match &= has
+        return np.flatnonzero(match).tolist()
+
+    def summary(self):
+        """(building, uses, levels) for every building id, most used first."""
+        keys, offsets, _ = self.indexes["building"]
+        uses = np.bincount(self.buildings["building"], minlength=256)
+        rows = [(int(k), int(uses[k]), int(offsets[i + 1] - offsets[i])) for i, k in enumerate(keys)]
+        return sorted(rows, key=lambda row: (-row[1], row[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the Rampage level table (levels are 1-based).")
+    parser.add_argument("cpu", help="cpu.bin")
+    parser.add_argument("--building", type=int, help="building id (1-45)")
+    parser.add_argument("--palette", type=int, help="tile palette the building is drawn with (0-3)")
+    parser.add_argument("--x", dest="x_char", type=int, help="building x_char")
+    parser.add_argument("--silhouette", type=int, help="background silhouette number")
+    parser.add_argument("--terrain", type=int, help="terrain byte")
+    parser.add_argument("--foliage", type=int, help="foliage index")
+    parser.add_argument("--summary", action="store_true", help="list how often each building is used")
+    parser.add_argument("--cache", default=None, help="catalogue cache (default: <cpu>.levels.npz)")
+    args = parser.parse_args()
+
+    cache = args.cache if args.cache is not None else f"{args.cpu}.levels.npz"
+    catalogue = LevelCatalogue.cached(RomImage.open(args.cpu), cache)
+    print(f"📚 {len(catalogue)} levels, {len(catalogue.buildings['level'])} building placements ({cache})")
+
+    if args.summary:
+        for building, uses, levels in catalogue.summary():
+            print(f"  🧱 Building {building:02d}: {uses} placements in {levels} levels")
+
+    filters = dict(building=args.building, palette=args.palette, x_char=args.x_char,
+                   silhouette=args.silhouette, terrain=args.terrain, foliage=args.foliage)
+    if any(value is not None for value in filters.values()):
+        levels = catalogue.query(**filters)
+        shown = " ".join(f"{name}={value}" for name, value in filters.items() if value is not None)
+        print(f"🔎 {shown}: {len(levels)} levels")
+        if levels:
+            print("  " + ", ".join(str(level + 1) for level in levels))
+
+if __name__ == "__main__":
+    instrument.start()
+    main()
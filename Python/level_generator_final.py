@@ -1,291 +1,578 @@
-import struct
-from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
-import argparse
-
-"""
-Rampage Arcade Level Plotter and Data Decoder
-=============================================
-
-Now with support for top two rows ("sky"/header) from packed data at $7613!
-
-Each layer is plotted in this order:
-    1. Background silhouette (rows 3–31)
-    2. Top rows (rows 0–1, using packed data at $7613)
-    3. Foliage
-    4. Buildings
-    5. Terrain strip (rows 29–30, always last)
-"""
-
-# Constants
-LEVEL_TABLE_OFFSET = 0x8DAE
-LEVEL_ENTRY_SIZE = 10
-MAX_LEVELS = 132
-SCREEN_WIDTH = 256
-SCREEN_HEIGHT = 240
-CHAR_WIDTH = 8
-CHAR_HEIGHT = 8
-
-def load_characters(char_data):
-    return [char_data[i:i+32] for i in range(0, len(char_data), 32)]
-
-def load_palette(pal_data):
-    return [(pal_data[i], pal_data[i+1], pal_data[i+2]) for i in range(0, len(pal_data), 3)]
-
-def get_level_buildings(cpu_data, level):
-    building_list = []
-    entry_offset = LEVEL_TABLE_OFFSET + level * LEVEL_ENTRY_SIZE
-    table_ptr = struct.unpack_from("<H", cpu_data, entry_offset)[0]
-    background_number = (cpu_data[entry_offset + 2] & 0xF0) >> 4  # High nibble
-    terrain_byte = cpu_data[entry_offset + 3]
-    foliage_index = cpu_data[entry_offset + 4]
-    ptr = table_ptr
-
-    while ptr + 3 <= len(cpu_data):
-        b0 = cpu_data[ptr]
-        if b0 == 0xFF:
-            break
-        elif b0 in (0xFA, 0xFB, 0xFC, 0xFD):
-            ptr += 2
-            continue
-
-        building_id = b0
-        x_char = cpu_data[ptr + 1]
-        palette_code = cpu_data[ptr + 2]
-        building_list.append((building_id, x_char, palette_code))
-        ptr += 3
-
-    return background_number, terrain_byte, foliage_index, building_list
-
-def get_pixel(tile_bytes, x, y, xflip, yflip):
-    if xflip: x = 7 - x
-    if yflip: y = 7 - y
-    index = y * 4 + (x // 2)
-    b = tile_bytes[index]
-    return (b >> 4) & 0xF if x % 2 == 0 else b & 0xF
-
-def decode_character_data(data):
-    i = 0
-    out = []
-    while i < len(data):
-        control = data[i]
-        i += 1
-        if control == 0x00:
-            break
-        if control & 0x80:
-            count = control & 0x7F
-            for _ in range(count):
-                if i + 1 >= len(data): break
-                out.extend([data[i], data[i+1] & 0x3F])
-                i += 2
-        else:
-            count = control
-            if i + 1 >= len(data): break
-            lo, hi = data[i], data[i+1] & 0x3F
-            i += 2
-            out.extend([lo, hi] * count)
-    return out
-
-def decode_bottom_strip(cpu_data, terrain_byte):
-    index = terrain_byte
-    if index > 10:
-        print(f"⚠️ Invalid terrain index {terrain_byte:02X}, skipping.")
-        return []
-    table_offset = 0x8928 + terrain_byte
-    data_offset = struct.unpack_from("<H", cpu_data, table_offset)[0]
-    print(f"🌍 Bottom terrain index {terrain_byte:02X} → offset ${data_offset:04X}")
-    return decode_character_data(cpu_data[data_offset:])
-
-def decode_background(cpu_data, background_number):
-    index = background_number & 0x0F  # background_number already high nibble
-    table_offset = 0x8934 + index
-    data_offset = struct.unpack_from("<H", cpu_data, table_offset)[0]
-    print(f"🎨 Background silhouette {index:02d} → offset ${data_offset:04X}")
-    return decode_character_data(cpu_data[data_offset:])
-
-def decode_top_strip(cpu_data):
-    data_offset = 0x7613
-    print(f"☁️ Decoding top rows (sky) from offset ${data_offset:04X}")
-    return decode_character_data(cpu_data[data_offset:])
-
-def plot_foliage(cpu_data, foliage_index, characters, palette, pixels):
-    valid_indices = {0, 2, 4, 6, 8}
-    if foliage_index not in valid_indices:
-        print(f"🌲 Foliage index {foliage_index} not valid, skipping.")
-        return
-
-    table_offset = 0x95AA + foliage_index
-    data_offset = struct.unpack_from("<H", cpu_data, table_offset)[0]
-    if foliage_index > 4:
-        rows = 2
-        start_row = 27
-    else:
-        rows = 3
-        start_row = 26
-
-    print(f"🌲 Foliage index {foliage_index} → offset ${data_offset:04X}, rows={rows}, y={start_row}")
-
-    for row in range(rows):
-        for col in range(32):
-            entry_off = data_offset + (row * 32 + col) * 2
-            word = struct.unpack_from("<H", cpu_data, entry_off)[0]
-            tile_index = (word & 0x03FF) | ((word >> 4) & 0x0400)
-            flip_x = (word >> 10) & 1
-            flip_y = (word >> 11) & 1
-            palette_index = 3 - ((word >> 12) & 0x03)
-            if tile_index >= len(characters): continue
-            tile = characters[tile_index]
-            tx = col
-            ty = start_row + row
-            for y in range(8):
-                for x in range(8):
-                    px = tx * 8 + x
-                    py = (ty - 1) * 8 + y
-                    if 0 <= px < SCREEN_WIDTH and 0 <= py < SCREEN_HEIGHT:
-                        color_index = get_pixel(tile, x, y, flip_x, flip_y)
-                        pixels[px, py] = palette[palette_index * 16 + color_index]
-
-def plot_level(cpu_data, background_number, terrain_byte, foliage_index, buildings, characters, palette, output_file):
-    image = Image.new("RGB", (SCREEN_WIDTH, SCREEN_HEIGHT), (0, 0, 0))
-    pixels = image.load()
-
-    # 🎨 Background (rows 3–31)
-    if buildings:
-        bg_data = decode_background(cpu_data, background_number)
-        for i in range(0, len(bg_data) & ~1, 2):
-            lo, hi = bg_data[i], bg_data[i+1] & 0x3F
-            word = lo | (hi << 8)
-            tile_index = (word & 0x03FF) | ((word >> 4) & 0x0400)
-            flip_x = (word >> 10) & 1
-            flip_y = (word >> 11) & 1
-            palette_index = 3 - ((word >> 12) & 0x03)
-            if tile_index >= len(characters): continue
-            tile = characters[tile_index]
-            pos = i // 2
-            tx = pos % 32
-            ty = pos // 32 + 3
-            for y in range(8):
-                for x in range(8):
-                    px = tx * 8 + x
-                    py = (ty - 1) * 8 + y
-                    if 0 <= px < SCREEN_WIDTH and 0 <= py < SCREEN_HEIGHT:
-                        color_index = get_pixel(tile, x, y, flip_x, flip_y)
-                        pixels[px, py] = palette[palette_index * 16 + color_index]
-
-    # ☁️ Top rows (rows 0–1, RLE decoded)
-    top_data = decode_top_strip(cpu_data)
-    for pos in range(0, len(top_data), 2):
-        lo, hi = top_data[pos], top_data[pos+1] & 0x3F
-        word = lo | (hi << 8)
-        tx = (pos // 2) % 32
-        ty = (pos // 2) // 32  # 0 or 1
-        tile_index = (word & 0x03FF) | ((word >> 4) & 0x0400)
-        flip_x = (word >> 10) & 1
-        flip_y = (word >> 11) & 1
-        palette_index = 3 - ((word >> 12) & 0x03)
-        if tile_index >= len(characters): continue
-        tile = characters[tile_index]
-        for y in range(8):
-            for x in range(8):
-                px = tx * 8 + x
-                py = ty * 8 + y
-                if 0 <= px < SCREEN_WIDTH and 0 <= py < SCREEN_HEIGHT:
-                    color_index = get_pixel(tile, x, y, flip_x, flip_y)
-                    pixels[px, py] = palette[palette_index * 16 + color_index]
-
-    # 🌲 Foliage (before buildings)
-    plot_foliage(cpu_data, foliage_index, characters, palette, pixels)
-
-    # 🧱 Buildings
-    print(f"\n🧱 Plotting {len(buildings)} buildings...")
-    for building_id, x_char, palette_code in buildings:
-        btable = 0x95B6
-        bptr_offset = struct.unpack_from("<H", cpu_data, btable + (building_id - 1) * 2)[0]
-        width = cpu_data[bptr_offset]
-        height = cpu_data[bptr_offset + 1]
-        mode = cpu_data[bptr_offset + 2]
-        ptr = bptr_offset + 3
-        palette_index = (palette_code & 0xF0) >> 4
-        tile_palette = 3 - palette_index
-        print(f"  ▶ Building ID {building_id:02d} @ ${bptr_offset:04X}: {width}x{height}, x_char={x_char}, palette={palette_code:02X} → index {tile_palette}")
-        for y in range(height):
-            for x in range(width):
-                word = (struct.unpack_from("<H", cpu_data, ptr)[0] if mode == 0xFF
-                        else (mode << 8) | cpu_data[ptr])
-                ptr += 2 if mode == 0xFF else 1
-                tile_index = (word & 0x03FF) | ((word >> 4) & 0x0400)
-                flip_x = (word >> 10) & 1
-                flip_y = (word >> 11) & 1
-                if tile_index >= len(characters): continue
-                tile = characters[tile_index]
-                for ty in range(8):
-                    for tx in range(8):
-                        px = x_char * 4 + x * CHAR_WIDTH + tx
-                        py = (28 - y - 1) * 8 + ty  # corrected
-                        if 0 <= px < SCREEN_WIDTH and 0 <= py < SCREEN_HEIGHT:
-                            color_index = get_pixel(tile, tx, ty, flip_x, flip_y)
-                            pixels[px, py] = palette[tile_palette * 16 + color_index]
-
-    # 🌍 Terrain strip (rows 29–30) -- PLOT LAST!
-    strip_data = decode_bottom_strip(cpu_data, terrain_byte)
-    for i in range(0, len(strip_data) & ~1, 2):
-        lo, hi = strip_data[i], strip_data[i+1] & 0x3F
-        word = lo | (hi << 8)
-        tile_index = (word & 0x03FF) | ((word >> 4) & 0x0400)
-        flip_x = (word >> 10) & 1
-        flip_y = (word >> 11) & 1
-        palette_index = 3 - ((word >> 12) & 0x03)
-        if tile_index >= len(characters): continue
-        tile = characters[tile_index]
-        pos = i // 2
-        tx = pos % 32
-        ty = pos // 32 + 29
-        for y in range(8):
-            for x in range(8):
-                px = tx * 8 + x
-                py = (ty - 1) * 8 + y
-                if 0 <= px < SCREEN_WIDTH and 0 <= py < SCREEN_HEIGHT:
-                    color_index = get_pixel(tile, x, y, flip_x, flip_y)
-                    pixels[px, py] = palette[palette_index * 16 + color_index]
-
-    image.save(output_file)
-    print(f"💾 Saved PNG to {output_file}")
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("cpu", help="cpu.bin")
-    parser.add_argument("characters", help="background.bin")
-    parser.add_argument("palette", help="palettes.pal")
-    parser.add_argument("output", help="output filename base (no extension)")
-    parser.add_argument("--level", type=int, default=None, help="single level number to process (1-based, 1–132)")
-    parser.add_argument("--levels", type=int, default=None, help="number of levels to process (default: all found)")
-    args = parser.parse_args()
-
-    cpu = Path(args.cpu).read_bytes()
-    chars = Path(args.characters).read_bytes()
-    pals = Path(args.palette).read_bytes()
-    tiles = load_characters(chars)
-    palette = load_palette(pals)
-
-    # Determine how many levels in total (hard cap at 132)
-    detected_levels = (len(cpu) - LEVEL_TABLE_OFFSET) // LEVEL_ENTRY_SIZE
-    total_levels = min(MAX_LEVELS, detected_levels)
-
-    # Priority: --level > --levels > all
-    if args.level is not None:
-        if not (1 <= args.level <= total_levels):
-            print(f"ERROR: --level must be between 1 and {total_levels} (inclusive).")
-            exit(1)
-        levels_to_do = [args.level - 1]  # Convert 1-based to 0-based
-    elif args.levels is not None:
-        levels_to_do = list(range(min(total_levels, args.levels)))
-    else:
-        levels_to_do = list(range(total_levels))
-
-    for level in levels_to_do:
-        background_number, terrain, foliage_index, buildings = get_level_buildings(cpu, level)
-        shown_level = level + 1
-        filename = f"{args.output}_{shown_level:03d}.png"  # filenames stay padded!
-        display_level = str(int(f"{shown_level:03d}"))     # strip any leading zeros for display/print
-        print(f"\n--- Generating level {display_level} to {filename} ---")
-        plot_level(cpu, background_number, terrain, foliage_index, buildings, tiles, palette, filename)
+import contextlib
+import io
+import itertools
+import multiprocessing
+import sys
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+from PIL import Image, ImageDraw, ImageFont
+import argparse
+
+import numpy as np
+
+from building_plot_multi import building_words
+import instrument
+from decomp import decode_character_data
+from grid_pngs import ContactSheet
+from image_formats import FORMATS, format_for, suffix_for
+from image_writer import encode_image, flush, save_image
+from instrument import detail, span, tally
+from level_pack import DEFAULT_CHUNK, LevelArchive, read_pack, write_pack
+from rom_image import RomImage
+from rom_palette import labelled, read_palettes
+from tile_atlas import blit, load_atlas, palette_lut, tile_layer, to_indexed, to_rgb, words_from_bytes
+
+"""
+Rampage Arcade Level Plotter and Data Decoder
+=============================================
+
+Now with support for top two rows ("sky"/header) from packed data at $7613!
+
+Each layer is plotted in this order:
+    1. Background silhouette (rows 3–31)
+    2. Top rows (rows 0–1, using packed data at $7613)
+    3. Foliage
+    4. Buildings
+    5. Terrain strip (rows 29–30, always last)
+"""
+
+# Constants
+LEVEL_TABLE_OFFSET = 0x8DAE
+LEVEL_ENTRY_SIZE = 10
+MAX_LEVELS = 132
+SCREEN_WIDTH = 256
+SCREEN_HEIGHT = 240
+CHAR_WIDTH = 8
+CHAR_HEIGHT = 8
+BACKGROUND = 0xFF  # canvas index for pixels no layer has drawn to (black)
+
+def load_palette(pal_data):
+    lut = palette_lut(pal_data, fill=(0, 0, 0))
+    lut[BACKGROUND] = (0, 0, 0)
+    return lut
+
+def get_level_buildings(cpu_data, level):
+    rom = RomImage.wrap(cpu_data)
+    building_list = []
+    entry_offset = LEVEL_TABLE_OFFSET + level * LEVEL_ENTRY_SIZE
+    table_ptr = rom.le16(entry_offset)
+    background_number = (rom.u8(entry_offset + 2) & 0xF0) >> 4  # High nibble
+    terrain_byte = rom.u8(entry_offset + 3)
+    foliage_index = rom.u8(entry_offset + 4)
+    ptr = table_ptr
+
+    while rom.contains(ptr, 3):
+        b0 = rom.u8(ptr)
+        if b0 == 0xFF:
+            break
+        elif b0 in (0xFA, 0xFB, 0xFC, 0xFD):
+            ptr += 2
+            continue
+
+        building_id = b0
+        x_char = rom.u8(ptr + 1)
+        palette_code = rom.u8(ptr + 2)
+        building_list.append((building_id, x_char, palette_code))
+        ptr += 3
+
+    return background_number, terrain_byte, foliage_index, building_list
+
+TERRAIN_TABLE = 0x8928
+SILHOUETTE_TABLE = 0x8934
+TOP_STRIP_OFFSET = 0x7613
+
+BUILDING_TABLE = 0x95B6
+FOLIAGE_TABLE = 0x95AA
+
+Layer = namedtuple("Layer", "words indices mask")
+
+class LayerCache:
+    """
+    Pre-rendered level layers, built once per run and keyed by ROM offset.
+
+    The 6 terrain strips, the 6 silhouettes (8 and 9 share $7C45), the sky
+    strip, the foliage strips and every building are decoded and rasterised
+    a single time however many levels use them. Buildings are kept as
+    colour-only (0-15) index layers with a mask; the palette a level asks
+    for is added as an index offset when the layer is composited, and the
+    RGB lookup is only applied to the finished level.
+
+    The first time a level asks for a layer is a miss and every later time
+    a hit, so the counts only depend on the levels drawn: warm() does not
+    count, and pool workers hand the layers they asked for back to the
+    parent (lookups), which counts them in order.
+
+    Lookups are safe from several threads (the render server renders on its
+    request threads): the counts are kept under a lock, and two threads
+    missing the same layer at once both build it, the last one kept.
+    """
+
+    def __init__(self, cpu_data, characters):
+        self.rom = RomImage.wrap(cpu_data)
+        self.characters = characters
+        self.layers = {}
+        self.hits = 0
+        self.misses = 0
+        self.used = set()
+        self.counting = True
+        self.lookups = None  # a list to log the keys looked up in (set in pool workers)
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["lock"]  # locks cannot be pickled for spawned pool workers
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def count(self, key):
+        with self.lock:
+            if key in self.used:
+                self.hits += 1
+            else:
+                self.used.add(key)
+                self.misses += 1
+
+    def _get(self, key, build):
+        if self.counting:
+            self.count(key)
+            if self.lookups is not None:
+                self.lookups.append(key)
+        entry = self.layers.get(key)
+        if entry is not None:
+            return entry
+        with span("build_layer", kind=key[0]):
+            words, width, palette = build()
+            if len(words):
+                indices, mask = tile_layer(self.characters, words, width, palette)
+            else:
+                indices, mask = None, None
+        entry = self.layers[key] = Layer(words, indices, mask)
+        return entry
+
+    def block(self, data_offset):
+        """Layer for the RLE block at data_offset."""
+        def build():
+            words = words_from_bytes(decode_character_data(self.rom.view(data_offset), data_offset)[0])
+            return words, 32, None
+        return self._get(("rle", data_offset), build)
+
+    def foliage(self, data_offset, rows):
+        """Layer for an uncompressed foliage strip, rows x 32 tile words."""
+        def build():
+            words = np.frombuffer(self.rom.view(data_offset, rows * 64), dtype="<u2")
+            return words, 32, None
+        return self._get(("foliage", data_offset, rows), build)
+
+    def building(self, bptr_offset):
+        """Colour-only layer for the building whose data starts at bptr_offset."""
+        def build():
+            width, height, words = building_words(self.rom.view(bptr_offset))
+            # Stored bottom row first, layers are top down
+            words = words.reshape(height, width)[::-1].ravel()
+            return words, width, 0
+        return self._get(("building", bptr_offset), build)
+
+    def warm(self, levels):
+        """Build every layer the given levels use (before forking workers)."""
+        self.warm_levels(get_level_buildings(self.rom, level) for level in levels)
+
+    def warm_levels(self, level_data):
+        """warm() for levels given as get_level_buildings() tuples, e.g. from a level pack."""
+        counting, self.counting = self.counting, False
+        try:
+            self._warm_levels(level_data)
+        finally:
+            self.counting = counting
+
+    def _warm_levels(self, level_data):
+        for table_offset in range(TERRAIN_TABLE, SILHOUETTE_TABLE + 12, 2):
+            self.block(self.rom.le16(table_offset))
+        self.block(TOP_STRIP_OFFSET)
+        for _, _, foliage_index, buildings in level_data:
+            strip = foliage_strip(self.rom, foliage_index)
+            if strip is not None:
+                self.foliage(*strip[:2])
+            for building_id, _, _ in buildings:
+                self.building(building_offset(self.rom, building_id))
+
+    def report(self):
+        return f"🗃️ Layer cache: {self.hits} hits, {self.misses} misses, {len(self.layers)} layers"
+
+def building_offset(rom, building_id):
+    return rom.le16(BUILDING_TABLE + (building_id - 1) * 2)
+
+def building_end(rom, start):
+    """End address of the building data at start: width, height, high byte, then 1 or 2 bytes a tile."""
+    width, height, high_byte = rom.u8(start), rom.u8(start + 1), rom.u8(start + 2)
+    return start + 3 + width * height * (2 if high_byte == 0xFF else 1)
+
+def decode_bottom_strip(rom, terrain_byte, cache):
+    index = terrain_byte
+    if index > 10:
+        print(f"⚠️ Invalid terrain index {terrain_byte:02X}, skipping.")
+        return None
+    table_offset = TERRAIN_TABLE + terrain_byte
+    data_offset = rom.le16(table_offset)
+    detail(f"🌍 Bottom terrain index {terrain_byte:02X} → offset ${data_offset:04X}")
+    return cache.block(data_offset)
+
+def decode_background(rom, background_number, cache):
+    index = background_number & 0x0F  # background_number already high nibble
+    table_offset = SILHOUETTE_TABLE + index
+    data_offset = rom.le16(table_offset)
+    detail(f"🎨 Background silhouette {index:02d} → offset ${data_offset:04X}")
+    return cache.block(data_offset)
+
+def decode_top_strip(rom, cache):
+    data_offset = TOP_STRIP_OFFSET
+    detail(f"☁️ Decoding top rows (sky) from offset ${data_offset:04X}")
+    return cache.block(data_offset)
+
+def plot_block(canvas, layer, x, y, offset=0):
+    if layer is not None and layer.indices is not None:
+        blit(canvas, layer.indices, layer.mask, x, y, offset)
+
+def foliage_strip(rom, foliage_index):
+    """Return (data_offset, rows, start_row) for a foliage index, or None if it is not valid."""
+    valid_indices = {0, 2, 4, 6, 8}
+    if foliage_index not in valid_indices:
+        return None
+
+    table_offset = FOLIAGE_TABLE + foliage_index
+    data_offset = rom.le16(table_offset)
+    if foliage_index > 4:
+        rows = 2
+        start_row = 27
+    else:
+        rows = 3
+        start_row = 26
+    return data_offset, rows, start_row
+
+def plot_foliage(rom, foliage_index, cache, canvas):
+    strip = foliage_strip(rom, foliage_index)
+    if strip is None:
+        print(f"🌲 Foliage index {foliage_index} not valid, skipping.")
+        return
+
+    data_offset, rows, start_row = strip
+    detail(f"🌲 Foliage index {foliage_index} → offset ${data_offset:04X}, rows={rows}, y={start_row}")
+    plot_block(canvas, cache.foliage(data_offset, rows), 0, (start_row - 1) * 8)
+
+def render_level(cpu_data, background_number, terrain_byte, foliage_index, buildings, characters, palette, cache=None, indexed=False):
+    rom = RomImage.wrap(cpu_data)
+    if cache is None:
+        cache = LayerCache(rom, characters)
+    canvas = np.full((SCREEN_HEIGHT, SCREEN_WIDTH), BACKGROUND, dtype=np.uint8)
+
+    # 🎨 Background (rows 3–31)
+    if buildings:
+        plot_block(canvas, decode_background(rom, background_number, cache), 0, (3 - 1) * 8)
+
+    # ☁️ Top rows (rows 0–1, RLE decoded)
+    plot_block(canvas, decode_top_strip(rom, cache), 0, 0)
+
+    # 🌲 Foliage (before buildings)
+    plot_foliage(rom, foliage_index, cache, canvas)
+
+    # 🧱 Buildings
+    detail(f"\n🧱 Plotting {len(buildings)} buildings...")
+    for building_id, x_char, palette_code in buildings:
+        bptr_offset = building_offset(rom, building_id)
+        width = rom.u8(bptr_offset)
+        height = rom.u8(bptr_offset + 1)
+        palette_index = (palette_code & 0xF0) >> 4
+        tile_palette = (3 - palette_index) & 3  # high nibbles above 3 wrap round to one of the 4 palettes
+        detail(f"  ▶ Building ID {building_id:02d} @ ${bptr_offset:04X}: {width}x{height}, x_char={x_char}, palette={palette_code:02X} → index {tile_palette}")
+        # Bottom row sits on character row 27
+        plot_block(canvas, cache.building(bptr_offset), x_char * 4, (28 - height) * 8, tile_palette * 16)
+
+    # 🌍 Terrain strip (rows 29–30) -- PLOT LAST!
+    plot_block(canvas, decode_bottom_strip(rom, terrain_byte, cache), 0, (29 - 1) * 8)
+
+    if indexed:
+        return to_indexed(canvas, palette, background=BACKGROUND)
+    return Image.fromarray(to_rgb(canvas, palette))
+
+def plot_level(cpu_data, background_number, terrain_byte, foliage_index, buildings, characters, palette, output_file, cache=None, indexed=False):
+    image = render_level(cpu_data, background_number, terrain_byte, foliage_index, buildings, characters, palette,
+                         cache, indexed)
+    save_image(image, output_file)
+    detail(f"💾 Saved {format_for(output_file, 'image')} to {output_file}")
+    return image
+
+def level_sources(cpu_data, level):
+    """
+    Everything a level is drawn from: (level_data, ranges), where level_data
+    is what get_level_buildings() returns and ranges are the (start, end) ROM
+    addresses of the RLE blocks, foliage strip and building data it uses. If
+    none of these change, the level renders the same.
+    """
+    rom = RomImage.wrap(cpu_data)
+    level_data = get_level_buildings(rom, level)
+    background_number, terrain_byte, foliage_index, buildings = level_data
+
+    blocks = [TOP_STRIP_OFFSET]
+    if terrain_byte <= 10:
+        blocks.append(rom.le16(TERRAIN_TABLE + terrain_byte))
+    if buildings:
+        blocks.append(rom.le16(SILHOUETTE_TABLE + (background_number & 0x0F)))
+    ranges = [(start, decode_character_data(rom.view(start), start)[1]) for start in blocks]
+
+    strip = foliage_strip(rom, foliage_index)
+    if strip is not None:
+        ranges.append((strip[0], strip[0] + strip[1] * 64))
+
+    for building_id, _, _ in buildings:
+        start = building_offset(rom, building_id)
+        ranges.append((start, building_end(rom, start)))
+    return level_data, ranges
+
+def level_filename(output, level, suffix=".png"):
+    return f"{output}_{level + 1:03d}{suffix}"  # filenames stay padded!
+
+def count_levels(cpu_data):
+    # Determine how many levels in total (hard cap at 132)
+    detected_levels = (RomImage.wrap(cpu_data).end - LEVEL_TABLE_OFFSET) // LEVEL_ENTRY_SIZE
+    return min(MAX_LEVELS, detected_levels)
+
+def generate_level(cpu, tiles, palette, output, level, cache=None, indexed=False, suffix=".png"):
+    background_number, terrain, foliage_index, buildings = get_level_buildings(cpu, level)
+    shown_level = level + 1
+    filename = level_filename(output, level, suffix)
+    display_level = str(int(f"{shown_level:03d}"))     # strip any leading zeros for display/print
+    detail(f"\n--- Generating level {display_level} to {filename} ---")
+    with span("level", level=shown_level):
+        return plot_level(cpu, background_number, terrain, foliage_index, buildings, tiles, palette, filename, cache,
+                          indexed)
+
+# Read-only render state for pool workers. With the fork start method the
+# workers inherit it from the parent, so cpu.bin, the character atlas and the
+# warmed layer cache are never pickled; elsewhere it is sent once per worker
+# by _init_worker.
+_shared = {}
+
+def _init_worker(cpu, tiles, palette, output, cache, indexed, quiet=False, keep_images=False, suffix=".png"):
+    _shared.update(cpu=cpu, tiles=tiles, palette=palette, output=output, cache=cache, indexed=indexed,
+                   keep_images=keep_images, suffix=suffix)
+    instrument.set_quiet(quiet)
+
+def _generate_level_logged(level):
+    cache = _shared["cache"]
+    cache.lookups = []
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        image = generate_level(_shared["cpu"], _shared["tiles"], _shared["palette"], _shared["output"], level, cache,
+                               _shared["indexed"], _shared["suffix"])
+        flush()  # the file is written before the parent hears the level is done
+    # Images only go back to the parent when it is building a contact sheet
+    lookups, cache.lookups = cache.lookups, None
+    return log.getvalue(), lookups, image if _shared["keep_images"] else None
+
+def count_cache(cache):
+    tally("layer_cache_hits", cache.hits)
+    tally("layer_cache_misses", cache.misses)
+
+def generate_levels(cpu, tiles, palette, output, levels_to_do, jobs=1, indexed=False, sheet=None, suffix=".png",
+                    cache=None):
+    """
+    Render and save levels; with a ContactSheet each image is also added to
+    it as it is rendered. Pass a LayerCache to reuse the layers of an earlier
+    run (they do not depend on the palette).
+    """
+    cpu = RomImage.wrap(cpu)
+    if cache is None:
+        cache = LayerCache(cpu, tiles)
+
+    if jobs <= 1 or len(levels_to_do) <= 1:
+        for level in levels_to_do:
+            image = generate_level(cpu, tiles, palette, output, level, cache, indexed, suffix)
+            if sheet is not None:
+                sheet.add(f"{level + 1:03d}", image)
+        flush()
+        count_cache(cache)
+        print(f"\n{cache.report()}")
+        return
+
+    cache.warm(levels_to_do)
+    state = (cpu, tiles, palette, output, cache, indexed, instrument.quiet(), sheet is not None, suffix)
+    if "fork" in multiprocessing.get_all_start_methods():
+        _init_worker(*state)
+        pool = multiprocessing.get_context("fork").Pool(jobs)
+    else:
+        pool = multiprocessing.Pool(jobs, initializer=_init_worker, initargs=state)
+
+    # imap hands results back in level order, so the log reads like a serial run
+    with pool:
+        for level, (log, lookups, image) in zip(levels_to_do, pool.imap(_generate_level_logged, levels_to_do)):
+            sys.stdout.write(log)
+            for key in lookups:
+                cache.count(key)
+            if sheet is not None:
+                sheet.add(f"{level + 1:03d}", image)
+    _shared.clear()
+    flush()
+    count_cache(cache)
+    print(f"\n{cache.report()}")
+
+def _render_pack_level(level_data):
+    """Render one pack level; returns the PNG bytes and the layer cache keys it looked up."""
+    cache = _shared["cache"]
+    cache.lookups = []
+    with span("level"), contextlib.redirect_stdout(io.StringIO()):
+        image = render_level(_shared["cpu"], *level_data, _shared["tiles"], _shared["palette"], cache,
+                             _shared["indexed"])
+    lookups, cache.lookups = cache.lookups, None
+    return encode_image(image), lookups
+
+def add_to_sheet(sheet, index, png):
+    if sheet is not None:
+        with Image.open(io.BytesIO(png)) as image:
+            sheet.add(f"{index + 1:06d}", image)
+
+def count_pack(pack_path):
+    with open(pack_path, "rb") as f:
+        return sum(1 for _ in read_pack(f))
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def generate_pack(cpu, tiles, palette, pack_path, output, chunk=DEFAULT_CHUNK, jobs=1, indexed=False, sheet=None,
+                  cache=None):
+    """
+    Render every level of a level pack into chunked zip archives. Levels are
+    read and rendered a batch at a time, so memory does not grow with the
+    size of the pack. With a ContactSheet the levels also go onto it, read
+    back from the PNG bytes in memory.
+    """
+    cpu = RomImage.wrap(cpu)
+    if cache is None:
+        cache = LayerCache(cpu, tiles)
+    _init_worker(cpu, tiles, palette, output, cache, indexed, instrument.quiet())
+    batch_size = chunk or DEFAULT_CHUNK
+
+    with open(pack_path, "rb") as f, LevelArchive(output, chunk) as archive:
+        batches = _batches(read_pack(f), batch_size)
+        if jobs <= 1:
+            for batch in batches:
+                for index, level_data in batch:
+                    png = _render_pack_level(level_data)[0]
+                    archive.add(index, png)
+                    add_to_sheet(sheet, index, png)
+        else:
+            first = next(batches, [])
+            cache.warm_levels(level_data for _, level_data in first)
+            if "fork" in multiprocessing.get_all_start_methods():
+                pool = multiprocessing.get_context("fork").Pool(jobs)
+            else:
+                pool = multiprocessing.Pool(jobs, initializer=_init_worker,
+                                            initargs=(cpu, tiles, palette, output, cache, indexed, instrument.quiet()))
+            with pool:
+                for batch in itertools.chain([first], batches):
+                    pngs = pool.imap(_render_pack_level, [level_data for _, level_data in batch], chunksize=8)
+                    for (index, _), (png, lookups) in zip(batch, pngs):
+                        archive.add(index, png)
+                        add_to_sheet(sheet, index, png)
+                        for key in lookups:
+                            cache.count(key)
+    _shared.clear()
+
+    elapsed = time.perf_counter() - archive.start
+    print(f"🏁 Rendered {archive.count} levels into {len(archive.paths)} archives in {elapsed:.2f}s "
+          f"({archive.rate():.1f} levels/s)")
+    count_cache(cache)
+    print(cache.report())
+
+def export_pack(cpu, pack_path, copies=1):
+    """Write the ROM's level table as a level pack, repeated `copies` times for scale tests."""
+    rom = RomImage.wrap(cpu)
+    total = count_levels(rom)
+
+    def levels():
+        for _ in range(copies):
+            for level in range(total):
+                entry = rom.view(LEVEL_TABLE_OFFSET + level * LEVEL_ENTRY_SIZE, LEVEL_ENTRY_SIZE)
+                yield entry, get_level_buildings(rom, level)[3]
+
+    with open(pack_path, "wb") as f:
+        written = write_pack(f, levels())
+    print(f"📝 Wrote {written} levels to {pack_path}")
+
+if __name__ == "__main__":
+    instrument.start()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("cpu", help="cpu.bin")
+    parser.add_argument("characters", help="background.bin")
+    parser.add_argument("palette", help="palettes.pal, or ROM banks as cpu.bin@1 / cpu.bin@all (one set of levels each)")
+    parser.add_argument("output", help="output filename base (no extension)")
+    parser.add_argument("--level", type=int, default=None, help="single level number to process (1-based, 1–132)")
+    parser.add_argument("--levels", type=int, default=None, help="number of levels to process (default: all found)")
+    parser.add_argument("--jobs", type=int, default=1, help="render levels in N worker processes (default 1)")
+    parser.add_argument("--indexed", action="store_true", help="write indexed (palette) PNGs instead of RGB")
+    parser.add_argument("--format", choices=[suffix[1:] for suffix in FORMATS], default="png",
+                        help="image format: png, or qoi / npy for a quick intermediate (default png; "
+                             "--pack archives are always PNG)")
+    parser.add_argument("--pack", default=None, help="render an external level pack (any size) instead of the ROM table")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK,
+                        help=f"levels per zip archive with --pack, 0 for one archive (default {DEFAULT_CHUNK})")
+    parser.add_argument("--export-pack", default=None, help="write the ROM's levels to this level pack and exit")
+    parser.add_argument("--copies", type=int, default=1, help="repeat the levels N times with --export-pack")
+    parser.add_argument("--sheet", default=None,
+                        help="also stream the rendered levels into this numbered contact sheet PNG (like grid_pngs.py)")
+    parser.add_argument("--sheet-across", type=int, default=15, help="levels per row of the contact sheet (default 15)")
+    args = parser.parse_args()
+
+    cpu = RomImage.open(args.cpu)
+    if args.export_pack:
+        export_pack(cpu, args.export_pack, args.copies)
+        exit(0)
+    chars = Path(args.characters).read_bytes()
+    tiles = load_atlas(chars)
+    # A .pal file, or each ROM bank cpu.bin@all asks for; the layers are shared by all of them
+    palettes = [(label, load_palette(pal_data)) for label, pal_data in read_palettes(args.palette)]
+    cache = LayerCache(cpu, tiles)
+
+    def contact_sheet(total, label):
+        if args.sheet is None:
+            return contextlib.nullcontext()
+        return ContactSheet(labelled(args.sheet, label), total, args.sheet_across, show_number=True, show_grid=True)
+
+    if args.pack:
+        for label, palette in palettes:
+            with contact_sheet(count_pack(args.pack), label) as sheet:
+                generate_pack(cpu, tiles, palette, args.pack, labelled(args.output, label), args.chunk, args.jobs,
+                              args.indexed, sheet, cache)
+            if args.sheet:
+                print(f"🗺️ Contact sheet saved to {labelled(args.sheet, label)}")
+        exit(0)
+
+    total_levels = count_levels(cpu)
+
+    # Priority: --level > --levels > all
+    if args.level is not None:
+        if not (1 <= args.level <= total_levels):
+            print(f"ERROR: --level must be between 1 and {total_levels} (inclusive).")
+            exit(1)
+        levels_to_do = [args.level - 1]  # Convert 1-based to 0-based
+    elif args.levels is not None:
+        levels_to_do = list(range(min(total_levels, args.levels)))
+    else:
+        levels_to_do = list(range(total_levels))
+
+    for label, palette in palettes:
+        with contact_sheet(len(levels_to_do), label) as sheet:
+            generate_levels(cpu, tiles, palette, labelled(args.output, label), levels_to_do, args.jobs, args.indexed,
+                            sheet, suffix_for(args.format), cache)
+        if args.sheet:
+            print(f"🗺️ Contact sheet saved to {labelled(args.sheet, label)}")
@@ -0,0 +1,145 @@
+"""
+External Rampage level packs
+============================
+
+A level pack holds any number of levels in the ROM's own format, so custom
+event packs can go far past the 132 levels of the $8DAE table. After a
+5-byte header (b"RLVP", version) each level is one record:
+
+    10-byte level table entry    word (ignored), silhouette << 4, terrain, foliage, ...
+    building list                id, x_char, palette per building, $FF at the end
+
+Records are read one at a time, so a pack of any size is rendered with
+bounded memory. Buildings, silhouettes, terrain and foliage still come from
+cpu.bin; the pack only says which ones each level uses.
+
+Rendered levels go into chunked zip archives (PNG entries, stored) instead
+of one file per level:
+
+    Game_level_0000.zip   Game_level_000001.png ... Game_level_001000.png
+    Game_level_0001.zip   Game_level_001001.png ...
+"""
+
+import os
+import time
+import zipfile
+
+PACK_MAGIC = b"RLVP"
+PACK_VERSION = 1
+ENTRY_SIZE = 10
+LIST_END = 0xFF
+LIST_MARKERS = (0xFA, 0xFB, 0xFC, 0xFD)  # 2-byte entries the level plotter skips
+DEFAULT_CHUNK = 1000
+
+
+def entry_bytes(background_number, terrain_byte, foliage_index):
+    """A 10-byte level entry for a level built outside the ROM."""
+    return bytes((0, 0, (background_number & 0x0F) << 4, terrain_byte, foliage_index)) + bytes(ENTRY_SIZE - 5)
+
+
+def write_pack(f, levels):
+    """
+    Write levels to a pack file: each level is (entry, buildings) with the
+    raw 10-byte table entry and (building_id, x_char, palette_code) tuples.
+    Returns the number of levels written.
+    """
+    f.write(PACK_MAGIC + bytes((PACK_VERSION,)))
+    count = 0
+    for entry, buildings in levels:
+        if len(entry) != ENTRY_SIZE:
+            raise ValueError(f"Level {count + 1}: entry is {len(entry)} bytes, expected {ENTRY_SIZE}")
+        f.write(bytes(entry))
+        for building in buildings:
+            f.write(bytes(building))
+        f.write(bytes((LIST_END,)))
+        count += 1
+    return count
+
+
+def read_pack(f):
+    """
+    Yield (index, level_data) for every level in a pack, level_data being
+    (background_number, terrain_byte, foliage_index, buildings) as
+    get_level_buildings() returns it.
+    """
+    header = f.read(len(PACK_MAGIC) + 1)
+    if header[:len(PACK_MAGIC)] != PACK_MAGIC:
+        raise ValueError("Not a Rampage level pack (missing RLVP header)")
+    if header[-1] != PACK_VERSION:
+        raise ValueError(f"Level pack version {header[-1]}, expected {PACK_VERSION}")
+
+    index = 0
+    while True:
+        entry = f.read(ENTRY_SIZE)
+        if not entry:
+            return
+        if len(entry) < ENTRY_SIZE:
+            raise ValueError(f"Level {index + 1}: truncated entry")
+        buildings = []
+        while True:
+            b0 = f.read(1)
+            if not b0:
+                raise ValueError(f"Level {index + 1}: building list has no $FF end")
+            b0 = b0[0]
+            if b0 == LIST_END:
+                break
+            elif b0 in LIST_MARKERS:
+                f.read(1)
+                continue
+            rest = f.read(2)
+            if len(rest) < 2:
+                raise ValueError(f"Level {index + 1}: truncated building entry")
+            buildings.append((b0, rest[0], rest[1]))
+        yield index, ((entry[2] & 0xF0) >> 4, entry[3], entry[4], buildings)
+        index += 1
+
+
+class LevelArchive:
+    """Level PNGs written into zip archives of `chunk` levels each (0: a single archive)."""
+
+    def __init__(self, output, chunk=DEFAULT_CHUNK):
+        self.output = str(output)
+        self.chunk = chunk
+        self.zip = None
+        self.part = None
+        self.first = None
+        self.last = None
+        self.count = 0
+        self.paths = []
+        self.start = time.perf_counter()
+
+    def path(self, part):
+        return f"{self.output}_{part:04d}.zip" if self.chunk else f"{self.output}.zip"
+
+    def entry_name(self, index):
+        return f"{os.path.basename(self.output)}_{index + 1:06d}.png"
+
+    def add(self, index, png):
+        part = index // self.chunk if self.chunk else 0
+        if part != self.part:
+            self._close_part()
+            self.part, self.first = part, index
+            self.paths.append(self.path(part))
+            self.zip = zipfile.ZipFile(self.paths[-1], "w", zipfile.ZIP_STORED)
+        self.zip.writestr(self.entry_name(index), png)
+        self.last = index
+        self.count += 1
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.count / elapsed if elapsed else 0.0
+
+    def _close_part(self):
+        if self.zip is not None:
+            self.zip.close()
+            print(f"📦 Levels {self.first + 1}-{self.last + 1} → {self.paths[-1]} ({self.rate():.1f} levels/s)")
+            self.zip = None
+
+    def close(self):
+        self._close_part()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,586 @@
+"""
+Rampage conversion pipeline
+===========================
+
+Runs every step of convert_data.bat inside one Python process, driven by a
+JSON manifest (convert_data.json). Each input file is read from disk once
+and kept in memory, and the decoded character atlas and palettes are shared
+by every job that asks for them, so no step pays for interpreter start-up,
+the Pillow import or re-reading cpu.bin / BG-REV.bin.
+
+Manifest layout:
+
+    {
+      "requires": ["pro-0_3b_rev_3_8-27-86.3b"],
+      "jobs": [
+        {"job": "decomp", "input": "cpu.bin", "output": "MAPS/title_screen_81c6.bin", "offset": "81C6"},
+        {"job": "tile_plot", "characters": "BG-REV.bin", "palette": "palettes_2.pal",
+         "map": "MAPS/title_screen_81c6.bin", "output": "PNG/Title_Screen.png"},
+        ...
+      ]
+    }
+
+Paths are relative to the manifest's folder (or --root). Hex values are
+written the same way as on the command line of the individual scripts, and
+offsets can also name a game.bin.lst label ("offset": "score_status_lines").
+tile_plot, buildings and levels jobs take "indexed": true to write palette
+PNGs instead of RGB, and grid_pngs takes "stream": true to build the sheet a
+row of images at a time. buildings and levels jobs take "format": "npy" (or
+"qoi") to write raw arrays a later grid_pngs job reads back without decoding;
+other jobs pick the format from their output's extension. A "palette" can
+also be a bank decoded from the ROM, "cpu.bin@1" to "cpu.bin@4" (see
+rom_palette.py), in place of a .pal file.
+
+Runs are incremental: build_state.py records a fingerprint of every output
+(input file hashes, job settings, script source) in a state file, and jobs
+whose outputs are up to date are skipped. decomp jobs only hash the RLE bytes
+they read, and levels are tracked one by one from the ROM ranges each level
+is drawn from, so changing a palette or one building entry in the $95B6
+table only re-renders the levels that use it. --force rebuilds everything.
+
+--watch keeps the process (and every decoded atlas) alive after the run and
+polls the files the jobs read. When one changes, only the jobs that read it,
+directly or through another job's output, are run again: an edited
+palettes_3.pal redraws the four dateline screens, and a hand-edited MAPS file
+re-renders its PNG without being decoded again from cpu.bin.
+"""
+
+import argparse
+import glob
+import inspect
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import building_plot_multi
+import byte_transform
+import characters_grid
+import compose_rampage_overlay_pairs_space
+import compose_rampage_sprite_reverse
+import decomp
+import grid_pngs
+import image_writer
+import instrument
+import level_generator_final
+import merge2bits
+import merge_mcr3_bg_4bp
+import sprite_grid_plot
+import swapnybbles
+import tile_plot
+from build_state import BuildState, digest, source_digest
+from image_formats import IMAGE_EXTENSIONS, PALETTE_SUFFIX, format_for, suffix_for
+from image_writer import save_image
+from instrument import detail, span
+from rom_image import RomImage
+from rom_palette import palette_source, read_palette
+from sprite_tiles import SpriteSheet
+from symbols import resolve_address
+from tile_atlas import load_atlas, palette_lut
+
+
+class Workspace:
+    """Input files, decoded atlases and palettes shared by every job in a run."""
+
+    def __init__(self, root, state=None):
+        self.root = Path(root)
+        self.state = state
+        self.files = {}
+        self.digests = {}
+        self.atlases = {}
+        self.palettes = {}
+        self.sprite_sheets = {}
+
+    def path(self, name):
+        return self.root / name
+
+    def key(self, name):
+        return str(self.path(name).resolve())
+
+    def read(self, name):
+        key = self.key(name)
+        if key not in self.files:
+            self.files[key] = self.path(name).read_bytes()
+        return self.files[key]
+
+    def write(self, name, data):
+        path = self.path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        self.forget(name)
+        self.files[self.key(name)] = bytes(data)
+
+    def forget(self, name):
+        key = self.key(name)
+        self.files.pop(key, None)
+        self.digests.pop(key, None)
+        self.atlases.pop(key, None)
+        for palette in [palette for palette in self.palettes if palette[0] == key]:
+            del self.palettes[palette]
+        self.sprite_sheets.pop(key, None)
+
+    def output(self, name):
+        """Path for a file a job writes itself; drops any cached copy."""
+        path = self.path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.forget(name)
+        return path
+
+    def digest(self, name):
+        key = self.key(name)
+        if key not in self.digests:
+            self.digests[key] = digest(self.read(name))
+        return self.digests[key]
+
+    def atlas(self, name):
+        key = self.key(name)
+        if key not in self.atlases:
+            self.atlases[key] = load_atlas(self.read(name))
+        return self.atlases[key]
+
+    def sprites(self, name):
+        """Decoded sprites with one coloured-tile cache for every sprite job."""
+        key = self.key(name)
+        if key not in self.sprite_sheets:
+            self.sprite_sheets[key] = SpriteSheet(self.read(name))
+        return self.sprite_sheets[key]
+
+    def rom(self, name):
+        """Zero-copy RomImage over a file's cached bytes."""
+        return RomImage(self.read(name), name=name)
+
+    def palette_data(self, name):
+        """Bytes of a .pal file, or of the ROM bank a "cpu.bin@3" name decodes (see rom_palette.py)."""
+        return read_palette(name, self.read)
+
+    def palette(self, name):
+        key = self.key(palette_source(name)), name
+        if key not in self.palettes:
+            self.palettes[key] = palette_lut(self.palette_data(name))
+        return self.palettes[key]
+
+
+def hex_value(value):
+    """Manifest address: hex as on the command line, or a game.bin.lst symbol (see symbols.py)."""
+    return resolve_address(value)
+
+
+def job_concat(ws, job):
+    # copy /b a+b out
+    ws.write(job["output"], b"".join(ws.read(name) for name in job["inputs"]))
+    print(f"Joined {' + '.join(job['inputs'])} into {job['output']}")
+
+def job_merge_bg_4bp(ws, job):
+    data0, data1 = (ws.read(name) for name in job["inputs"])
+    xor_val = hex_value(job["xor"]) if "xor" in job else None
+    perm = tuple(job["perm"]) if "perm" in job else None
+    output = merge_mcr3_bg_4bp.convert_inverted_to_linear(data0, data1, perm, xor_val)
+    ws.write(job["output"], output)
+    print(f"Wrote {len(output) // 32} tiles ({len(output)} bytes) as linear 4bpp to {job['output']}")
+
+def job_merge2bits(ws, job):
+    data1, data2 = (ws.read(name) for name in job["inputs"])
+    out = io.BytesIO()
+    merge2bits.merge_bitplanes(io.BytesIO(data1), io.BytesIO(data2), out)
+    ws.write(job["output"], out.getvalue())
+
+def job_swap_nybble(ws, job):
+    ws.write(job["output"], byte_transform.reverse_nibbles(ws.read(job["input"]), hex_value(job.get("xor", 0))))
+
+def job_swapnybbles(ws, job):
+    ws.write(job["output"], swapnybbles.swap_data(ws.read(job["input"])))
+    print(f"Processed file saved as {job['output']}")
+
+def job_merge_binary(ws, job):
+    ws.write(job["output"], byte_transform.interleave(*(ws.read(name) for name in job["inputs"])))
+    print(f"Merged files into {ws.path(job['output'])}")
+
+def job_characters_grid(ws, job):
+    tiles = ws.atlas(job["characters"])[0, :-1]
+    palette = characters_grid.parse_palette(ws.palette_data(job["palette"]))
+    img = characters_grid.render_characters(tiles, palette, job.get("width", 32))
+    save_image(img, ws.output(job["output"]), format=format_for(job["output"], "PNG"))
+    print(f"Wrote {job['output']} ({img.width}x{img.height}) showing {len(tiles)} tiles.")
+
+def job_decomp(ws, job):
+    offset = hex_value(job["offset"])
+    decoded, end_offset = decomp.decode_character_data(ws.rom(job["input"]).view(offset), offset)
+    ws.write(job["output"], decoded)
+    print(f"✅ Decoded {len(decoded)} bytes to {job['output']}")
+    print(f"🧭 Compressed data ended at offset: ${end_offset:04X}")
+    return {"range": [offset, end_offset]}
+
+def job_savebit(ws, job):
+    start, end = hex_value(job["start"]), hex_value(job["end"])
+    ws.write(job["output"], ws.read(job["input"])[start:end + 1])
+    print(f"Successfully saved {end - start + 1} bytes from {job['input']} (offset {job['start']}) to {job['output']}")
+
+def job_tile_plot(ws, job):
+    img = tile_plot.render_map(ws.atlas(job["characters"]), ws.palette(job["palette"]),
+                               ws.read(job["map"]), job.get("width", 32), job.get("direction", "top"),
+                               job.get("indexed", False))
+    save_image(img, ws.output(job["output"]))
+    print(f"Wrote {job['output']} with palette fix (192-byte palette, inverted index)")
+
+def job_buildings(ws, job):
+    prefix = ws.output(job["output"])
+    building_plot_multi.plot_buildings(ws.atlas(job["characters"]), ws.palette(job["palette"]),
+                                       ws.rom(job["map"]), hex_value(job["offset"]),
+                                       job.get("count", 45), prefix, job.get("indexed", False),
+                                       suffix_for(job.get("format", "png")))
+
+def job_sprite_grid(ws, job):
+    palette = sprite_grid_plot.parse_palette(ws.palette_data(job["palette"]))
+    img = sprite_grid_plot.render_sprites(ws.sprites(job["sprites"]), palette, job.get("width", 8),
+                                          job.get("number", False), job.get("grid", False))
+    save_image(img, ws.output(job["output"]), format=format_for(job["output"], "PNG"))
+    print(f"Wrote {job['output']}")
+
+def job_levels(ws, job):
+    cpu = ws.rom(job["cpu"])
+    palette = level_generator_final.load_palette(ws.palette_data(job["palette"]))
+    total_levels = level_generator_final.count_levels(cpu)
+    levels_to_do = list(range(min(total_levels, job.get("levels", total_levels))))
+    suffix = suffix_for(job.get("format", "png"))
+
+    # Each level is its own output, fingerprinted from the ROM bytes it is drawn from
+    names = {level: level_generator_final.level_filename(job["output"], level, suffix) for level in levels_to_do}
+    fingerprints = {}
+    if ws.state is not None:
+        base = digest(source_digest("level_generator_final"), ws.digest(job["characters"]),
+                      digest(ws.palette_data(job["palette"])), job.get("indexed", False))
+        for level in levels_to_do:
+            level_data, ranges = level_generator_final.level_sources(cpu, level)
+            fingerprints[level] = digest(base, level_data, ranges, *(cpu.view(start, end - start) for start, end in ranges))
+        stale = [level for level in levels_to_do if not ws.state.fresh(names[level], fingerprints[level], ws.root)]
+        if len(stale) < len(levels_to_do):
+            print(f"⏭️ {len(levels_to_do) - len(stale)} of {len(levels_to_do)} levels up to date")
+        levels_to_do = stale
+
+    if levels_to_do:
+        level_generator_final.generate_levels(cpu, ws.atlas(job["characters"]), palette,
+                                              ws.output(job["output"]), levels_to_do, job.get("jobs", 1),
+                                              job.get("indexed", False), suffix=suffix)
+        image_writer.flush()
+    if ws.state is not None:
+        for level in levels_to_do:
+            ws.state.record(names[level], fingerprints[level], ws.root, [ws.path(names[level])])
+    return ws.state is not None and not levels_to_do
+
+def job_grid_pngs(ws, job):
+    grid_pngs.main(ws.path(job["folder"]), ws.output(job["output"]), job.get("across", 15),
+                   job.get("number", False), job.get("grid", False), job.get("stream", False))
+
+def job_compose_sprite_reverse(ws, job):
+    palette = compose_rampage_sprite_reverse.parse_palette(ws.palette_data(job["palette"]))
+    out = compose_rampage_sprite_reverse.compose_strip(ws.rom(job["cpu"]), ws.sprites(job["sprites"]), palette)
+    save_image(out, ws.output(job["output"]))
+    print(f"Saved 68-strip sprite sheet with controlled X-flip to {job['output']}")
+
+def job_compose_overlay_pairs(ws, job):
+    palette = compose_rampage_overlay_pairs_space.parse_palette(ws.palette_data(job["palette"]))
+    pairs = compose_rampage_overlay_pairs_space.parse_pairs(ws.read(job["pairs"]).decode())
+    canvas, debug_output = compose_rampage_overlay_pairs_space.compose_pairs(
+        ws.rom(job["cpu"]), ws.sprites(job["sprites"]), palette, pairs,
+        job.get("mode", "both"), job.get("gapx", 96), job.get("gapy", 8))
+    save_image(canvas, ws.output(job["output"]))
+    print(f"Saved: {job['output']}")
+    detail("\n".join(debug_output))
+
+
+JOBS = {
+    "concat": job_concat,
+    "merge_bg_4bp": job_merge_bg_4bp,
+    "merge2bits": job_merge2bits,
+    "swap_nybble": job_swap_nybble,
+    "swapnybbles": job_swapnybbles,
+    "merge_binary": job_merge_binary,
+    "characters_grid": job_characters_grid,
+    "decomp": job_decomp,
+    "savebit": job_savebit,
+    "tile_plot": job_tile_plot,
+    "buildings": job_buildings,
+    "sprite_grid": job_sprite_grid,
+    "levels": job_levels,
+    "grid_pngs": job_grid_pngs,
+    "compose_sprite_reverse": job_compose_sprite_reverse,
+    "compose_overlay_pairs": job_compose_overlay_pairs,
+}
+
+
+# Module each job's output comes from; the local modules it uses are found
+# from its imports and hashed along with it as the job's code version.
+JOB_CODE = {
+    "merge_bg_4bp": "merge_mcr3_bg_4bp",
+    "merge2bits": "merge2bits",
+    "swap_nybble": "byte_transform",
+    "swapnybbles": "swapnybbles",
+    "merge_binary": "byte_transform",
+    "characters_grid": "characters_grid",
+    "decomp": "decomp",
+    "tile_plot": "tile_plot",
+    "buildings": "building_plot_multi",
+    "sprite_grid": "sprite_grid_plot",
+    "levels": "level_generator_final",
+    "grid_pngs": "grid_pngs",
+    "compose_sprite_reverse": "compose_rampage_sprite_reverse",
+    "compose_overlay_pairs": "compose_rampage_overlay_pairs_space",
+}
+
+INPUT_FIELDS = ("input", "inputs", "characters", "palette", "map", "cpu", "sprites", "pairs")
+ADDRESS_FIELDS = ("offset", "start", "end")
+
+# Jobs that keep their own per-output build state; they return True when every output was up to date
+SELF_TRACKED = {"levels"}
+
+WATCH_INTERVAL = 0.25  # seconds between polls in --watch mode
+
+
+def building_slices(rom, table_offset, count):
+    """The pointer table entries and building data a buildings job reads, as plot_buildings() walks them."""
+    slices = []
+    for i in range(count):
+        entry_offset = table_offset + i * 2
+        if not rom.contains(entry_offset, 2):
+            break
+        slices.append(rom.view(entry_offset, 2))
+        start = rom.le16(entry_offset)
+        if rom.contains(start, 3):
+            slices.append(rom.view(start, min(level_generator_final.building_end(rom, start), rom.end) - start))
+    return slices
+
+
+def rom_slices(ws, job):
+    """(field, bytes read) for a savebit or buildings job, which only read part of their ROM; else None."""
+    if job["job"] == "savebit":
+        rom = ws.rom(job["input"])
+        start, end = hex_value(job["start"]), hex_value(job["end"])
+        if rom.contains(start, end - start + 1):
+            return "input", [rom.view(start, end - start + 1)]
+    elif job["job"] == "buildings":
+        rom = ws.rom(job["map"])
+        return "map", building_slices(rom, hex_value(job["offset"]), job.get("count", 45))
+    return None
+
+
+def input_digests(ws, job, entry):
+    """Hashes of everything a job reads, using what the last build recorded where it can."""
+    if job["job"] == "decomp" and entry and "range" in entry:
+        # Only the RLE bytes the decoder walked decide the output
+        rom = ws.rom(job["input"])
+        start, end = entry["range"]
+        if end <= rom.end:
+            return [len(rom), rom.view(start, end - start)]
+
+    # Only the ROM ranges a savebit or buildings job reads decide its output, so
+    # an edit elsewhere in cpu.bin (a level table tweak, say) leaves it alone
+    sliced = rom_slices(ws, job)
+    digests = []
+    if sliced is not None:
+        field, slices = sliced
+        digests += [len(ws.rom(job[field]))] + slices
+    for field in INPUT_FIELDS:
+        if sliced is not None and field == sliced[0]:
+            continue
+        value = job.get(field, [])
+        if field == "palette" and value and palette_source(value) != value:
+            digests.append(ws.palette_data(value))  # a ROM bank: only its colours count
+            continue
+        digests += [ws.digest(name) for name in ([value] if isinstance(value, str) else value)]
+    if "folder" in job:
+        folder = ws.path(job["folder"])
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS + (PALETTE_SUFFIX,)):
+                digests += [name, (folder / name).read_bytes()]
+    return digests
+
+
+def job_inputs(job):
+    names = [job["folder"]] if "folder" in job else []
+    for field in INPUT_FIELDS:
+        value = job.get(field, [])
+        if field == "palette" and value:
+            value = palette_source(value)  # a ROM bank ("cpu.bin@3") is read from the ROM file
+        names += [value] if isinstance(value, str) else value
+    return names
+
+
+def overwritten(jobs):
+    """Indexes of jobs whose output a later job writes again before any job reads it."""
+    result = set()
+    for i, job in enumerate(jobs):
+        for later in jobs[i + 1:]:
+            if job["output"] in job_inputs(later) or job["output"] == later.get("folder"):
+                break
+            if later["output"] == job["output"]:
+                result.add(i)
+                break
+    return result
+
+
+def job_fingerprint(ws, job, entry=None):
+    code = [inspect.getsource(JOBS[job["job"]])]
+    if job["job"] in JOB_CODE:
+        code.append(source_digest(JOB_CODE[job["job"]]))
+    # Symbolic offsets are fingerprinted by the address they resolve to now
+    addresses = [hex_value(job[field]) for field in ADDRESS_FIELDS if field in job]
+    return digest(json.dumps(job, sort_keys=True), *code, *addresses, *input_digests(ws, job, entry))
+
+
+def job_outputs(ws, job):
+    """Files a job wrote: its output file, or PREFIX_* for jobs given an output prefix."""
+    path = ws.path(job["output"])
+    if path.is_file():
+        return [path]
+    return sorted(Path(p) for p in glob.glob(glob.escape(str(path)) + "_*"))
+
+
+def load_manifest(path):
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    for i, job in enumerate(manifest.get("jobs", [])):
+        if job.get("job") not in JOBS:
+            raise ValueError(f"Job {i + 1}: unknown job type {job.get('job')!r}")
+    return manifest
+
+
+def run_jobs(ws, jobs):
+    """Run jobs in order, skipping those whose outputs are up to date; returns how many were skipped."""
+    skipped = 0
+    overwritten_jobs = overwritten(jobs)
+    for i, job in enumerate(jobs):
+        if i in overwritten_jobs:
+            skipped += 1
+            print(f"⏭️ {job['output']} is written again by a later job, skipping")
+            continue
+        if ws.state is None or job["job"] in SELF_TRACKED:
+            with span(f"job:{job['job']}", output=job["output"]):
+                up_to_date = JOBS[job["job"]](ws, job)
+                image_writer.flush()
+            if job["job"] in SELF_TRACKED and up_to_date:
+                skipped += 1
+            continue
+
+        key = job["output"]
+        entry = ws.state.get(key)
+        with span("fingerprint", output=key):
+            fresh = ws.state.fresh(key, job_fingerprint(ws, job, entry), ws.root)
+        if fresh:
+            skipped += 1
+            print(f"⏭️ {key} is up to date")
+            continue
+        with span(f"job:{job['job']}", output=key):
+            extra = JOBS[job["job"]](ws, job) or {}
+            image_writer.flush()  # later jobs and the build state need the finished files
+        ws.state.record(key, job_fingerprint(ws, job, extra), ws.root, job_outputs(ws, job), **extra)
+
+    if ws.state is not None:
+        ws.state.save()
+    return skipped
+
+
+def run(manifest, ws, only=None):
+    for name in manifest.get("requires", []):
+        if not ws.path(name).exists():
+            print("You must provide unzip the rampage.zip roms here for anything to work! Exiting.")
+            return False
+
+    start = time.perf_counter()
+    jobs = [job for job in manifest["jobs"] if only is None or job["job"] in only]
+    skipped = run_jobs(ws, jobs)
+    print(f"\nFinished {len(jobs)} jobs ({skipped} skipped) in {time.perf_counter() - start:.2f}s")
+    return True
+
+
+def reads_any(ws, job, names):
+    """Whether a job reads one of the named files, or a file in its input folder that another job writes."""
+    keys = {ws.key(name) for name in names}
+    if any(ws.key(name) in keys for name in job_inputs(job) if name != job.get("folder")):
+        return True
+    folder = job.get("folder")
+    return folder is not None and any(Path(key).parent == Path(ws.key(folder)) for key in keys)
+
+
+def dependents(ws, jobs, changed):
+    """The jobs that read a changed file, directly or through the outputs of other such jobs, in manifest order."""
+    names = set(changed)
+    result = []
+    for job in jobs:
+        if reads_any(ws, job, names):
+            result.append(job)
+            names.add(job["output"])
+    return result
+
+
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def watch(manifest, ws, only=None, interval=WATCH_INTERVAL):
+    """
+    Poll every file the jobs read (ROMs, palettes, MAPS/*.bin, ...) and, when
+    some change, re-run only the jobs that depend on them. The decoded atlases,
+    palettes and file contents of everything else stay cached in ws. A
+    hand-edited output such as a MAPS file re-renders what reads it without
+    re-running the job that wrote it.
+    """
+    jobs = [job for job in manifest["jobs"] if only is None or job["job"] in only]
+    names = sorted({name for job in jobs for name in job_inputs(job) if name != job.get("folder")})
+    stamps = {name: file_stamp(ws.path(name)) for name in names}
+    print(f"\n👀 Watching {len(names)} files, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(interval)
+            now = {name: file_stamp(ws.path(name)) for name in names}
+            changed = [name for name in names if now[name] != stamps[name]]
+            if not changed:
+                continue
+            stamps.update(now)
+            for name in changed:
+                ws.forget(name)
+            todo = dependents(ws, jobs, changed)
+            start = time.perf_counter()
+            print(f"\n🔁 Changed: {', '.join(changed)} ({len(todo)} dependent {'job' if len(todo) == 1 else 'jobs'})")
+            with span("watch_update"):
+                skipped = run_jobs(ws, todo)
+            # What the jobs just wrote is not an edit to react to
+            written = {ws.key(job["output"]) for job in todo}
+            stamps.update({name: file_stamp(ws.path(name)) for name in names if ws.key(name) in written})
+            print(f"✅ Re-ran {len(todo) - skipped} of them in {time.perf_counter() - start:.2f}s")
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Rampage conversion jobs from a manifest in one process.")
+    parser.add_argument("manifest", nargs="?", default="convert_data.json", help="Job manifest (default convert_data.json)")
+    parser.add_argument("--root", default=None, help="Folder the manifest paths are relative to (default: manifest folder)")
+    parser.add_argument("--only", nargs="+", choices=sorted(JOBS), default=None, help="Only run jobs of these types")
+    parser.add_argument("--force", action="store_true", help="Rebuild every output, even those that are up to date")
+    parser.add_argument("--state", default=None, help="Build state file (default: <manifest>.state.json next to the manifest)")
+    parser.add_argument("--watch", action="store_true",
+                        help="After the run, keep watching the inputs and re-run the jobs that depend on what changed")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL,
+                        help=f"Seconds between checks with --watch (default {WATCH_INTERVAL})")
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.manifest)
+    root = args.root if args.root is not None else Path(args.manifest).resolve().parent
+    state = BuildState(args.state if args.state is not None else Path(args.manifest).with_suffix(".state.json"))
+    if args.force:
+        state.entries.clear()
+    ws = Workspace(root, state)
+    if not run(manifest, ws, args.only):
+        sys.exit(1)
+    if args.watch:
+        watch(manifest, ws, args.only, args.interval)
+
+if __name__ == "__main__":
+    instrument.start()
+    main()
@@ -0,0 +1,136 @@
+"""
+Rampage RLE encoder
+===================
+
+Packs character data (as decomp.py writes it) back into the $00-terminated
+repeat/literal format with decomp.encode_character_data(), which finds the
+smallest stream decode_character_data() reads back exactly:
+
+    python recompress.py MAPS/edited_silhouette.bin silhouette.rle
+    python recompress.py MAPS/edited_silhouette.bin silhouette.rle --rom cpu.bin --offset 7C45
+
+With --rom/--offset the packed size is checked against the block it replaces.
+
+Bulk mode re-encodes every block the levels use (the $7613 sky strip and
+the blocks in the $8928 terrain and $8934 silhouette tables) and reports how
+many bytes the optimal encoding frees compared with the ROM's own:
+
+    python recompress.py --rom cpu.bin
+    python recompress.py --rom cpu.bin --write cpu_packed.bin
+
+Blocks are re-encoded in place, so every pointer stays valid and the bytes
+saved are left free ($00) at the end of each block. When blocks overlap
+(rle_scan.py flags them), rewriting one can change another, so every block
+is decoded again from the packed ROM and compared with the original before
+anything is written; --write saves the ROM only if they all match.
+"""
+
+import argparse
+
+import instrument
+from decomp import decode_character_data, encode_character_data
+from instrument import detail, span
+from level_generator_final import SILHOUETTE_TABLE, TERRAIN_TABLE, TOP_STRIP_OFFSET
+from rom_image import RomImage
+from symbols import resolve_address
+
+TABLE_ENTRIES = 6  # words in each of the $8928 and $8934 tables
+
+
+def level_blocks(rom):
+    """(address, names) for every RLE block the levels draw from, shared blocks listed once."""
+    blocks = {TOP_STRIP_OFFSET: ["sky"]}
+    for table, kind in ((TERRAIN_TABLE, "terrain"), (SILHOUETTE_TABLE, "silhouette")):
+        for index in range(0, TABLE_ENTRIES * 2, 2):
+            blocks.setdefault(rom.le16(table + index), []).append(f"{kind} {index:02X}")
+    return sorted(blocks.items())
+
+
+def recompress_block(rom, address):
+    """(decoded, original_size, encoded) for the RLE block at address; the encoding is checked to round-trip."""
+    decoded, end = decode_character_data(rom.view(address), address)
+    encoded = encode_character_data(decoded)
+    if decode_character_data(encoded, 0)[0] != decoded:
+        raise ValueError(f"Block ${address:04X} does not round-trip through decode_character_data")
+    return decoded, end - address, encoded
+
+
+def recompress_rom(cpu_data):
+    """
+    Re-encode every level block in place; returns (packed ROM bytes,
+    [(address, names, old, new)]). Raises ValueError if any block decodes
+    differently from the packed ROM, e.g. because blocks overlap.
+    """
+    rom = RomImage.wrap(cpu_data)
+    packed = bytearray(rom.data)
+    report = []
+    originals = {}
+    for address, names in level_blocks(rom):
+        with span("rle_encode", offset=f"{address:04X}"):
+            originals[address], size, encoded = recompress_block(rom, address)
+        offset = address - rom.base
+        packed[offset:offset + size] = encoded + bytes(size - len(encoded))
+        report.append((address, names, size, len(encoded)))
+
+    repacked = RomImage(packed, rom.base)
+    broken = [f"${address:04X} ({', '.join(names)})" for address, names in level_blocks(rom)
+              if decode_character_data(repacked.view(address), address)[0] != originals[address]]
+    if broken:
+        raise ValueError(f"Re-encoding in place changed {', '.join(broken)}; the blocks overlap")
+    return bytes(packed), report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack Rampage character data into the ROM's RLE format.")
+    parser.add_argument("input", nargs="?", help="decoded character data (2 bytes per tile word)")
+    parser.add_argument("output", nargs="?", help="packed RLE stream")
+    parser.add_argument("--rom", help="cpu.bin: compare with the block at --offset, or re-encode every level block")
+    parser.add_argument("--offset", help="hex offset or game.bin.lst label of the block the input replaces")
+    parser.add_argument("--write", help="bulk mode: save the ROM with every level block re-encoded in place")
+    args = parser.parse_args()
+
+    if args.input is None:
+        if args.rom is None:
+            parser.error("give an input and output file, or --rom for bulk mode")
+        rom = RomImage.open(args.rom)
+        try:
+            packed, report = recompress_rom(rom)
+        except ValueError as e:
+            print(f"❌ {args.rom}: {e}")
+            return
+        for address, names, old, new in report:
+            detail(f"🗜️ ${address:04X} {', '.join(names)}: {old} → {new} bytes (saves {old - new})")
+        old_total = sum(old for _, _, old, _ in report)
+        new_total = sum(new for _, _, _, new in report)
+        print(f"📦 {len(report)} blocks: {old_total} → {new_total} bytes, "
+              f"{old_total - new_total} bytes free ({100 * (old_total - new_total) / max(old_total, 1):.1f}%)")
+        if args.write:
+            with open(args.write, "wb") as f:
+                f.write(packed)
+            print(f"💾 Saved re-encoded ROM to {args.write}")
+        return
+
+    if args.output is None:
+        parser.error("give an output file for the packed stream")
+    with open(args.input, "rb") as f:
+        data = f.read()
+    try:
+        encoded = encode_character_data(data)
+    except ValueError as e:
+        print(f"❌ {args.input}: {e}")
+        return
+    with open(args.output, "wb") as f:
+        f.write(encoded)
+    print(f"✅ Packed {len(data)} bytes into {len(encoded)} bytes in {args.output}")
+
+    if args.rom and args.offset:
+        address = resolve_address(args.offset)
+        with RomImage.open(args.rom) as rom:
+            _, end = decode_character_data(rom.view(address), address)
+        room = end - address
+        verdict = "fits" if len(encoded) <= room else f"is {len(encoded) - room} bytes too big"
+        print(f"🧭 Block ${address:04X} has {room} bytes: the packed stream {verdict}")
+
+if __name__ == "__main__":
+    instrument.start()
+    main()
@@ -0,0 +1,320 @@
+"""
+Rampage render server
+=====================
+
+Keeps cpu.bin, the character atlas, the sprites and every palette loaded
+(with all the level layers pre-built) and serves rendered images over plain
+HTTP, on localhost or a Unix socket, so a level browser does not start a
+new Python for every page:
+
+    python render_server.py .                       # http://127.0.0.1:8686/
+    python render_server.py . --socket /tmp/rampage.sock
+
+    GET /                     JSON list of what can be asked for
+    GET /level/12             level 12 (1-132)
+    GET /building/7           building 7 of the $95B6 table (1-45)
+    GET /map/title_screen_81c6
+    GET /map/7C45             any RLE block rle_scan.py finds, by name or address
+    GET /sprite/5             the 64x64 block of entry 5 in the $290D sprite table
+
+Every image takes ?palette=palettes_2 (any .pal file in the folder, or
+bank1-bank4 decoded from cpu.bin by rom_palette.py; default palettes_1) and
+?format=png|qoi|npy. Levels, buildings and maps also take
+?indexed=1, maps take ?width=32&direction=top like tile_plot.py, and sprites
+take ?flip=1 and ?variant=0|1|2 (the +$000 / +$100 / +$180 rows of
+compose_rampage_sprite_reverse.py).
+
+Encoded responses are kept in an LRU (--cache entries). Each one has an ETag
+made from the request and the digest of the files and code the server
+started with, so If-None-Match is answered with 304 without rendering
+anything, and a restarted server with the same ROM set keeps the same tags.
+Requests are served on their own threads: the lock only guards the LRU, so
+a cached image never waits for a render, and a request for an image that
+is already being rendered waits for that render instead of starting another.
+Renders run at the same time on the request threads and share the layer
+cache and the sprite sheet, which lock their own LRU and counts; the
+other per-server caches (palettes) only ever add the same value for a key.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import building_plot_multi
+import compose_rampage_sprite_reverse
+import instrument
+import level_generator_final
+import rle_scan
+import tile_plot
+from build_state import digest, source_digest
+from image_formats import FORMATS, suffix_for
+from image_writer import encode_image
+from instrument import span, tally
+from level_generator_final import BUILDING_TABLE, LayerCache
+from pipeline import Workspace
+from rom_palette import BANKS, bank_label
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8686
+CACHE_SIZE = 256
+DEFAULT_PALETTE = "palettes_1"
+BUILDING_COUNT = 45
+SPRITE_COUNT = 68  # entries in the $290D table, as compose_rampage_sprite_reverse.py draws them
+SPRITE_VARIANTS = (0x000, 0x100, 0x180)
+CONTENT_TYPES = {"PNG": "image/png", "QOI": "image/qoi", "NPY": "application/octet-stream"}
+
+# kind: allowed query parameters and their defaults
+PARAMETERS = {
+    "level": {"palette": DEFAULT_PALETTE, "format": "png", "indexed": "0"},
+    "building": {"palette": DEFAULT_PALETTE, "format": "png", "indexed": "0"},
+    "map": {"palette": DEFAULT_PALETTE, "format": "png", "indexed": "0", "width": "32", "direction": "top"},
+    "sprite": {"palette": DEFAULT_PALETTE, "format": "png", "flip": "0", "variant": "0"},
+}
+
+
+def flag(value):
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+class RenderServer:
+    """The loaded ROM set, the renderers and an LRU of encoded images."""
+
+    def __init__(self, root, cpu="cpu.bin", characters="BG-REV.bin", sprites="sprites.bin", cache_size=CACHE_SIZE):
+        with span("load"):
+            self.ws = Workspace(root)
+            self.cpu = self.ws.rom(cpu)
+            self.atlas = self.ws.atlas(characters)
+            self.sprites = self.ws.sprites(sprites) if self.ws.path(sprites).exists() else None
+            # palette name -> .pal file, or "cpu.bin@N" for a bank straight from the ROM
+            self.palettes = {bank_label(bank): f"{cpu}@{bank}" for bank in range(1, BANKS + 1)}
+            self.palettes.update((path.stem, path.name) for path in sorted(Path(root).glob("*.pal")))
+            self.level_palettes = {}
+            self.level_count = level_generator_final.count_levels(self.cpu)
+            self.layers = LayerCache(self.cpu, self.atlas)
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.layers.warm(range(self.level_count))
+                self.maps = {}
+                for block in rle_scan.scan_blocks(self.cpu):
+                    self.maps[Path(rle_scan.map_name(block.start)).stem.lower()] = block
+                    self.maps[f"{block.start:04x}"] = block
+        inputs = [self.ws.digest(cpu), self.ws.digest(characters)]
+        inputs += [self.ws.digest(sprites)] if self.sprites is not None else []
+        inputs += [(name, digest(self.ws.palette_data(source))) for name, source in self.palettes.items()]
+        self.version = digest(source_digest(__name__), *inputs)
+        self.cache_size = cache_size
+        self.responses = OrderedDict()
+        self.rendering = {}  # etag -> Future of the response, while one thread renders it
+        self.lock = threading.Lock()
+
+    def index(self):
+        return {
+            "levels": self.level_count,
+            "buildings": BUILDING_COUNT,
+            "maps": sorted({Path(rle_scan.map_name(block.start)).stem for block in self.maps.values()}),
+            "sprites": SPRITE_COUNT if self.sprites is not None else 0,
+            "palettes": sorted(self.palettes),
+            "formats": [suffix[1:] for suffix in FORMATS],
+        }
+
+    def request(self, path, query):
+        """(kind, item, settings) for a URL path and its query, or KeyError / ValueError."""
+        parts = [part for part in path.split("/") if part]
+        if len(parts) != 2 or parts[0] not in PARAMETERS:
+            raise KeyError(f"No such image: {path}")
+        kind, item = parts[0], parts[1].lower()
+        unknown = set(query) - set(PARAMETERS[kind])
+        if unknown:
+            raise ValueError(f"Unknown parameter for a {kind}: {', '.join(sorted(unknown))}")
+        settings = dict(PARAMETERS[kind], **query)
+        if settings["palette"] not in self.palettes:
+            raise KeyError(f"No palette {settings['palette']}")
+        suffix_for(settings["format"])
+        return kind, item, settings
+
+    def etag(self, kind, item, settings):
+        return '"' + digest(self.version, kind, item, sorted(settings.items())) + '"'
+
+    def response(self, kind, item, settings):
+        """(etag, content type, body), from the LRU or rendered and encoded now."""
+        etag = self.etag(kind, item, settings)
+        with self.lock:
+            cached = self.responses.get(etag)
+            if cached is not None:
+                self.responses.move_to_end(etag)
+                tally("server_cache_hits")
+                return cached
+            pending = self.rendering.get(etag)
+            if pending is None:
+                pending = self.rendering[etag] = Future()
+                rendering = True
+            else:
+                rendering = False
+        if not rendering:
+            tally("server_render_waits")
+            return pending.result()
+
+        tally("server_cache_misses")
+        try:
+            with span("render", kind=kind):
+                image = getattr(self, f"render_{kind}")(item, settings)
+            format = FORMATS[suffix_for(settings["format"])]
+            cached = (etag, CONTENT_TYPES[format], encode_image(image, format))
+        except BaseException as e:
+            with self.lock:
+                del self.rendering[etag]
+            pending.set_exception(e)
+            raise
+        with self.lock:
+            self.responses[etag] = cached
+            if len(self.responses) > self.cache_size:
+                self.responses.popitem(last=False)
+            del self.rendering[etag]
+        pending.set_result(cached)
+        return cached
+
+    def number(self, item, count):
+        """1-based item number as a 0-based index, or KeyError."""
+        if not item.isdigit() or not 1 <= int(item) <= count:
+            raise KeyError(f"{item} is not between 1 and {count}")
+        return int(item) - 1
+
+    def render_level(self, item, settings):
+        level = self.number(item, self.level_count)
+        name = settings["palette"]
+        if name not in self.level_palettes:
+            self.level_palettes[name] = level_generator_final.load_palette(self.ws.palette_data(self.palettes[name]))
+        level_data = level_generator_final.get_level_buildings(self.cpu, level)
+        return level_generator_final.render_level(self.cpu, *level_data, self.atlas, self.level_palettes[name],
+                                                  self.layers, flag(settings["indexed"]))
+
+    def render_building(self, item, settings):
+        index = self.number(item, BUILDING_COUNT)
+        offset = self.cpu.le16(BUILDING_TABLE + index * 2)
+        width, height, high_byte = self.cpu.u8(offset), self.cpu.u8(offset + 1), self.cpu.u8(offset + 2)
+        size = 3 + width * height * (2 if high_byte == 0xFF else 1)
+        if not self.cpu.contains(offset, size):
+            raise KeyError(f"Building {item} at ${offset:04X} runs past the end of the ROM")
+        return building_plot_multi.render_building(self.atlas, self.ws.palette(self.palettes[settings["palette"]]),
+                                                   self.cpu.view(offset, size), flag(settings["indexed"]))
+
+    def render_map(self, item, settings):
+        if item not in self.maps:
+            raise KeyError(f"No RLE block {item}")
+        width = int(settings["width"])
+        if width < 1 or settings["direction"] not in ("top", "bottom"):
+            raise ValueError("width must be positive and direction top or bottom")
+        return tile_plot.render_map(self.atlas, self.ws.palette(self.palettes[settings["palette"]]),
+                                    self.maps[item].data, width, settings["direction"], flag(settings["indexed"]))
+
+    def render_sprite(self, item, settings):
+        if self.sprites is None:
+            raise KeyError("No sprites file was loaded")
+        entry = self.cpu.sprite_entry(self.number(item, SPRITE_COUNT))
+        variant = int(settings["variant"])
+        if not 0 <= variant < len(SPRITE_VARIANTS):
+            raise ValueError(f"variant must be 0-{len(SPRITE_VARIANTS) - 1}")
+        palette = compose_rampage_sprite_reverse.parse_palette(self.ws.palette_data(self.palettes[settings["palette"]]))
+        ids = [sprite_id + SPRITE_VARIANTS[variant] for sprite_id in entry.ids]
+        return self.sprites.block(ids, [flag(settings["flip"])] * 4, palette)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = "RampageRender/1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        with span("request", path=url.path):
+            if url.path in ("", "/"):
+                self.send(HTTPStatus.OK, "application/json", json.dumps(self.server.renderer.index()).encode())
+                return
+            try:
+                kind, item, settings = self.server.renderer.request(url.path, dict(parse_qsl(url.query)))
+                etag = self.server.renderer.etag(kind, item, settings)
+                if etag in self.headers.get("If-None-Match", "").replace(" ", "").split(","):
+                    tally("server_not_modified")
+                    self.send(HTTPStatus.NOT_MODIFIED, etag=etag)
+                    return
+                etag, content_type, body = self.server.renderer.response(kind, item, settings)
+            except KeyError as e:
+                self.send(HTTPStatus.NOT_FOUND, "text/plain", f"{e.args[0]}\n".encode())
+                return
+            except (ValueError, IndexError) as e:
+                self.send(HTTPStatus.BAD_REQUEST, "text/plain", f"{e}\n".encode())
+                return
+            self.send(HTTPStatus.OK, content_type, body, etag)
+
+    def send(self, status, content_type=None, body=b"", etag=None):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")  # always revalidate, it is only a 304
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.log_requests:
+            print(f"🌐 {self.address_string()} {format % args}")
+
+
+def serve(renderer, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):  # POSIX only
+            daemon_threads = True
+
+        server = UnixHTTPServer(socket_path, RequestHandler)
+        where = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+        where = f"http://{host}:{server.server_address[1]}/"
+    server.renderer = renderer
+    # The renderers' per-item lines are dropped for every thread; requests are still logged unless --quiet
+    server.log_requests = not instrument.quiet()
+    instrument.set_quiet(True)
+    print(f"🛰️ Serving {renderer.level_count} levels, {BUILDING_COUNT} buildings and {len(renderer.index()['maps'])} maps "
+          f"on {where} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopped")
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve rendered Rampage levels, buildings, maps and sprites over HTTP.")
+    parser.add_argument("root", nargs="?", default=".", help="folder with cpu.bin, BG-REV.bin, sprites.bin and the .pal files")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default {DEFAULT_PORT})")
+    parser.add_argument("--socket", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--cache", type=int, default=CACHE_SIZE, help=f"encoded images to keep (default {CACHE_SIZE})")
+    parser.add_argument("--cpu", default="cpu.bin", help="program ROM, relative to root (default cpu.bin)")
+    parser.add_argument("--characters", default="BG-REV.bin", help="character set, relative to root (default BG-REV.bin)")
+    parser.add_argument("--sprites", default="sprites.bin", help="sprites, relative to root (default sprites.bin)")
+    args = parser.parse_args()
+
+    renderer = RenderServer(args.root, args.cpu, args.characters, args.sprites, args.cache)
+    serve(renderer, args.host, args.port, args.socket)
+
+if __name__ == "__main__":
+    instrument.start()
+    main()
@@ -0,0 +1,154 @@
+"""
+Rampage RLE block scanner
+=========================
+
+Finds every compressed block the game code points at and decodes them all
+in one pass over the ROM, instead of one decomp.py run per offset:
+
+    base_table        $8928   6 terrain strips
+    silhouette_table  $8934   6 silhouettes ($7C45 is listed twice)
+    dateline_images   $6712   the 3 player dateline screens
+    ld hl, nn         $66C6 (empty dateline), $896A (score_status_lines),
+                      $AE70 (title screen), $AEB7 (George/Lizzie/Ralph select)
+
+Each block is decoded once however many pointers lead to it. The listing
+shows its start and end, the compressed and decoded sizes and every pointer
+that reaches it. A block reached from more than one pointer is flagged as
+shared, and one that starts inside another block is flagged as overlapping:
+
+    python rle_scan.py cpu.bin              # list the blocks
+    python rle_scan.py cpu.bin MAPS         # and write every map into MAPS/
+
+Maps keep the file names convert_data.bat has always used. Blocks found
+any other way (--offset) are written as block_XXXX.bin.
+"""
+
+import argparse
+from collections import namedtuple
+from pathlib import Path
+
+import instrument
+from decomp import decode_character_data
+from instrument import detail, span
+from level_generator_final import SILHOUETTE_TABLE, TERRAIN_TABLE
+from rom_image import RomImage
+from symbols import resolve_address
+
+DATELINE_TABLE = 0x6712
+LD_HL = 0x21  # Z80 ld hl, nn
+
+# (label, address, entries) of the word tables that point at RLE blocks
+POINTER_TABLES = (
+    ("base_table", TERRAIN_TABLE, 6),
+    ("silhouette_table", SILHOUETTE_TABLE, 6),
+    ("dateline_images", DATELINE_TABLE, 3),
+)
+
+# ld hl, block instructions that hand a block straight to the unpacker
+CODE_POINTERS = (
+    ("dateline_bg_empty", 0x66C6),
+    ("score_status_lines", 0x896A),
+    ("title_screen", 0xAE70),
+    ("george_lizzie_ralf_image", 0xAEB7),
+)
+
+MAP_NAMES = {
+    0x81C6: "title_screen_81c6.bin",
+    0x8637: "ge-li-ra_select_screen.bin",
+    0x78A0: "road_strip_78A0.bin",
+    0x79C9: "road_with_water_gap_left_79c9.bin",
+    0x79AA: "road_with_water_gap_right_79aa.bin",
+    0x7C45: "silhouette1_7c45.bin",
+    0x79E8: "silhouette2_79e8.bin",
+    0x763E: "silhouette3_763e.bin",
+    0x7EE3: "silhouette4_7ee3.bin",
+    0x7F91: "silhouette5_7f91.bin",
+    0x78F7: "train_track_78f7.bin",
+    0x78FE: "water_piers1_78fe.bin",
+    0x7956: "water_piers2_7956.bin",
+    0x6DC7: "dateline.map",
+    0x6EE1: "dateline_george.map",
+    0x7038: "dateline_lizzie.map",
+    0x7189: "dateline_ralph.map",
+    0x7613: "score-area.bin",
+}
+
+Block = namedtuple("Block", "start end data refs overlaps")
+
+
+def block_pointers(rom, extra=()):
+    """(address, reference) for every pointer to an RLE block, in table order, then the extra offsets."""
+    pointers = []
+    for label, table, entries in POINTER_TABLES:
+        for i in range(entries):
+            if rom.contains(table + i * 2, 2):
+                pointers.append((rom.le16(table + i * 2), f"{label}+{i * 2:X}" if i else label))
+    for label, instruction in CODE_POINTERS:
+        if rom.contains(instruction, 3) and rom.u8(instruction) == LD_HL:
+            pointers.append((rom.le16(instruction + 1), f"ld hl @ ${instruction:04X}"))
+        else:
+            print(f"⚠️ No ld hl, {label} at ${instruction:04X}, skipping it")
+    pointers += [(address, "--offset") for address in extra]
+    return pointers
+
+
+def scan_blocks(cpu_data, extra=()):
+    """Decode every block the pointers reach, once each; returns Blocks sorted by start address."""
+    rom = RomImage.wrap(cpu_data)
+    refs = {}
+    for address, ref in block_pointers(rom, extra):
+        if not rom.contains(address, 1):
+            print(f"⚠️ {ref} points past the end of the ROM (${address:04X}), skipping it")
+            continue
+        refs.setdefault(address, []).append(ref)
+
+    blocks = []
+    for start in sorted(refs):
+        with span("rle_decode", offset=f"{start:04X}"):
+            data, end = decode_character_data(rom.view(start), start)
+        blocks.append(Block(start, end, data, refs[start], []))
+    for block in blocks:
+        block.overlaps.extend(other.start for other in blocks if other is not block and block.start < other.start < block.end)
+    return blocks
+
+
+def map_name(address):
+    return MAP_NAMES.get(address, f"block_{address:04X}.bin")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and decode every RLE block the Rampage code points at.")
+    parser.add_argument("cpu", help="cpu.bin")
+    parser.add_argument("output", nargs="?", help="folder to write the decoded maps to (default: only list them)")
+    parser.add_argument("--offset", action="append", default=[],
+                        help="also decode the block at this hex offset or game.bin.lst label (repeatable)")
+    args = parser.parse_args()
+
+    extra = [resolve_address(offset) for offset in args.offset]
+    with RomImage.open(args.cpu) as rom:
+        blocks = scan_blocks(rom, extra)
+
+    output = Path(args.output) if args.output else None
+    if output is not None:
+        output.mkdir(parents=True, exist_ok=True)
+    for block in blocks:
+        flags = ""
+        if len(block.refs) > 1:
+            flags += " 🔗 shared"
+        if block.overlaps:
+            flags += " ⚠️ overlaps " + ", ".join(f"${start:04X}" for start in block.overlaps)
+        detail(f"🧱 ${block.start:04X}-${block.end:04X} {block.end - block.start:4d} → {len(block.data):4d} bytes "
+               f"{map_name(block.start)} ← {', '.join(block.refs)}{flags}")
+        if output is not None:
+            with open(output / map_name(block.start), "wb") as f:
+                f.write(block.data)
+
+    packed = sum(block.end - block.start for block in blocks)
+    unpacked = sum(len(block.data) for block in blocks)
+    shared = sum(len(block.refs) > 1 for block in blocks)
+    print(f"✅ {len(blocks)} blocks ({shared} shared): {packed} compressed → {unpacked} decoded bytes"
+          + (f", written to {output}" if output is not None else ""))
+
+if __name__ == "__main__":
+    instrument.start()
+    main()
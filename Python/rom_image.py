@@ -0,0 +1,138 @@
+"""
+Read-only ROM image access
+==========================
+
+RomImage wraps a ROM file (or bytes already in memory) in a memoryview, so
+table lookups, RLE blocks and sprite entries are read in place instead of
+slicing copies off the image. Files are memory-mapped, so only the pages a
+script actually touches are read from disk.
+
+Reads are by address. The program ROM (cpu.bin) is the E000-byte image
+from game.bin.lst ("Base Address: 0000h Range: 0000h - E000h"), so for it
+an address is also the file offset:
+
+    with RomImage.open("cpu.bin") as rom:
+        level_table = rom.le16(0x8DAE)          # dw
+        entry = rom.sprite_entry(12)            # 6-byte entry at $290D + 12 * 6
+        block = rom.view(0x7613)                # zero-copy tail for the RLE decoder
+
+Any address outside the image raises IndexError. view() and slicing return
+memoryviews that stay valid until the image is closed.
+"""
+
+import mmap
+import struct
+from collections import namedtuple
+
+from instrument import span
+
+PROGRAM_BASE = 0x0000
+PROGRAM_SIZE = 0xE000  # cpu.bin / game.bin address space
+
+SPRITE_TABLE = 0x290D  # face_look_left: dx, dy, 4 sprite codes
+SPRITE_ENTRY_SIZE = 6
+
+SpriteEntry = namedtuple("SpriteEntry", "dx dy ids")
+
+_LE16 = struct.Struct("<H")
+
+
+class RomImage:
+    """A ROM image addressed from `base`, backed by bytes, a memoryview or an mmap."""
+
+    def __init__(self, data, base=PROGRAM_BASE, name="ROM"):
+        self._mmap = data if isinstance(data, mmap.mmap) else None
+        self.data = data.data if isinstance(data, RomImage) else memoryview(data).cast("B")
+        self.base = base
+        self.name = name
+
+    @classmethod
+    def open(cls, path, base=PROGRAM_BASE):
+        """Memory-map a ROM file read-only (empty files are read normally)."""
+        with span("rom_open", path=path), open(path, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                data = f.read()
+        return cls(data, base, str(path))
+
+    @classmethod
+    def wrap(cls, data, base=PROGRAM_BASE):
+        """Return data as a RomImage, without copying it."""
+        return data if isinstance(data, cls) else cls(data, base)
+
+    def close(self):
+        """Unmap the file. Arrays still built on the mapping keep it alive until they go."""
+        if self._mmap is not None:
+            try:
+                self.data.release()
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def end(self):
+        """First address past the image."""
+        return self.base + len(self.data)
+
+    def offset(self, address, size=1):
+        """File offset of `size` bytes at address, or IndexError if not all inside the image."""
+        offset = address - self.base
+        if offset < 0 or offset + size > len(self.data):
+            raise IndexError(f"{self.name}: ${address:04X}+{size} is outside ${self.base:04X}-${self.end:04X}")
+        return offset
+
+    def contains(self, address, size=1):
+        offset = address - self.base
+        return 0 <= offset and offset + size <= len(self.data)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.end)
+            start = max(start, self.base) - self.base
+            stop = max(stop, self.base) - self.base
+            return self.data[start:stop:step]
+        return self.data[self.offset(key)]
+
+    def view(self, address, length=None):
+        """Zero-copy memoryview from address to the end of the image (or `length` bytes)."""
+        if length is None:
+            return self.data[self.offset(address, 0):]
+        return self.data[self.offset(address, length):address - self.base + length]
+
+    def u8(self, address):
+        return self.data[self.offset(address)]
+
+    def s8(self, address):
+        """Signed byte, as used for the sprite dx/dy offsets."""
+        value = self.data[self.offset(address)]
+        return value - 256 if value > 127 else value
+
+    def le16(self, address):
+        return _LE16.unpack_from(self.data, self.offset(address, 2))[0]
+
+    def le16_table(self, address, count):
+        """`count` little-endian words (e.g. a pointer table) starting at address."""
+        return list(struct.unpack_from(f"<{count}H", self.data, self.offset(address, count * 2)))
+
+    def sprite_entry(self, index, table=SPRITE_TABLE):
+        """Entry `index` of a 6-byte sprite table: signed dx, dy and the 4 sprite codes."""
+        return self.sprite_entry_at(table + index * SPRITE_ENTRY_SIZE)
+
+    def sprite_entry_at(self, address):
+        offset = self.offset(address, SPRITE_ENTRY_SIZE)
+        return SpriteEntry(self.s8(address), self.s8(address + 1), list(self.data[offset + 2:offset + 6]))
+
+    def __reduce__(self):
+        # Sent to spawned worker processes as plain bytes (forked workers share the mapping)
+        return (RomImage, (self.data.tobytes(), self.base, self.name))
@@ -0,0 +1,218 @@
+"""
+ROM palette decoder
+===================
+
+The four colour sets the game loads into palette RAM are plain word tables
+in cpu.bin, one after the other, each 64 colours (4 tile palettes of 16):
+
+    bank 1  palette_data1  $113E  setup_palette1   game and attract screens  = palettes_1.pal, mame.pal 0-63
+    bank 2  palette_data2  $11BE  setup_palett2    service mode menu
+    bank 3  palette_data3  $123E  setup_palett3    news / dateline screens   = palettes_3.pal
+    bank 4  palette_data4  $12BE  setup_palett4    title screen              = palettes_2.pal
+
+set_palette copies each word to palette RAM the way MCR-3 takes a 9-bit
+colour: the second byte is written as the low 8 bits (RRBBBGGG, the low
+two red bits first) and a non-zero first byte puts it at the odd address,
+which sets the top red bit. Every channel is 3 bits, stretched to 8 like MAME
+does (0, 24, 49, ... FF). The 512 possible words are turned into RGB once,
+as a lookup table, and a bank is then a single index into it; all four
+banks are decoded in one go and kept per ROM, so asking again is free.
+
+The decoded banks come out in the layout of the .pal files (tile palette 3
+first, see tile_plot.py), so anything that reads a .pal also takes a bank
+of a ROM, written FILE@BANK:
+
+    tile_plot.py BG-REV.bin cpu.bin@4 MAPS/title_screen_81c6.bin PNG/Title_Screen.png
+    level_generator_final.py cpu.bin BG-REV.bin cpu.bin@all LEVELS/Game_level
+
+FILE@1,3 asks for several banks and FILE@all for every one; scripts that
+batch-render write one image (or set of images) per bank, with _bank1 ...
+_bank4 added to the output name.
+
+    python rom_palette.py cpu.bin                                # list the banks
+    python rom_palette.py cpu.bin --check mame.pal palettes_*.pal
+    python rom_palette.py cpu.bin --output PALETTES              # write bank1.pal ... bank4.pal
+"""
+
+import argparse
+import os
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import instrument
+from instrument import detail, span
+from rom_image import RomImage
+
+PALETTE_DATA = 0x113E  # palette_data1; palette_data2-4 follow it
+BANKS = 4
+BANK_COLOURS = 64
+BANK_BYTES = BANK_COLOURS * 2
+BANK_TABLES = ("palette_data1", "palette_data2", "palette_data3", "palette_data4")
+PALETTE_COLOURS = 16
+
+# pal3bit: 3-bit channel to 8 bits
+CHANNEL_LEVELS = np.array([(v << 5) | (v << 2) | (v >> 1) for v in range(8)], dtype=np.uint8)
+
+
+def _colour_lut():
+    """RGB for every 9-bit palette RAM value (top red bit, then RRBBBGGG)."""
+    value = np.arange(512)
+    red = (value >> 6) & 7
+    green = value & 7
+    blue = (value >> 3) & 7
+    return np.stack([CHANNEL_LEVELS[red], CHANNEL_LEVELS[green], CHANNEL_LEVELS[blue]], axis=1)
+
+
+COLOUR_LUT = _colour_lut()
+
+BANK_SPEC = re.compile(r"^(all|[1-9]\d*(?:,[1-9]\d*)*)$", re.IGNORECASE)
+
+_decoded = {}
+
+
+def decode_palettes(cpu_data):
+    """
+    Every palette bank in the ROM as a read-only (BANKS, 64, 3) RGB array.
+    Decoded once per distinct set of tables, however often it is asked for.
+    """
+    rom = RomImage.wrap(cpu_data)
+    raw = bytes(rom.view(PALETTE_DATA, BANKS * BANK_BYTES))
+    banks = _decoded.get(raw)
+    if banks is None:
+        with span("palette_decode"):
+            words = np.frombuffer(raw, dtype=np.uint8).reshape(BANKS, BANK_COLOURS, 2)
+            value = (words[..., 0] != 0).astype(np.uint16) << 8 | words[..., 1]
+            banks = COLOUR_LUT[value]
+            banks.flags.writeable = False
+        _decoded[raw] = banks
+    return banks
+
+
+def bank_label(bank):
+    return f"bank{bank}"
+
+
+def split_spec(name):
+    """(file, banks) for a palette argument: banks is None for a .pal file, else the 1-based banks FILE@... asks for."""
+    path, sep, banks = str(name).rpartition("@")
+    if not sep or not path or not BANK_SPEC.match(banks):
+        return str(name), None
+    if banks.lower() == "all":
+        return path, list(range(1, BANKS + 1))
+    numbers = [int(bank) for bank in banks.split(",")]
+    for bank in numbers:
+        if bank > BANKS:
+            raise ValueError(f"No palette bank {bank} (the ROM has {BANKS})")
+    return path, numbers
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def read_palettes(name, read=None):
+    """
+    [(label, palette bytes)] for a palette argument: a .pal file as it is
+    (label ""), or each ROM bank FILE@... names, decoded to the same 192-byte
+    layout (label "bank1" ...). read(path) gets a file's bytes.
+    """
+    read = read or _read_file
+    path, banks = split_spec(name)
+    if banks is None:
+        return [("", read(path))]
+    decoded = decode_palettes(read(path))
+    return [(bank_label(bank), decoded[bank - 1].tobytes()) for bank in banks]
+
+
+def read_palette(name, read=None):
+    """The bytes of the one palette a palette argument names."""
+    palettes = read_palettes(name, read)
+    if len(palettes) != 1:
+        raise ValueError(f"{name} names {len(palettes)} palette banks; only one can be used here")
+    return palettes[0][1]
+
+
+def palette_source(name):
+    """The file a palette argument reads (cpu.bin for cpu.bin@1)."""
+    return split_spec(name)[0]
+
+
+def labelled(path, label):
+    """path with _label added before its extension (or at the end of an output prefix)."""
+    if not label:
+        return path
+    stem, suffix = os.path.splitext(str(path))
+    return f"{stem}_{label}{suffix}"
+
+
+def compare(banks, pal_data):
+    """(bank, first colour, matching colours) of the 64-colour stretch of pal_data closest to a ROM bank."""
+    colours = np.frombuffer(pal_data, dtype=np.uint8, count=len(pal_data) // 3 * 3).reshape(-1, 3)
+    best = None
+    for start in range(0, len(colours) - BANK_COLOURS + 1, PALETTE_COLOURS):
+        window = colours[start:start + BANK_COLOURS]
+        matches = (window[None] == banks).all(axis=2).sum(axis=1)
+        bank = int(matches.argmax())
+        if best is None or matches[bank] > best[2]:
+            best = (bank + 1, start, int(matches[bank]))
+    return best
+
+
+def check_file(banks, path):
+    """Report which bank a .pal file holds; True when one matches it exactly."""
+    with open(path, "rb") as f:
+        pal_data = f.read()
+    found = compare(banks, pal_data)
+    if found is None:
+        print(f"⚠️ {path} has fewer than {BANK_COLOURS} colours")
+        return False
+    bank, start, matches = found
+    where = f"colours {start}-{start + BANK_COLOURS - 1}"
+    if matches == BANK_COLOURS:
+        print(f"✅ {path} {where} = bank {bank} ({BANK_TABLES[bank - 1]})")
+        return True
+    print(f"⚠️ {path} {where} is closest to bank {bank}: {matches} of {BANK_COLOURS} colours match")
+    window = np.frombuffer(pal_data, dtype=np.uint8, count=(start + BANK_COLOURS) * 3).reshape(-1, 3)[start:]
+    for i in np.flatnonzero((window != banks[bank - 1]).any(axis=1)):
+        detail(f"  colour {start + i}: file {bytes(window[i]).hex()} ROM {bytes(banks[bank - 1][i]).hex()}")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode the Rampage palette banks straight from the ROM.")
+    parser.add_argument("cpu", help="cpu.bin")
+    parser.add_argument("--check", nargs="+", default=[], metavar="PAL",
+                        help="compare .pal files (mame.pal, palettes_N.pal) with the decoded banks")
+    parser.add_argument("--output", default=None, help="write each bank as a .pal file into this folder")
+    args = parser.parse_args()
+
+    with RomImage.open(args.cpu) as rom:
+        banks = decode_palettes(rom).copy()
+
+    for bank, colours in enumerate(banks, 1):
+        detail(f"🎨 Bank {bank} {BANK_TABLES[bank - 1]} ${PALETTE_DATA + (bank - 1) * BANK_BYTES:04X}: "
+               + " | ".join(" ".join(bytes(c).hex() for c in colours[i:i + PALETTE_COLOURS])
+                            for i in range(0, BANK_COLOURS, PALETTE_COLOURS)))
+
+    if args.output:
+        output = Path(args.output)
+        output.mkdir(parents=True, exist_ok=True)
+        for bank, colours in enumerate(banks, 1):
+            with open(output / f"{bank_label(bank)}.pal", "wb") as f:
+                f.write(colours.tobytes())
+        print(f"💾 Wrote {BANKS} palette banks to {output}")
+
+    matched = sum(check_file(banks, path) for path in args.check)
+    if args.check:
+        print(f"{'✅' if matched == len(args.check) else '⚠️'} {matched} of {len(args.check)} palette files match a ROM bank")
+    else:
+        print(f"✅ Decoded {BANKS} palette banks of {BANK_COLOURS} colours from {args.cpu}")
+    return 0 if matched == len(args.check) else 1
+
+if __name__ == "__main__":
+    instrument.start()
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Shared 32x32 sprite decoder for the Rampage sprite tools
+========================================================
+
+sprites.bin holds 4bpp 32x32 sprites, 512 bytes each, 16 bytes per row,
+high nybble first. SpriteSheet unpacks the whole file once into an array of
+colour indices:
+
+    sheet.pixels[sprite_id, y, x]       (N, 32, 32), values 0-15
+
+Coloured tiles are RGBA arrays with colour 0 fully transparent. They are kept
+in an LRU keyed by (sprite id, flip, palette), so the same head or body sprite
+used by many columns and variants (+$000 / +$100 / +$180) is only coloured
+once per palette. block() puts four cached tiles together into the 64x64
+2x2 sprite blocks the game builds its characters from:
+
+    sheet = SpriteSheet(sprite_data)
+    img = sheet.block([53, 54, 55, 56], [False] * 4, palette)   # TL, TR, BL, BR
+
+Sprite ids past the end of the file give a blank (transparent) tile.
+A sheet can be shared by threads (the render server's request threads):
+the LRU and the counts are only touched under a lock, and tiles are
+coloured outside it.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from instrument import tally
+
+SPRITE_BYTES = 512
+SPRITE_SIZE = 32
+BLOCK_SIZE = 64
+BLOCK_POSITIONS = [(0, 0), (32, 0), (0, 32), (32, 32)]  # TL, TR, BL, BR
+CACHE_SIZE = 1024
+
+
+def decode_sprites(sprite_data):
+    """Unpack 4bpp sprite data into an (N, 32, 32) uint8 array of colour indices."""
+    count = len(sprite_data) // SPRITE_BYTES
+    raw = np.frombuffer(sprite_data, dtype=np.uint8, count=count * SPRITE_BYTES)
+    pixels = np.empty((raw.size, 2), dtype=np.uint8)
+    pixels[:, 0] = raw >> 4
+    pixels[:, 1] = raw & 0x0F
+    return pixels.reshape(count, SPRITE_SIZE, SPRITE_SIZE)
+
+
+def rgba_lut(palette):
+    """(16, 4) RGBA table from 16 (r, g, b) colours; colour 0 is transparent."""
+    lut = np.zeros((16, 4), dtype=np.uint8)
+    lut[1:, :3] = np.asarray(palette[1:16], dtype=np.uint8).reshape(15, 3)
+    lut[1:, 3] = 255
+    return lut
+
+
+class SpriteSheet:
+    """Decoded sprites.bin plus an LRU of coloured RGBA tiles."""
+
+    def __init__(self, sprite_data, cache_size=CACHE_SIZE):
+        self.pixels = decode_sprites(sprite_data)
+        self.cache_size = cache_size
+        self.tiles = OrderedDict()
+        self.luts = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def wrap(cls, sprites):
+        """Return sprites as a SpriteSheet, decoding raw sprite data if needed."""
+        return sprites if isinstance(sprites, cls) else cls(sprites)
+
+    def __len__(self):
+        return len(self.pixels)
+
+    def _lut(self, key):
+        lut = self.luts.get(key)
+        if lut is None:
+            lut = self.luts[key] = rgba_lut(key)
+        return lut
+
+    def tile(self, sprite_id, flip_x=False, palette=None):
+        """(32, 32, 4) RGBA array for a sprite, optionally mirrored left to right."""
+        key = (sprite_id, flip_x, tuple(tuple(c) for c in palette[:16]))
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.hits += 1
+                self.tiles.move_to_end(key)
+            else:
+                self.misses += 1
+        if tile is not None:
+            tally("sprite_cache_hits")
+            return tile
+
+        tally("sprite_cache_misses")
+        if 0 <= sprite_id < len(self.pixels):
+            indices = self.pixels[sprite_id, :, ::-1] if flip_x else self.pixels[sprite_id]
+            tile = self._lut(key[2])[indices]
+        else:
+            tile = np.zeros((SPRITE_SIZE, SPRITE_SIZE, 4), dtype=np.uint8)
+        tile.flags.writeable = False
+
+        with self.lock:
+            self.tiles[key] = tile
+            if len(self.tiles) > self.cache_size:
+                self.tiles.popitem(last=False)
+        return tile
+
+    def tile_image(self, sprite_id, flip_x=False, palette=None):
+        return Image.fromarray(self.tile(sprite_id, flip_x, palette), "RGBA")
+
+    def block(self, ids, flip_flags, palette):
+        """64x64 RGBA image of four sprites laid out TL, TR, BL, BR."""
+        block = np.zeros((BLOCK_SIZE, BLOCK_SIZE, 4), dtype=np.uint8)
+        for sid, (x, y), flip in zip(ids, BLOCK_POSITIONS, flip_flags):
+            block[y:y + SPRITE_SIZE, x:x + SPRITE_SIZE] = self.tile(sid, flip, palette)
+        return Image.fromarray(block, "RGBA")
+
+    def report(self):
+        return f"🗃️ Sprite cache: {self.hits} hits, {self.misses} misses, {len(self.tiles)} tiles"
@@ -0,0 +1,306 @@
+"""
+Symbol and xref index for game.bin.lst
+======================================
+
+game.bin.lst is the IDA listing of the program ROM. Grepping 1.5 MB of it
+for every address is slow, so this parses it once into a SQLite file next
+to it (game.bin.lst.sqlite) holding
+
+    labels    name -> address                       level_data_table -> $8DAE
+    comments  address -> comment text
+    spans     data directives (db / dw / ds / .ascii) merged per label, start -> end
+    xrefs     target address <- referencing address  "8923↑o", "table8928_04↓o"
+
+The index is rebuilt when the listing changes: a different size or
+modification time makes it re-hash the listing, and only a different hash
+makes it re-parse.
+
+Scripts that take a hex offset also take a symbol through resolve_address():
+
+    resolve_address("95B6")                        -> 0x95B6  (hex as before)
+    resolve_address("level_data_table")            -> 0x8DAE
+    resolve_address("building_characters_table+2") -> 0x95B6
+
+Usage:
+    python symbols.py silhouette_table             # address, comment, span, xrefs
+    python symbols.py 8928 --xrefs
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+import instrument
+
+INDEX_VERSION = 1
+LISTING_NAME = "game.bin.lst"
+
+_LINE = re.compile(r"^([0-9A-F]{4,5})(?: (.*))?$")
+_LABEL = re.compile(r"^ ?([A-Za-z_.$@?][\w.$@?]*):")
+_DIRECTIVE = re.compile(r"^\s*(db|dw|dd|ds|\.ascii)\b")
+_XREF = re.compile(r"([A-Za-z_][\w]*|[0-9A-F]{4,5})(?:\+([0-9A-F]+)h?)?([↑↓])([a-z])")
+_HEX = re.compile(r"^(?:0x|\$)?([0-9A-Fa-f]+)h?$")
+_EXPR = re.compile(r"^([A-Za-z_.$@?][\w.$@?]*)\s*([+-])\s*(\S+)$")
+
+
+def _split_comment(text):
+    """(code, comment) split at the first ';' outside a quoted string."""
+    quote = None
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == ";":
+            return text[:i], text[i + 1:].strip()
+    return text, ""
+
+
+def parse_listing(lines):
+    """
+    Parse listing lines into (labels, comments, spans, xrefs):
+    labels {name: address}, comments {address: text}, spans [(start, end, kind, label)],
+    xrefs [(target, source, offset, direction, kind)] with source a label or hex address.
+    """
+    labels = {}
+    comments = {}
+    data_lines = []  # (address, kind, label, starts a label)
+    xrefs = []
+    addresses = []
+    current_label = None
+
+    for line in lines:
+        m = _LINE.match(line.rstrip("\r\n"))
+        if not m:
+            continue
+        address = int(m.group(1), 16)
+        code, comment = _split_comment(m.group(2) or "")
+        if not addresses or addresses[-1] != address:
+            addresses.append(address)
+
+        label = _LABEL.match(code)
+        if label:
+            current_label = label.group(1)
+            labels.setdefault(current_label, address)
+            code = code[label.end():]
+
+        directive = _DIRECTIVE.match(code)
+        if directive:
+            data_lines.append((address, directive.group(1), current_label, bool(label)))
+
+        if comment:
+            comments[address] = comments[address] + "\n" + comment if address in comments else comment
+            for source, offset, direction, kind in _XREF.findall(comment):
+                xrefs.append((address, source, int(offset, 16) if offset else 0, direction, kind))
+
+    # A data line runs up to the next address in the listing; consecutive
+    # lines of one directive under one label make a single span
+    next_address = {a: b for a, b in zip(addresses, addresses[1:])}
+    spans = []
+    for address, kind, label, starts in data_lines:
+        end = next_address.get(address, address)
+        if spans and not starts and spans[-1][2] == kind and spans[-1][3] == label and spans[-1][1] == address:
+            spans[-1][1] = end
+        else:
+            spans.append([address, end, kind, label])
+    return labels, comments, [tuple(span) for span in spans], xrefs
+
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SymbolIndex:
+    """Persistent label / comment / span / xref index of an IDA listing."""
+
+    def __init__(self, listing, db_path=None):
+        self.listing = Path(listing)
+        self.db_path = Path(db_path) if db_path is not None else self.listing.with_name(self.listing.name + ".sqlite")
+        self.db = sqlite3.connect(str(self.db_path))
+        self.rebuilt = False
+        self._refresh()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _meta(self):
+        try:
+            return dict(self.db.execute("SELECT key, value FROM meta"))
+        except sqlite3.DatabaseError:
+            return {}
+
+    def _refresh(self):
+        st = os.stat(self.listing)
+        stamp = {"version": str(INDEX_VERSION), "size": str(st.st_size), "mtime": str(st.st_mtime_ns)}
+        meta = self._meta()
+        if all(meta.get(k) == v for k, v in stamp.items()):
+            return
+        digest = _file_hash(self.listing)
+        if meta.get("version") == stamp["version"] and meta.get("sha1") == digest:
+            # Touched but not changed: just remember the new modification time
+            with self.db:
+                self.db.executemany("REPLACE INTO meta VALUES (?, ?)", stamp.items())
+            return
+        self._build(dict(stamp, sha1=digest))
+
+    def _build(self, meta):
+        with open(self.listing, "r", encoding="utf-8", errors="replace") as f:
+            labels, comments, spans, xrefs = parse_listing(f)
+
+        def source_address(source, offset):
+            if source in labels:
+                return labels[source] + offset
+            if re.fullmatch(r"[0-9A-F]{4,5}", source):
+                return int(source, 16) + offset
+            return None
+
+        with self.db:
+            for table in ("meta", "labels", "comments", "spans", "xrefs"):
+                self.db.execute(f"DROP TABLE IF EXISTS {table}")
+            self.db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.db.execute("CREATE TABLE labels (name TEXT PRIMARY KEY, address INTEGER)")
+            self.db.execute("CREATE TABLE comments (address INTEGER PRIMARY KEY, text TEXT)")
+            self.db.execute("CREATE TABLE spans (start INTEGER, end INTEGER, kind TEXT, label TEXT)")
+            self.db.execute("CREATE TABLE xrefs (target INTEGER, source TEXT, source_address INTEGER, direction TEXT, kind TEXT)")
+            self.db.execute("CREATE INDEX labels_address ON labels (address)")
+            self.db.execute("CREATE INDEX spans_start ON spans (start)")
+            self.db.execute("CREATE INDEX xrefs_target ON xrefs (target)")
+            self.db.execute("CREATE INDEX xrefs_source ON xrefs (source_address)")
+            self.db.executemany("INSERT INTO labels VALUES (?, ?)", labels.items())
+            self.db.executemany("INSERT INTO comments VALUES (?, ?)", comments.items())
+            self.db.executemany("INSERT INTO spans VALUES (?, ?, ?, ?)", spans)
+            self.db.executemany("INSERT INTO xrefs VALUES (?, ?, ?, ?, ?)",
+                                ((target, source + (f"+{offset:X}" if offset else ""), source_address(source, offset),
+                                  direction, kind) for target, source, offset, direction, kind in xrefs))
+            self.db.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+        self.rebuilt = True
+
+    def address(self, name):
+        row = self.db.execute("SELECT address FROM labels WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown symbol {name!r} in {self.listing}")
+        return row[0]
+
+    def resolve(self, text):
+        """Address for a hex value, a label, or label+N / label-N (N decimal, 0x.. or ..h)."""
+        text = text.strip()
+        if _HEX.match(text) and not self._has_label(text):
+            return int(_HEX.match(text).group(1), 16)
+        m = _EXPR.match(text)
+        if m and not self._has_label(text):
+            offset = m.group(3)
+            offset = int(offset[:-1], 16) if offset.lower().endswith("h") else int(offset, 0)
+            return self.address(m.group(1)) + (offset if m.group(2) == "+" else -offset)
+        return self.address(text)
+
+    def _has_label(self, name):
+        return self.db.execute("SELECT 1 FROM labels WHERE name = ?", (name,)).fetchone() is not None
+
+    def labels_at(self, address):
+        return [row[0] for row in self.db.execute("SELECT name FROM labels WHERE address = ? ORDER BY name", (address,))]
+
+    def comment(self, address):
+        row = self.db.execute("SELECT text FROM comments WHERE address = ?", (address,)).fetchone()
+        return row[0] if row else ""
+
+    def span_at(self, address):
+        """(start, end, kind, label) of the data directive span holding address, or None."""
+        return self.db.execute("SELECT start, end, kind, label FROM spans WHERE start <= ? AND ? < end "
+                               "ORDER BY start DESC LIMIT 1", (address, address)).fetchone()
+
+    def xrefs_to(self, address):
+        """[(source, source_address, direction, kind)] of the references listed at address."""
+        return self.db.execute("SELECT source, source_address, direction, kind FROM xrefs WHERE target = ? "
+                               "ORDER BY rowid", (address,)).fetchall()
+
+    def xrefs_from(self, address):
+        """[target addresses] listing address as a reference."""
+        return [row[0] for row in self.db.execute("SELECT DISTINCT target FROM xrefs WHERE source_address = ? "
+                                                  "ORDER BY target", (address,))]
+
+
+def find_listing():
+    """game.bin.lst in the current folder, else next to the Python folder."""
+    for folder in (Path.cwd(), Path(__file__).resolve().parent.parent):
+        if (folder / LISTING_NAME).exists():
+            return folder / LISTING_NAME
+    return None
+
+
+_index = None
+
+def symbol_index(listing=None):
+    global _index
+    if listing is None and _index is not None:
+        return _index
+    path = listing if listing is not None else find_listing()
+    if path is None:
+        raise FileNotFoundError(f"{LISTING_NAME} not found, needed to resolve symbol names")
+    index = SymbolIndex(path)
+    if listing is None:
+        _index = index
+    return index
+
+
+def resolve_address(text, listing=None):
+    """
+    Hex offset as the scripts always took it ("95B6", "0x95B6", "$95B6"), or a
+    symbol from game.bin.lst such as level_data_table or silhouette_table+2.
+    Plain hex never touches the listing.
+    """
+    if isinstance(text, int):
+        return text
+    m = _HEX.match(text.strip())
+    if m:
+        return int(m.group(1), 16)
+    return symbol_index(listing).resolve(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up game.bin.lst symbols, comments and xrefs.")
+    parser.add_argument("symbol", help="label, label+N or hex address")
+    parser.add_argument("--listing", default=None, help=f"listing file (default: {LISTING_NAME})")
+    parser.add_argument("--xrefs", action="store_true", help="list every reference to the address")
+    args = parser.parse_args()
+
+    index = symbol_index(args.listing)
+    if index.rebuilt:
+        print(f"🗂️ Indexed {index.listing} into {index.db_path}")
+    try:
+        address = index.resolve(args.symbol)
+    except (KeyError, ValueError) as e:
+        raise SystemExit(f"Error: {e.args[0]}")
+
+    names = index.labels_at(address)
+    print(f"📍 ${address:04X} {', '.join(names)}")
+    span = index.span_at(address)
+    if span:
+        start, end, kind, label = span
+        print(f"  {kind} ${start:04X}-${end - 1:04X} ({end - start} bytes) under {label}")
+    comment = index.comment(address)
+    if comment:
+        print("  ; " + comment.replace("\n", "\n  ; "))
+    refs = index.xrefs_to(address)
+    print(f"  {len(refs)} xrefs")
+    if args.xrefs:
+        for source, source_address, direction, kind in refs:
+            where = f"${source_address:04X}" if source_address is not None else "?"
+            print(f"    {source}{direction}{kind}  {where}")
+
+if __name__ == "__main__":
+    instrument.start()
+    main()
@@ -0,0 +1,170 @@
+import numpy as np
+from PIL import Image
+
+from instrument import span, tally
+
+"""
+Shared 4bpp 8x8 character decoder for the Rampage plotters
+==========================================================
+
+The whole character set (BG-REV.bin, 32 bytes per tile, 2 pixels per byte,
+high nybble first) is unpacked in one go into an atlas of shape
+(4, N + 1, 8, 8), holding the colour index (0-15) of every pixel:
+
+    atlas[flip, code, y, x]     flip = xflip | (yflip << 1)
+
+    flip 0 = as stored, 1 = X-flip, 2 = Y-flip, 3 = XY-flip
+
+The extra tile at index N is blank and stands in for any code that is past
+the end of the character ROM.
+
+Plotters then build whole images by indexing into the atlas with arrays of
+tile words instead of calling get_pixel() 64 times per character. Images
+stay as planes of palette indices (palette * 16 + colour) until the end,
+where they are either expanded through an RGB lookup table (to_rgb) or
+written as an indexed PNG with a 64-entry palette (to_indexed).
+"""
+
+TILE_BYTES = 32
+TILE_SIZE = 8
+MISSING_COLOUR = (255, 0, 255)
+
+
+def decode_characters(char_data):
+    """Unpack 4bpp character data into an (N, 8, 8) uint8 array of colour indices."""
+    count = len(char_data) // TILE_BYTES
+    raw = np.frombuffer(char_data, dtype=np.uint8, count=count * TILE_BYTES)
+    pixels = np.empty((raw.size, 2), dtype=np.uint8)
+    pixels[:, 0] = raw >> 4
+    pixels[:, 1] = raw & 0x0F
+    return pixels.reshape(count, TILE_SIZE, TILE_SIZE)
+
+
+def load_atlas(char_data):
+    """Decode the character set and precompute the X, Y and XY flipped variants."""
+    with span("decode_characters"):
+        tiles = decode_characters(char_data)
+        tiles = np.concatenate([tiles, np.zeros((1, TILE_SIZE, TILE_SIZE), dtype=np.uint8)])
+        return np.stack([
+            tiles,
+            tiles[:, :, ::-1],
+            tiles[:, ::-1, :],
+            tiles[:, ::-1, ::-1],
+        ])
+
+
+def atlas_count(atlas):
+    """Number of real characters in the atlas (not counting the blank tile)."""
+    return atlas.shape[1] - 1
+
+
+def words_from_bytes(data):
+    """Little-endian tile words from map bytes (a trailing odd byte is ignored)."""
+    return np.frombuffer(data, dtype="<u2", count=len(data) // 2).astype(np.uint16)
+
+
+def parse_tile_words(words):
+    """Vectorised parse_tile_entry(): returns (code, flip, palette) arrays."""
+    words = np.asarray(words, dtype=np.uint16)
+    code = (words & 0x03FF) | ((words >> 4) & 0x0400)
+    flip = (words >> 10) & 0x03
+    palette = 3 - ((words >> 12) & 0x03)  # REVERSED as the palettes are reversed in storage.
+    return code, flip, palette
+
+
+def tile_layer(atlas, words, width, palette=None):
+    """
+    Build a layer from a row-major array of tile words, `width` tiles across.
+
+    Returns (indices, mask), both of shape (rows * 8, width * 8). indices holds
+    palette * 16 + colour for every pixel; mask is False where the tile code
+    was past the end of the character ROM (those tiles are drawn blank) and
+    over the padding of a short last row.
+    If palette is given it overrides the palette bits of every word.
+    """
+    words = np.asarray(words, dtype=np.uint16)
+    count = atlas_count(atlas)
+    tally("tiles_plotted", words.size)
+
+    code, flip, pal = parse_tile_words(words)
+    valid = code < count
+    code = np.where(valid, code, count)
+    if palette is not None:
+        pal = np.full_like(pal, palette)
+
+    tiles = atlas[flip, code] + (pal.astype(np.uint8) * 16)[:, None, None]
+
+    indices = tile_grid(tiles, width)
+    mask = np.repeat(np.repeat(tile_grid(valid, width), TILE_SIZE, axis=0), TILE_SIZE, axis=1)
+    return indices, mask
+
+
+def tile_grid(tiles, width):
+    """
+    Lay out a run of tiles row-major, `width` tiles across, zero padding the last row.
+    An (K, 8, 8) array gives an image; a flat (K,) array gives a (rows, width) cell grid.
+    """
+    tiles = np.asarray(tiles)
+    rows = (len(tiles) + width - 1) // width
+    pad = rows * width - len(tiles)
+    if pad:
+        tiles = np.concatenate([tiles, np.zeros((pad,) + tiles.shape[1:], dtype=tiles.dtype)])
+    if tiles.ndim == 1:
+        return tiles.reshape(rows, width)
+    size = tiles.shape[1]
+    return tiles.reshape(rows, width, size, size).swapaxes(1, 2).reshape(rows * size, width * size)
+
+
+def blit(canvas, indices, mask, x, y, offset=0):
+    """
+    Copy the masked pixels of a layer onto canvas at (x, y), clipped to the canvas.
+    offset is added to every index on the way, e.g. palette * 16 for a colour-only layer.
+    """
+    h, w = indices.shape
+    ch, cw = canvas.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, cw), min(y + h, ch)
+    if x0 >= x1 or y0 >= y1:
+        return
+    src = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+    dst = canvas[y0:y1, x0:x1]
+    src_indices = indices[src] + np.uint8(offset) if offset else indices[src]
+    np.copyto(dst, src_indices, where=mask[src])
+
+
+def palette_lut(pal_data, size=256, fill=MISSING_COLOUR):
+    """RGB lookup table (size, 3) from raw palette bytes, padded with `fill`."""
+    count = min(len(pal_data) // 3, size)
+    lut = np.empty((size, 3), dtype=np.uint8)
+    lut[:] = fill
+    lut[:count] = np.frombuffer(pal_data, dtype=np.uint8, count=count * 3).reshape(count, 3)
+    return lut
+
+
+def to_rgb(indices, lut):
+    """Apply an RGB lookup table to an index plane, giving an (h, w, 3) array."""
+    return lut[indices]
+
+
+def to_indexed(indices, lut, colours=64, background=None):
+    """
+    Mode "P" image straight from an index plane, with the first `colours`
+    entries of lut as its PNG palette. Pixels equal to `background` (nothing
+    drawn there) become black: they reuse a black palette entry when there is
+    one, otherwise one extra entry is added for them.
+    """
+    palette = lut[:colours]
+    if background is not None:
+        unpainted = indices == background
+        if unpainted.any():
+            black = np.flatnonzero((palette == 0).all(axis=1))
+            if len(black):
+                slot = black[0]
+            else:
+                slot = len(palette)
+                palette = np.concatenate([palette, np.zeros((1, 3), dtype=np.uint8)])
+            indices = np.where(unpainted, slot, indices).astype(np.uint8)
+    h, w = indices.shape
+    img = Image.frombytes("P", (w, h), np.ascontiguousarray(indices, dtype=np.uint8).tobytes())
+    img.putpalette(palette.tobytes())
+    return img
@@ -0,0 +1,309 @@
+"""
+Tile deduplication and usage index for the character ROM
+========================================================
+
+BG-REV.bin holds 2048 8x8 characters, and many of them are exact copies or
+X/Y-flipped copies of another character. Every tile is keyed by its 64
+pixels in all 4 flip orientations, which gives three tables:
+
+    exact[c]        lowest code with the same pixels as c
+    canonical[c]    lowest code that is c under some flip
+    flip[c]         the flip that turns canonical[c] into c,
+                    i.e. atlas[flip[c], canonical[c]] == atlas[0, c]
+
+Since flips compose by XOR, a tile word can be rewritten to use the
+canonical character (collapse()) and still draw the same pixels, so a
+renderer only ever needs the canonical tiles.
+
+The usage index records which tile words every source uses:
+
+    sky         the $7613 top strip
+    terrain     the 6 terrain strips ($8928 table)
+    silhouette  the background silhouettes ($8934 table)
+    foliage     the foliage strips ($95AA table)
+    building    every building in the $95B6 table
+    map         RLE screens and raw maps (--map, or the decomp/savebit jobs of a manifest)
+
+and which sources every level is drawn from, so any character can be traced
+back to the maps, buildings and levels that use it:
+
+    python tile_index.py cpu.bin BG-REV.bin --manifest ../convert_data.json
+    python tile_index.py cpu.bin BG-REV.bin --tile 1A3 --json tiles.json
+
+Codes are printed in hex, levels 1-based as in the level PNG names.
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+import instrument
+from building_plot_multi import building_words
+from decomp import decode_character_data
+from instrument import span
+from level_catalogue import reverse_index
+from level_generator_final import (SILHOUETTE_TABLE, TERRAIN_TABLE, TOP_STRIP_OFFSET, building_offset,
+                                   count_levels, foliage_strip, get_level_buildings)
+from rom_image import RomImage
+from symbols import resolve_address
+from tile_atlas import TILE_SIZE, atlas_count, load_atlas, parse_tile_words, words_from_bytes
+
+BUILDING_COUNT = 45
+TERRAIN_INDICES = range(0, 12, 2)
+SILHOUETTE_INDICES = range(0, 12, 2)
+FOLIAGE_INDICES = (0, 2, 4, 6, 8)
+
+
+def flip_tables(atlas):
+    """(exact, canonical, flip) arrays for the characters of an atlas (see the module docstring)."""
+    count = atlas_count(atlas)
+    pixels = np.ascontiguousarray(atlas[:, :count]).reshape(4 * count, TILE_SIZE * TILE_SIZE)
+    # One id per distinct 8x8 pixel pattern, over all 4 orientations of every tile
+    ids = np.unique(pixels, axis=0, return_inverse=True)[1].reshape(4, count)
+
+    _, first, inverse = np.unique(ids[0], return_index=True, return_inverse=True)
+    exact = first[inverse]
+
+    _, first, inverse = np.unique(ids.min(axis=0), return_index=True, return_inverse=True)
+    canonical = first[inverse]
+
+    flip = np.zeros(count, dtype=np.uint8)
+    for orientation in (3, 2, 1, 0):  # lowest matching flip wins for symmetric tiles
+        flip[ids[orientation, canonical] == ids[0]] = orientation
+    return exact.astype(np.uint16), canonical.astype(np.uint16), flip
+
+
+def collapse_words(words, canonical, flip):
+    """Rewrite tile words to draw the canonical characters; palette and other bits are kept."""
+    words = np.asarray(words, dtype=np.uint16)
+    code, word_flip, _ = parse_tile_words(words)
+    known = code < len(canonical)
+    safe = np.where(known, code, 0)
+    new_code = np.where(known, canonical[safe], code).astype(np.uint16)
+    new_flip = np.where(known, word_flip ^ flip[safe], word_flip).astype(np.uint16)
+    kept = words & np.uint16(0xB000)  # palette bits and bit 15
+    return kept | (new_code & 0x03FF) | ((new_code & 0x0400) << 4) | (new_flip << 10)
+
+
+class TileIndex:
+    """Flip-equivalence tables for a character set and the tile words every source uses."""
+
+    def __init__(self, atlas):
+        self.count = atlas_count(atlas)
+        self.exact, self.canonical, self.flip = flip_tables(atlas)
+        self.sources = []      # (kind, name, ROM address or None)
+        self.levels = []       # per level: sorted source numbers
+        self._words = []       # per source: (unique words, counts)
+        self._keys = {}
+
+    def add_source(self, kind, name, words, address=None):
+        """Record the tile words one strip, silhouette, building or map uses; returns its source number."""
+        key = (kind, address) if address is not None else None
+        if key in self._keys:
+            source = self._keys[key]
+            old_kind, old_name, _ = self.sources[source]
+            self.sources[source] = (old_kind, f"{old_name}/{name}", address)  # e.g. shared silhouettes
+            return source
+        self.sources.append((kind, name, address))
+        self._words.append(np.unique(np.asarray(words, dtype=np.uint16), return_counts=True))
+        if key is not None:
+            self._keys[key] = len(self.sources) - 1
+        return len(self.sources) - 1
+
+    def add_block(self, rom, kind, name, address):
+        words = words_from_bytes(decode_character_data(rom.view(address), address)[0])
+        return self.add_source(kind, name, words, address)
+
+    def add_rom(self, cpu_data, building_count=BUILDING_COUNT):
+        """Every level layer and building in cpu.bin, and which of them each level uses."""
+        rom = RomImage.wrap(cpu_data)
+        sky = self.add_block(rom, "sky", "top strip", TOP_STRIP_OFFSET)
+        terrain = {index: self.add_block(rom, "terrain", f"{index:02X}", rom.le16(TERRAIN_TABLE + index))
+                   for index in TERRAIN_INDICES}
+        silhouettes = {index: self.add_block(rom, "silhouette", f"{index:02X}", rom.le16(SILHOUETTE_TABLE + index))
+                       for index in SILHOUETTE_INDICES}
+        foliage = {}
+        for index in FOLIAGE_INDICES:
+            address, rows, _ = foliage_strip(rom, index)
+            words = np.frombuffer(rom.view(address, rows * 64), dtype="<u2")
+            foliage[index] = self.add_source("foliage", str(index), words, address)
+        buildings = {}
+        for building_id in range(1, building_count + 1):
+            address = building_offset(rom, building_id)
+            if not rom.contains(address, 3):
+                continue
+            width, height, high_byte = rom.u8(address), rom.u8(address + 1), rom.u8(address + 2)
+            if not rom.contains(address, 3 + width * height * (2 if high_byte == 0xFF else 1)):
+                continue
+            words = building_words(rom.view(address))[2]
+            buildings[building_id] = self.add_source("building", f"{building_id:02d}", words, address)
+
+        for level in range(count_levels(rom)):
+            background_number, terrain_byte, foliage_index, level_buildings = get_level_buildings(rom, level)
+            used = {sky}
+            if terrain_byte in terrain:
+                used.add(terrain[terrain_byte])
+            if level_buildings:
+                index = background_number & 0x0F
+                if index not in silhouettes:
+                    silhouettes[index] = self.add_block(rom, "silhouette", f"{index:02X}",
+                                                        rom.le16(SILHOUETTE_TABLE + index))
+                used.add(silhouettes[index])
+            if foliage_index in foliage:
+                used.add(foliage[foliage_index])
+            used.update(buildings[building_id] for building_id, _, _ in level_buildings if building_id in buildings)
+            self.levels.append(sorted(used))
+
+    def add_manifest_maps(self, cpu_data, manifest):
+        """The RLE screens (decomp jobs) and raw maps (savebit jobs) of a pipeline manifest."""
+        rom = RomImage.wrap(cpu_data)
+        for job in manifest.get("jobs", []):
+            name = job.get("output", "").rsplit("/", 1)[-1].rsplit(".", 1)[0]
+            if job["job"] == "decomp":
+                self.add_block(rom, "map", name, resolve_address(job["offset"]))
+            elif job["job"] == "savebit":
+                start, end = resolve_address(job["start"]), resolve_address(job["end"])
+                self.add_source("map", name, words_from_bytes(rom.view(start, end - start + 1)), start)
+
+    def usage(self):
+        """Columnar usage index: one row per (source, tile word) with how often the source uses it."""
+        sources = [np.full(len(words), source, dtype=np.uint16) for source, (words, _) in enumerate(self._words)]
+        words = np.concatenate([words for words, _ in self._words] or [np.zeros(0, np.uint16)])
+        code, flip, palette = parse_tile_words(words)
+        return {
+            "source": np.concatenate(sources or [np.zeros(0, np.uint16)]),
+            "word": words,
+            "code": code,
+            "flip": flip.astype(np.uint8),
+            "palette": palette.astype(np.uint8),
+            "count": np.concatenate([counts for _, counts in self._words] or [np.zeros(0, np.int64)]),
+        }
+
+    def level_index(self, usage=None):
+        """CSR index code → levels using it (see level_catalogue.reverse_index)."""
+        usage = self.usage() if usage is None else usage
+        codes, levels = [], []
+        for level, sources in enumerate(self.levels):
+            used = np.unique(usage["code"][np.isin(usage["source"], sources)])
+            codes.append(used)
+            levels.append(np.full(len(used), level))
+        if not codes:
+            return np.zeros(0, np.int32), np.zeros(1, np.uint32), np.zeros(0, np.uint8)
+        return reverse_index(np.concatenate(codes), np.concatenate(levels))
+
+    def users(self, code, usage=None):
+        """(sources, levels) using a character code: source numbers and 0-based levels."""
+        usage = self.usage() if usage is None else usage
+        sources = np.unique(usage["source"][usage["code"] == code]).tolist()
+        levels = [level for level, used in enumerate(self.levels) if set(used) & set(sources)]
+        return sources, levels
+
+    def collapse(self, words):
+        """Tile words rewritten to use canonical characters only (they draw the same pixels)."""
+        return collapse_words(words, self.canonical, self.flip)
+
+    def summary(self, usage=None):
+        """Counts for the report: distinct tiles, referenced characters and what collapsing saves."""
+        usage = self.usage() if usage is None else usage
+        referenced = np.unique(usage["code"])
+        known = referenced[referenced < self.count]
+        return {
+            "characters": self.count,
+            "distinct": len(np.unique(self.exact)),
+            "distinct_up_to_flip": len(np.unique(self.canonical)),
+            "sources": len(self.sources),
+            "levels": len(self.levels),
+            "referenced": len(known),
+            "referenced_distinct": len(np.unique(self.exact[known])),
+            "referenced_up_to_flip": len(np.unique(self.canonical[known])),
+            "past_end": int(usage["count"][usage["code"] >= self.count].sum()),
+            "unused": self.count - len(known),
+        }
+
+    def to_json(self):
+        usage = self.usage()
+        return {
+            "summary": self.summary(usage),
+            "exact": self.exact.tolist(),
+            "canonical": self.canonical.tolist(),
+            "flip": self.flip.tolist(),
+            "sources": [{"kind": kind, "name": name, "address": address} for kind, name, address in self.sources],
+            "levels": self.levels,
+            "usage": {name: values.tolist() for name, values in usage.items()},
+        }
+
+
+def source_label(source):
+    kind, name, address = source
+    return f"{kind} {name}" + (f" ${address:04X}" if address is not None else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find duplicate and flipped characters and where each one is used.")
+    parser.add_argument("cpu", help="cpu.bin")
+    parser.add_argument("characters", help="BG-REV.bin (4bpp tiles)")
+    parser.add_argument("--manifest", help="also index the decomp/savebit maps of this pipeline manifest")
+    parser.add_argument("--map", action="append", default=[],
+                        help="also index the RLE map at this hex offset or game.bin.lst label (repeatable)")
+    parser.add_argument("--buildings", type=int, default=BUILDING_COUNT, help="buildings in the $95B6 table (default 45)")
+    parser.add_argument("--tile", action="append", default=[], help="show duplicates and users of a hex character code")
+    parser.add_argument("--unused", action="store_true", help="list the characters nothing references")
+    parser.add_argument("--json", help="write the tables and usage index to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.characters, "rb") as f:
+        atlas = load_atlas(f.read())
+    rom = RomImage.open(args.cpu)
+    with span("tile_index"):
+        index = TileIndex(atlas)
+        index.add_rom(rom, args.buildings)
+        if args.manifest:
+            with open(args.manifest, "r", encoding="utf-8") as f:
+                index.add_manifest_maps(rom, json.load(f))
+        for offset in args.map:
+            address = resolve_address(offset)
+            index.add_block(rom, "map", offset, address)
+        usage = index.usage()
+        summary = index.summary(usage)
+
+    print(f"🧩 {summary['characters']} characters: {summary['distinct']} distinct, "
+          f"{summary['distinct_up_to_flip']} distinct up to X/Y flip")
+    print(f"📊 {summary['referenced']} characters referenced by {summary['sources']} sources "
+          f"({100 * summary['referenced'] / max(summary['characters'], 1):.1f}% of the ROM), {summary['unused']} never used")
+    print(f"🔁 Referenced tiles collapse to {summary['referenced_distinct']} distinct, "
+          f"{summary['referenced_up_to_flip']} up to flip")
+    if summary["past_end"]:
+        print(f"⚠️ {summary['past_end']} tile references point past the end of {args.characters}")
+
+    if args.unused or args.tile:
+        keys, offsets, levels = index.level_index(usage)
+    if args.unused:
+        used = np.zeros(summary["characters"], dtype=bool)
+        used[usage["code"][usage["code"] < summary["characters"]]] = True
+        print("🕳️ Unused: " + " ".join(f"{code:03X}" for code in np.flatnonzero(~used)))
+
+    for text in args.tile:
+        code = int(text, 16)
+        if not 0 <= code < index.count:
+            print(f"❌ Character {code:03X} is not in {args.characters}")
+            continue
+        same = np.flatnonzero(index.exact == index.exact[code])
+        flipped = np.flatnonzero((index.canonical == index.canonical[code]) & (index.exact != index.exact[code]))
+        sources, _ = index.users(code, usage)
+        i = np.searchsorted(keys, code)
+        tile_levels = levels[offsets[i]:offsets[i + 1]].tolist() if i < len(keys) and keys[i] == code else []
+        print(f"🔎 Character {code:03X}: canonical {index.canonical[code]:03X} flip {index.flip[code]}")
+        print(f"  Same pixels: {' '.join(f'{c:03X}' for c in same)}")
+        print(f"  Flipped copies: {' '.join(f'{c:03X}' for c in flipped) or '-'}")
+        print(f"  Used by: {', '.join(source_label(index.sources[s]) for s in sources) or '-'}")
+        print(f"  Levels: {', '.join(str(level + 1) for level in tile_levels) or '-'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(index.to_json(), f)
+        print(f"💾 Saved tile index to {args.json}")
+
+if __name__ == "__main__":
+    instrument.start()
+    main()
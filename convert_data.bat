@@ -28,25 +28,9 @@ python python\characters_grid.py  background.bin mame.pal characters.png
 
 REM Decompress some of the background assets and title screen images
 
-python python\decomp.py cpu.bin MAPS\title_screen_81c6.bin 81C6
-python python\decomp.py cpu.bin MAPS\ge-li-ra_select_screen.bin 8637
-python python\decomp.py cpu.bin MAPS\road_strip_78A0.bin 78A0
-python python\decomp.py cpu.bin MAPS\road_with_water_gap_left_79c9.bin  79C9
-python python\decomp.py cpu.bin MAPS\road_with_water_gap_right_79aa.bin 79AA
-python python\decomp.py cpu.bin MAPS\silhouette1_7c45.bin 7C45
-python python\decomp.py cpu.bin MAPS\silhouette2_79e8.bin 79E8
-python python\decomp.py cpu.bin MAPS\silhouette3_763e.bin 763E
-python python\decomp.py cpu.bin MAPS\silhouette4_7ee3.bin 7EE3
-python python\decomp.py cpu.bin MAPS\silhouette5_7f91.bin 7F91
-python python\decomp.py cpu.bin MAPS\train_track_78f7.bin 78F7
-python python\decomp.py cpu.bin MAPS\water_piers1_78fe.bin 78FE
-python python\decomp.py cpu.bin MAPS\water_piers2_7956.bin 7956
-python python\decomp.py cpu.bin MAPS\dateline.map 6dc7
-python python\decomp.py cpu.bin MAPS\dateline_george.map 6ee1
-python python\decomp.py cpu.bin MAPS\dateline_lizzie.map 7038
-python python\decomp.py cpu.bin MAPS\dateline_ralph.map 7189
-REM This is plotted at each level, to clear top 3 lines. Score and status info.
-python python\decomp.py cpu.bin MAPS\score-area.bin 7613
+REM One pass finds every block the code points at (terrain and silhouette tables, dateline images,
+REM title and select screens, and the score/status lines plotted at each level to clear the top 3 lines)
+python python\rle_scan.py cpu.bin MAPS
 
 python python\savebit2.py cpu.bin MAPS\trees1_9AEE.bin 9AEE 9B6E
 python python\tile_plot.py BG-REV.bin palettes_1.pal MAPS\trees1_9AEE.bin PNG\trees_and_grass1.png
@@ -0,0 +1,41 @@
+"""
+The scripts in Python/ import each other by module name, so the tests put
+that folder on sys.path. The ROM images here are synthetic: mostly zero (an
+empty RLE block everywhere) with just the tables a test needs filled in.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Python"))
+
+from level_generator_final import BUILDING_TABLE, load_palette  # noqa: E402
+from rom_image import PROGRAM_SIZE  # noqa: E402
+from tile_atlas import load_atlas  # noqa: E402
+
+BUILDING_ID = 3
+BUILDING_DATA = 0xA000
+
+
+@pytest.fixture
+def rom():
+    """A program ROM holding one 2x1 building (id 3) drawn with tiles 0 and 1."""
+    data = bytearray(PROGRAM_SIZE)
+    entry = BUILDING_TABLE + (BUILDING_ID - 1) * 2
+    data[entry:entry + 2] = BUILDING_DATA.to_bytes(2, "little")
+    data[BUILDING_DATA:BUILDING_DATA + 5] = bytes([2, 1, 0x00, 0, 1])
+    return bytes(data)
+
+
+@pytest.fixture
+def atlas():
+    """Two solid characters, colour 1 and colour 2."""
+    return load_atlas(bytes([0x11] * 32 + [0x22] * 32))
+
+
+@pytest.fixture
+def palette():
+    """64 different colours, so every tile palette shows up differently."""
+    return load_palette(bytes(range(192)))
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+from pathlib import Path
+
+PYTHON_DIR = Path(__file__).resolve().parent.parent / "Python"
+
+# Saves without flushing, so only the exit hook sees the failed write
+QUEUED_SAVE = """
+import sys
+from PIL import Image
+import instrument
+from image_writer import save_image
+instrument.start()
+save_image(Image.new("RGB", (8, 8)), sys.argv[1])
+print("queued")
+"""
+
+
+def run(args, cwd):
+    return subprocess.run([sys.executable, *args, "--write-threads", "2"], cwd=cwd, capture_output=True, text=True)
+
+
+def test_script_exits_non_zero_when_a_threaded_save_fails(tmp_path):
+    (tmp_path / "characters.bin").write_bytes(bytes([0x12] * 64))
+    (tmp_path / "palette.pal").write_bytes(bytes(range(192)))
+    missing = tmp_path / "missing" / "characters.png"
+
+    result = run([str(PYTHON_DIR / "characters_grid.py"), "characters.bin", "palette.pal", str(missing)], tmp_path)
+
+    assert result.returncode != 0
+    assert "Wrote" not in result.stdout
+
+
+def test_write_failing_at_exit_sets_exit_status(tmp_path):
+    result = run(["-c", QUEUED_SAVE, str(tmp_path / "missing" / "out.png")], PYTHON_DIR)
+
+    assert "queued" in result.stdout
+    assert "Could not write an image" in result.stdout
+    assert result.returncode == 1
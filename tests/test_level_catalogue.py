@@ -0,0 +1,39 @@
+import pytest
+
+import level_catalogue
+from conftest import BUILDING_ID
+from level_catalogue import LevelCatalogue
+from level_generator_final import LEVEL_TABLE_OFFSET
+
+BUILDING_LIST = 0xB000
+
+
+@pytest.fixture
+def level_rom(rom):
+    """The test ROM with level 1 placing the building with palette codes $00, $40 and $70."""
+    data = bytearray(rom)
+    data[LEVEL_TABLE_OFFSET:LEVEL_TABLE_OFFSET + 2] = BUILDING_LIST.to_bytes(2, "little")
+    placements = [BUILDING_ID, 0, 0x00, BUILDING_ID, 10, 0x40, BUILDING_ID, 20, 0x70, 0xFF]
+    data[BUILDING_LIST:BUILDING_LIST + len(placements)] = bytes(placements)
+    return bytes(data)
+
+
+def test_palette_wraps_like_the_renderer(level_rom):
+    catalogue = LevelCatalogue.from_rom(level_rom, count=1)
+
+    # (3 - palette_index) & 3, as render_level draws them
+    assert catalogue.buildings["palette"].tolist() == [3, 3, 0]
+    assert catalogue.query(palette=3) == [0]
+    assert catalogue.query(palette=0, x_char=20) == [0]
+
+
+def test_cache_from_an_older_version_is_rebuilt(tmp_path, monkeypatch, level_rom):
+    cache = tmp_path / "cpu.bin.levels.npz"
+    with monkeypatch.context() as m:
+        m.setattr(level_catalogue, "CATALOGUE_VERSION", 1)
+        LevelCatalogue.from_rom(level_rom, count=1).save(cache)
+
+    catalogue = LevelCatalogue.cached(level_rom, cache, count=1)
+
+    assert catalogue.buildings["palette"].tolist() == [3, 3, 0]
+    assert LevelCatalogue.load(cache).buildings["palette"].tolist() == [3, 3, 0]
@@ -0,0 +1,35 @@
+import io
+import zipfile
+
+import pytest
+
+from conftest import BUILDING_ID
+from level_generator_final import generate_pack
+from level_pack import entry_bytes, read_pack, write_pack
+
+
+def write_levels(path, palette_codes):
+    with open(path, "wb") as f:
+        write_pack(f, ((entry_bytes(0, 0xFF, 0), [(BUILDING_ID, 10, code)]) for code in palette_codes))
+
+
+def test_pack_round_trip():
+    f = io.BytesIO()
+    write_pack(f, [(entry_bytes(2, 5, 1), [(BUILDING_ID, 10, 0x40), (7, 20, 0x13)])])
+    f.seek(0)
+    assert list(read_pack(f)) == [(0, (2, 5, 1, [(BUILDING_ID, 10, 0x40), (7, 20, 0x13)]))]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_pack_with_unused_palette_bytes_renders_every_level(tmp_path, rom, atlas, palette, jobs):
+    # $40 and up never appear in the ROM's own level table
+    write_levels(tmp_path / "event.pack", [0x00, 0x40, 0x7F, 0xF3, 0x30])
+    generate_pack(rom, atlas, palette, tmp_path / "event.pack", tmp_path / "Event", chunk=2, jobs=jobs)
+
+    pngs = {}
+    for part in range(3):
+        with zipfile.ZipFile(tmp_path / f"Event_{part:04d}.zip") as archive:
+            pngs.update((name, archive.read(name)) for name in archive.namelist())
+    assert sorted(pngs) == [f"Event_{index:06d}.png" for index in range(1, 6)]
+    assert pngs["Event_000002.png"] == pngs["Event_000001.png"]  # $40 draws like $00
+    assert pngs["Event_000004.png"] == pngs["Event_000005.png"]  # $F3 draws like $30
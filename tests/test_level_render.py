@@ -0,0 +1,41 @@
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import BUILDING_ID
+from level_generator_final import LayerCache, render_level
+
+
+def render(rom, atlas, palette, palette_code):
+    return np.asarray(render_level(rom, 0, 0xFF, 0, [(BUILDING_ID, 10, palette_code)], atlas, palette))
+
+
+@pytest.mark.parametrize("palette_code, same_as", [(0x40, 0x00), (0x50, 0x10), (0x70, 0x30), (0xF0, 0x30)])
+def test_palette_codes_above_3_wrap_round(rom, atlas, palette, palette_code, same_as):
+    assert np.array_equal(render(rom, atlas, palette, palette_code), render(rom, atlas, palette, same_as))
+
+
+def test_palette_code_picks_the_tile_palette(rom, atlas, palette):
+    images = [render(rom, atlas, palette, code) for code in (0x00, 0x10, 0x20, 0x30)]
+    for a in range(4):
+        for b in range(a + 1, 4):
+            assert not np.array_equal(images[a], images[b])
+
+
+def test_layer_cache_counts_from_several_threads(rom, atlas, palette):
+    def draw(cache):
+        return render_level(rom, 0, 0xFF, 0, [(BUILDING_ID, 10, 0x00)], atlas, palette, cache)
+
+    single = LayerCache(rom, atlas)
+    draw(single)
+    cache = LayerCache(rom, atlas)
+    threads = [threading.Thread(target=lambda: [draw(cache) for _ in range(50)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.hits + cache.misses == 4 * 50 * single.misses
+    assert cache.misses == single.misses
+    assert pickle.loads(pickle.dumps(cache)).hits == cache.hits
@@ -0,0 +1,23 @@
+from build_state import BuildState
+from conftest import BUILDING_ID
+from level_generator_final import LEVEL_TABLE_OFFSET
+from pipeline import Workspace, run_jobs
+
+BUILDING_LIST = 0xB000
+LEVELS_JOB = {"job": "levels", "cpu": "cpu.bin", "characters": "BG-REV.bin", "palette": "level.pal",
+              "output": "LEVELS/Level", "levels": 1}
+
+
+def test_levels_job_with_every_level_up_to_date_counts_as_skipped(tmp_path, rom):
+    data = bytearray(rom)
+    data[LEVEL_TABLE_OFFSET:LEVEL_TABLE_OFFSET + 2] = BUILDING_LIST.to_bytes(2, "little")
+    data[BUILDING_LIST:BUILDING_LIST + 4] = bytes([BUILDING_ID, 10, 0x00, 0xFF])
+    (tmp_path / "cpu.bin").write_bytes(data)
+    (tmp_path / "BG-REV.bin").write_bytes(bytes([0x11] * 32 + [0x22] * 32))
+    (tmp_path / "level.pal").write_bytes(bytes(range(192)))
+    (tmp_path / "LEVELS").mkdir()
+    state = tmp_path / "convert_data.state.json"
+
+    assert run_jobs(Workspace(tmp_path, BuildState(state)), [LEVELS_JOB]) == 0
+    assert (tmp_path / "LEVELS" / "Level_001.png").exists()
+    assert run_jobs(Workspace(tmp_path, BuildState(state)), [LEVELS_JOB]) == 1
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from decomp import decode_character_data, encode_character_data
+from level_generator_final import TERRAIN_TABLE, TOP_STRIP_OFFSET
+from recompress import recompress_rom
+from rom_image import PROGRAM_SIZE
+
+
+def words(*pairs):
+    return bytes(byte for pair in pairs for byte in pair)
+
+
+def round_trip(data):
+    encoded = encode_character_data(data)
+    decoded, end = decode_character_data(encoded, 0)
+    assert decoded == data
+    assert end == len(encoded)  # the decoder stops on the $00 at the very end
+    return encoded
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    words((0x12, 0x3F)),
+    words((0x12, 0x3F)) * 127,
+    words((0x12, 0x3F)) * 128,
+    words((0x12, 0x3F)) * 255,
+    words((0x00, 0x00)) * 300,
+    words(*((i, 0x3F) for i in range(127))),
+    words(*((i, 0x3F) for i in range(128))),
+    words(*((i & 0xFF, i % 0x40) for i in range(1000))),
+])
+def test_edge_cases_round_trip(data):
+    round_trip(data)
+
+
+def test_empty_input_is_just_the_end_marker():
+    assert encode_character_data(b"") == b"\x00"
+
+
+def test_runs_split_at_127():
+    assert round_trip(words((0x12, 0x3F)) * 127) == bytes((127, 0x12, 0x3F, 0))
+    assert round_trip(words((0x12, 0x3F)) * 128) == bytes((127, 0x12, 0x3F, 1, 0x12, 0x3F, 0))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_data_round_trips(seed):
+    rng = random.Random(seed)
+    palette = [(rng.randrange(256), rng.randrange(0x40)) for _ in range(rng.choice((2, 4, 64)))]
+    data, length = [], rng.randrange(1, 600)
+    while len(data) < length:
+        data += [rng.choice(palette)] * rng.choice((1, 1, 2, 3, 50, 127, 128, 200))
+    round_trip(words(*data))
+
+
+def test_hi_bytes_above_3f_are_rejected():
+    with pytest.raises(ValueError):
+        encode_character_data(words((0x12, 0x40)))
+
+
+def test_odd_length_is_rejected():
+    with pytest.raises(ValueError):
+        encode_character_data(b"\x12")
+
+
+def test_overlapping_blocks_are_not_packed():
+    rom = bytearray(PROGRAM_SIZE)
+    # Four literal words, the last three equal, and a terrain block starting on the second one
+    sky = bytes((0x84, 5, 1, 2, 1, 2, 1, 2, 1, 0))
+    rom[TOP_STRIP_OFFSET:TOP_STRIP_OFFSET + len(sky)] = sky
+    rom[TERRAIN_TABLE:TERRAIN_TABLE + 2] = (TOP_STRIP_OFFSET + 3).to_bytes(2, "little")
+    with pytest.raises(ValueError, match=f"\\${TOP_STRIP_OFFSET:04X}"):
+        recompress_rom(bytes(rom))
+
+
+def test_packed_rom_decodes_the_same():
+    rom = bytearray(PROGRAM_SIZE)
+    sky = bytes((0x83, 5, 1, 5, 1, 5, 1, 0))  # three equal literal words pack into one repeat
+    rom[TOP_STRIP_OFFSET:TOP_STRIP_OFFSET + len(sky)] = sky
+    packed, report = recompress_rom(bytes(rom))
+    assert decode_character_data(packed[TOP_STRIP_OFFSET:], 0)[0] == words((5, 1)) * 3
+    assert (TOP_STRIP_OFFSET, ["sky"], len(sky), 4) in report